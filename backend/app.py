@@ -1,20 +1,33 @@
 import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
+from llm.chain import answer_cache, get_conversational_chain
 from llm.main import ask_llm_stream
 from load_env import load_env
-from schemas import LoadingStatusResponse
-from vector.load import get_loading_status, is_loading
+from schemas import CacheStatusResponse, LoadingStatusResponse
+from vector.embeddings import get_embedding_model
+from vector.load import get_loading_status, get_serving_status, is_loading
 
 load_env()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Compile the RAG pipeline once per worker before serving requests"""
+    get_conversational_chain()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,10 +48,15 @@ async def health_check():
 async def ask_llm(
     query: str,
     convoHistory: str = "",
+    audience: Optional[List[str]] = Query(None),
+    content: Optional[List[str]] = Query(None),
+    resource: Optional[List[str]] = Query(None),
 ):
+    """Stream an answer, optionally only from documents with one of the given audience, content and resource tags each"""
+    tag_filter = {field: values for field, values in (("audience", audience), ("nefac_category", content), ("resource_type", resource)) if values}
     try:
         return StreamingResponse(
-            ask_llm_stream(None, query, convoHistory),
+            ask_llm_stream(None, query, convoHistory, tag_filter or None),
             media_type="text/event-stream",
         )
     except Exception as e:
@@ -47,10 +65,21 @@ async def ask_llm(
 
 @app.get("/loading-status", response_model=LoadingStatusResponse)
 async def get_vector_loading_status():
-    """Get the current status of document loading into the vector store"""
+    """Get the current status of document loading into the vector store, and the generation this worker serves"""
     try:
         status = get_loading_status()
         status["is_loading"] = is_loading()
+        status.update(get_serving_status())
         return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/cache-status", response_model=CacheStatusResponse)
+async def get_cache_status():
+    """Get hit/miss counters for the answer and embedding caches of this worker"""
+    return {
+        "answer_cache": answer_cache.stats(),
+        # Counting the disk tier queries SQLite, which must not block the event loop
+        "embedding_cache": await run_in_threadpool(get_embedding_model().stats),
+    }
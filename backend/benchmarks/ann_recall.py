@@ -0,0 +1,99 @@
+"""
+Recall and latency of every FAISS index type against the flat baseline.
+
+By default runs on synthetic clustered unit vectors; pass --store to use the
+vectors of an existing FAISS store instead. Queries are perturbed copies of
+corpus vectors, and ground truth comes from exact IndexFlatIP search.
+
+Quantized types (sq8, pq, ivf_pq) also report the calibrated re-rank factor
+and the recall@k after exact re-ranking against the full vectors, which is
+what NefacFAISS serves.
+
+Usage (from backend/):
+    python -m benchmarks.ann_recall --vectors 20000 --k 3
+    python -m benchmarks.ann_recall --store faiss_store
+"""
+
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from vector.constant import QUANTIZED_INDEX_TYPES
+from vector.index import INDEX_TYPES, calibrate_rerank_factor, min_training_vectors, rebuild_index, recall_with_rerank, reconstruct_vectors
+from vector.persistence import checkpoint_path
+
+
+def synthetic_vectors(num_vectors, dimensions, clusters, rng):
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    assignments = rng.integers(0, clusters, num_vectors)
+    vectors = centers[assignments] + 0.5 * rng.standard_normal((num_vectors, dimensions)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors, num_queries, rng):
+    picks = rng.choice(len(vectors), size=num_queries, replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((num_queries, vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def recall_at_k(approx_ids, exact_ids):
+    k = exact_ids.shape[1]
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approx_ids, exact_ids)]))
+
+
+def time_single_queries(index, queries, k):
+    """Mean latency of one-query-at-a-time search, like a live request"""
+    start = time.perf_counter()
+    results = [index.search(query[None, :], k)[1][0] for query in queries]
+    return (time.perf_counter() - start) / len(queries), np.array(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=None, help="Benchmark on the vectors of an existing FAISS store")
+    parser.add_argument("--vectors", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dimensions", type=int, default=3072, help="Synthetic vector dimensions")
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--index-types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.store:
+        vectors = reconstruct_vectors(faiss.read_index(os.path.join(checkpoint_path(args.store), "index.faiss")))
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dimensions, args.clusters, rng)
+    queries = make_queries(vectors, min(args.queries, len(vectors)), rng)
+    dimensions = vectors.shape[1]
+
+    exact = faiss.IndexFlatIP(dimensions)
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, args.k)
+
+    print(f"Corpus: {len(vectors)} x {dimensions}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10}{'build s':>10}{'size MB':>10}{'ms/query':>10}{'recall@k':>10}{'rerank x':>10}{'reranked':>10}")
+    for index_type in args.index_types:
+        if len(vectors) < min_training_vectors(index_type):
+            print(f"{index_type:<10} skipped: not enough vectors to train")
+            continue
+        start = time.perf_counter()
+        index = rebuild_index(vectors, index_type, dimensions)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        latency, ids = time_single_queries(index, queries, args.k)
+        row = f"{index_type:<10}{build_seconds:>10.2f}{size_mb:>10.1f}{latency * 1e3:>10.3f}{recall_at_k(ids, exact_ids):>10.3f}"
+        if index_type in QUANTIZED_INDEX_TYPES:
+            factor = calibrate_rerank_factor(index, vectors, k=args.k)
+            row += f"{factor:>10}{recall_with_rerank(index, vectors, queries, exact_ids, factor):>10.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
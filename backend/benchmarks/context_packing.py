@@ -0,0 +1,94 @@
+"""
+Prompt context size before and after token-budgeted context packing.
+
+Builds synthetic retrieval results shaped like each query translation
+strategy's (overlapping result lists of --k chunks of 512 characters drawn
+from a few sources, with typical title/link/summary metadata) and compares
+the context each chain sent before (format_docs of the fused list for
+multi-query and rag fusion, format_docs per sub-question for decomposition,
+the raw Document lists for step-back and HyDE) with the output of
+llm/context.py at each --budget. Reports context tokens per request, counted
+like llm/context.py counts them (with tiktoken, or estimated from the length
+when the encoding cannot be loaded), and the packing time. No network calls
+are made once the tiktoken encoding is cached.
+
+Usage (from backend/):
+    python -m benchmarks.context_packing --k 3 --queries 5 --budget 1000 2500
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from llm.context import count_tokens, pack_contexts  # noqa: E402
+from llm.fusion import fuse  # noqa: E402
+from llm.utils import format_docs  # noqa: E402
+from vector.store import chunk_id  # noqa: E402
+
+
+def make_pool(rng, num_sources, chunks_per_source):
+    words = np.array("public records request agency fee appeal open meeting board session minutes court journalist subpoena privilege police footage denial exemption law".split())
+    pool = []
+    for source in range(num_sources):
+        title = f"NEFAC Guide {source}" if source % 3 else f"NEFAC Webinar {source}"
+        video = source % 3 == 0
+        for i in range(chunks_per_source):
+            text = " ".join(rng.choice(words, size=90))[:512]
+            metadata = {
+                "title": title,
+                "source": f"https://www.youtube.com/watch?v=video{source}" if video else f"docs/finished_tagging/guide_{source}.pdf",
+                "type": "youtube" if video else "pdf",
+                "page": 60 * i if video else i,
+                "summary": f"{title} explains how to request public records and appeal denials in New England. " * 2,
+            }
+            pool.append(Document(id=chunk_id(title, text), page_content=text, metadata=metadata))
+    return pool
+
+
+def ranked_lists(rng, pool, num_lists, k):
+    """num_lists result lists that overlap like paraphrased queries: half of each list is drawn from a shared set"""
+    shared = rng.choice(len(pool), size=k, replace=False)
+    return [[pool[i] for i in rng.permutation(np.concatenate([shared[: k // 2], rng.choice(len(pool), size=k - k // 2, replace=False)]))] for _ in range(num_lists)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3, help="Chunks per result list")
+    parser.add_argument("--queries", type=int, default=5, help="Generated queries (multi-query, rag fusion) or sub-questions (decomposition)")
+    parser.add_argument("--budget", type=int, nargs="+", default=[1000, 2500])
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pool = make_pool(rng, num_sources=8, chunks_per_source=20)
+    requests = [ranked_lists(rng, pool, args.queries, args.k) for _ in range(args.requests)]
+    strategies = {
+        # strategy: (previous context texts, result lists packed together per prompt)
+        "multiquery": (lambda lists: [format_docs(fuse(lists, "union"))], lambda lists: [[fuse(lists, "union")]]),
+        "ragfusion": (lambda lists: [format_docs(fuse(lists, "rrf"))], lambda lists: [[fuse(lists, "rrf")]]),
+        "decompose": (lambda lists: [format_docs(docs) for docs in lists], lambda lists: [[docs] for docs in lists]),
+        "stepback": (lambda lists: [str(docs) for docs in lists[:2]], lambda lists: [lists[:2]]),
+        "hyde": (lambda lists: [str(lists[0])], lambda lists: [[lists[0]]]),
+    }
+
+    print(f"{args.requests} requests, {args.queries} result lists of k={args.k} each; context tokens per request")
+    print(f"{'strategy':<12}{'before':>10}" + "".join(f"{f'budget {budget}':>16}{'ms':>8}" for budget in args.budget))
+    for name, (previous, prompts) in strategies.items():
+        before = np.mean([sum(count_tokens(text) for text in previous(lists)) for lists in requests])
+        row = f"{name:<12}{before:>10.0f}"
+        for budget in args.budget:
+            start = time.perf_counter()
+            after = [sum(context.tokens for results in prompts(lists) for context in pack_contexts(results, budget)) for lists in requests]
+            elapsed = (time.perf_counter() - start) / len(requests)
+            row += f"{np.mean(after):>9.0f} ({1 - np.mean(after) / before:>3.0%}){elapsed * 1e3:>8.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+End-to-end latency of the decomposition chain on a fixed question set.
+
+Compares answering the sub-questions one after another, each seeing the
+previous answers (the previous behaviour, still used when the planner marks
+them as dependent), with answering independent sub-questions concurrently.
+The chat model is a stub that waits --llm-latency seconds per call and the
+retriever returns canned documents; no network calls are made.
+
+Usage (from backend/):
+    python -m benchmarks.decomposition_latency --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.language_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+from llm.constant import DECOMPOSITION_MAX_CONCURRENCY  # noqa: E402
+from llm.query_translation.decomposition import get_decomposition_chain  # noqa: E402
+
+QUESTIONS = [
+    "How do I request police body camera footage in Massachusetts, and what can I do if the request is denied?",
+    "What protections do journalists in New England have against subpoenas for their sources?",
+    "How do open meeting laws apply to school boards in Vermont and New Hampshire?",
+    "What fees can Connecticut agencies charge for public records, and how long do they have to respond?",
+    "When can a Rhode Island court close a criminal proceeding to the press and public?",
+]
+
+
+class SleepingChatModel(BaseChatModel):
+    """Chat model stub: every call takes `latency` seconds and returns sub-questions or a short answer"""
+
+    latency: float = 0.5
+    sub_questions: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "sleeping-stub"
+
+    def _answer(self, messages):
+        if "one per line" in messages[-1].content:
+            return "\n".join(f"Sub-question {i + 1}?" for i in range(self.sub_questions))
+        return "A short stub answer."
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+
+async def run(chain, dependent):
+    start = time.perf_counter()
+    for question in QUESTIONS:
+        await chain.ainvoke({"question": question, "method": "decompose", "dependent": dependent})
+    return (time.perf_counter() - start) / len(QUESTIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated seconds per chat model call")
+    parser.add_argument("--sub-questions", type=int, default=3, help="Sub-questions per question")
+    parser.add_argument("--max-concurrency", type=int, default=DECOMPOSITION_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    stub = SleepingChatModel(latency=args.llm_latency, sub_questions=args.sub_questions)
+    retriever = RunnableLambda(lambda question: [Document(page_content=f"Context for {question}")])
+    chain = get_decomposition_chain(retriever, model=stub, max_concurrency=args.max_concurrency)
+
+    print(f"{len(QUESTIONS)} questions, {args.sub_questions} sub-questions each, {args.llm_latency:.2f}s per LLM call, max concurrency {args.max_concurrency}")
+    sequential = asyncio.run(run(chain, dependent=True))
+    concurrent = asyncio.run(run(chain, dependent=False))
+    print(f"Sequential (dependent):   {sequential:7.2f} s per question")
+    print(f"Concurrent (independent): {concurrent:7.2f} s per question")
+    print(f"Speedup:                  {sequential / concurrent:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
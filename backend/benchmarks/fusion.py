@@ -0,0 +1,101 @@
+"""
+Per-request cost of fusing multi-query retrieval results.
+
+Compares the previous get_unique_union and reciprocal_rank_fusion, which
+fingerprint every retrieved Document with langchain dumps and load the
+survivors back, with the id-based fusion in llm/fusion.py (union, RRF,
+weighted RRF and CombSUM). Each request fuses --queries result lists of --k
+chunks drawn from a shared pool, so lists overlap like real paraphrased
+queries do. Outputs of the old and new union/RRF are checked to match.
+
+Usage (from backend/):
+    python -m benchmarks.fusion --queries 5 --k 3 10 50
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.load import dumps, loads  # noqa: E402
+
+from llm.fusion import fuse  # noqa: E402
+from vector.store import SCORE_METADATA_KEY, chunk_id  # noqa: E402
+
+
+def previous_unique_union(documents):
+    flattened_docs = [dumps(doc) for sublist in documents for doc in sublist]
+    unique_docs = list(set(flattened_docs))
+    return [loads(doc) for doc in unique_docs]
+
+
+def previous_reciprocal_rank_fusion(results, k=60):
+    fused_scores = {}
+    for docs in results:
+        for rank, doc in enumerate(docs):
+            doc_str = dumps(doc)
+            if doc_str not in fused_scores:
+                fused_scores[doc_str] = 0
+            fused_scores[doc_str] += 1 / (rank + k)
+    return [loads(doc) for doc, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)]
+
+
+def make_results(rng, queries, k, pool_size):
+    """queries ranked lists of k chunks (512 characters, typical metadata) from a pool of pool_size"""
+    pool = []
+    for i in range(pool_size):
+        text = (f"Chunk {i} of a NEFAC guide on public records requests and open meeting law. " * 8)[:512]
+        title = f"Guide {i // 10}"
+        metadata = {"source": f"docs/guide-{i // 10}.pdf", "page": i % 10, "title": title, "type": "pdf", "summary": "A guide to public records.", "content_hash": f"{i:064x}"}
+        pool.append(Document(id=chunk_id(title, text), page_content=text, metadata=metadata))
+    results = []
+    for _ in range(queries):
+        rows = rng.choice(pool_size, size=k, replace=False)
+        scores = np.sort(rng.uniform(0.3, 0.9, size=k))[::-1]
+        results.append([pool[row].model_copy(update={"metadata": {**pool[row].metadata, SCORE_METADATA_KEY: float(score)}}) for row, score in zip(rows, scores)])
+    return results
+
+
+def time_per_call(function, results, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(results)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=5, help="Result lists fused per request")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 10, 50], help="Chunks per result list")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    weights = [2.0] + [1.0] * (args.queries - 1)
+    candidates = {
+        "union (dumps/loads)": previous_unique_union,
+        "rrf (dumps/loads)": previous_reciprocal_rank_fusion,
+        "union": lambda results: fuse(results, "union"),
+        "rrf": lambda results: fuse(results, "rrf"),
+        "weighted_rrf": lambda results: fuse(results, "weighted_rrf", weights=weights),
+        "combsum": lambda results: fuse(results, "combsum"),
+    }
+
+    print(f"{args.queries} queries per request, {args.repeats} requests per measurement")
+    print(f"{'k':>5}  " + "".join(f"{name:>22}" for name in candidates))
+    for k in args.k:
+        results = make_results(rng, args.queries, k, pool_size=k * 3)
+        # The previous retriever returned chunks without scores; with them every copy would fingerprint differently
+        unscored = [[doc.model_copy(update={"metadata": {key: value for key, value in doc.metadata.items() if key != SCORE_METADATA_KEY}}) for doc in docs] for docs in results]
+        assert sorted(doc.id for doc in previous_unique_union(unscored)) == sorted(doc.id for doc in fuse(results, "union"))
+        assert [doc.id for doc in previous_reciprocal_rank_fusion(unscored)] == [doc.id for doc in fuse(results, "rrf")]
+        timings = [time_per_call(function, unscored if "dumps" in name else results, args.repeats) * 1e3 for name, function in candidates.items()]
+        print(f"{k:>5}  " + "".join(f"{ms:>19.3f} ms" for ms in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Latency overhead and exact-term hit rate of the "hybrid" search type.
+
+Builds a synthetic store whose chunks are made of random words, some of
+them citing a statute ("RSA 91-A:<n>"), with embeddings clustered by topic,
+and searches it with questions that name one of those statutes. The query
+vector points at the cited chunk's topic rather than at the chunk itself,
+as with real exact-term questions, where every chunk on public records
+embeds about as close to the question as the one citing the statute.
+
+Reports per-query search latency (query embedding excluded) for
+"similarity" and "hybrid", the fraction of queries whose cited chunk is in
+the top k, and the build time, incremental add time and saved size of the
+lexical index. No network calls are made.
+
+Usage (from backend/):
+    python -m benchmarks.hybrid --chunks 20000 --queries 200
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import FakeEmbeddings
+
+from vector.lexical import LexicalIndex
+from vector.store import NefacFAISS
+
+
+def build_corpus(rng, num_chunks, words_per_chunk, vocabulary_size, cited_every):
+    vocabulary = np.array([f"w{i}" for i in range(vocabulary_size)])
+    texts = []
+    for i in range(num_chunks):
+        words = " ".join(rng.choice(vocabulary, size=words_per_chunk))
+        texts.append(f"{words} under RSA 91-A:{i}" if i % cited_every == 0 else words)
+    return texts
+
+
+def run(store, queries, vectors, search_type, k):
+    results, latencies = [], []
+    for query, vector in zip(queries, vectors):
+        start = time.perf_counter()
+        results.append(store.batch_search_with_score_by_vectors([vector], search_type, queries=[query], k=k)[0])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--words", type=int, default=80, help="Words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--cited-every", type=int, default=10, help="Every n-th chunk cites a statute")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topic-size", type=int, default=50, help="Chunks per embedding cluster")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = build_corpus(rng, args.chunks, args.words, args.vocabulary, args.cited_every)
+    topics = rng.standard_normal((args.chunks // args.topic_size + 1, args.dimensions)).astype(np.float32)
+    faiss.normalize_L2(topics)
+    topic_of = np.arange(args.chunks) // args.topic_size
+    vectors = topics[topic_of] + 0.5 * rng.standard_normal((args.chunks, args.dimensions)).astype(np.float32) / np.sqrt(args.dimensions)
+    faiss.normalize_L2(vectors)
+    ids = [str(i) for i in range(args.chunks)]
+    index = faiss.IndexFlatIP(args.dimensions)
+    index.add(vectors)
+    store = NefacFAISS(
+        embedding_function=FakeEmbeddings(size=args.dimensions),
+        index=index,
+        docstore=InMemoryDocstore({_id: Document(id=_id, page_content=text) for _id, text in zip(ids, texts)}),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+    start = time.perf_counter()
+    store.lexical_index()
+    build = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as path:
+        store.lexical_index().save(path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        loaded = LexicalIndex.load(path, mmap=True)
+        start = time.perf_counter()
+        loaded.add(build_corpus(rng, 50, args.words, args.vocabulary, args.cited_every))
+        loaded.scores("w1")
+        add = time.perf_counter() - start
+
+    targets = rng.choice(np.arange(0, args.chunks, args.cited_every), size=args.queries)
+    queries = [f"What does RSA 91-A:{target} say about public records?" for target in targets]
+    query_vectors = topics[topic_of[targets]] + 0.5 * rng.standard_normal((args.queries, args.dimensions)).astype(np.float32) / np.sqrt(args.dimensions)
+    faiss.normalize_L2(query_vectors)
+
+    print(f"Corpus: {args.chunks} chunks x {args.dimensions}, {args.queries} exact-term queries, k={args.k}")
+    print(f"Lexical index: built in {build:.2f}s, {size / 2**20:.1f} MiB on disk, {len(store.lexical_index().terms)} terms; adding 50 chunks to the saved index took {add * 1e3:.1f} ms")
+    print(f"{'search type':<14}{'p50 ms':>10}{'p99 ms':>10}{'hit@k':>10}")
+    for search_type in ("similarity", "hybrid"):
+        run(store, queries[:5], query_vectors[:5], search_type, args.k)  # warm up
+        results, latencies = run(store, queries, query_vectors, search_type, args.k)
+        hits = np.mean([str(target) in {doc.id for doc, _ in docs} for target, docs in zip(targets, results)])
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{search_type:<14}{p50:>10.2f}{p99:>10.2f}{hits:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
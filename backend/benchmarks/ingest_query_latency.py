@@ -0,0 +1,157 @@
+"""
+Query latency while ingestion is running, for the vector store wrapper.
+
+Compares the previous wrapper, which held one lock across searches and the
+whole of add_documents (embedding, adding and saving), a read/write-locked
+wrapper whose searches embed the query while holding the read lock (so a
+waiting writer, and every query behind it, waits on embedding requests), and
+ThreadSafeVectorStore, which embeds queries before taking the read lock and
+only takes the write lock for the in-memory add, persisting to the
+write-ahead log. Embedding calls are simulated with a fixed delay; no network
+calls are made.
+
+Usage (from backend/):
+    python -m benchmarks.ingest_query_latency --vectors 20000 --seconds 10
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog
+from vector.store import VECTOR_FILE_NAME, NefacFAISS, ThreadSafeVectorStore
+from vector.vector_file import Float16VectorFile
+
+
+class SimulatedEmbeddings(Embeddings):
+    """Random unit vectors; document batches take embed_latency seconds and queries query_latency, like API calls"""
+
+    def __init__(self, dimensions, embed_latency, query_latency):
+        self.dimensions = dimensions
+        self.embed_latency = embed_latency
+        self.query_latency = query_latency
+
+    def _vectors(self, count):
+        vectors = np.random.default_rng().standard_normal((count, self.dimensions)).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def embed_documents(self, texts):
+        time.sleep(self.embed_latency)
+        return self._vectors(len(texts)).tolist()
+
+    def embed_query(self, text):
+        time.sleep(self.query_latency)
+        return self._vectors(1)[0].tolist()
+
+
+class SingleLockVectorStore(ThreadSafeVectorStore):
+    """The previous wrapper: one lock held by searches and across all of add_documents"""
+
+    def __init__(self, vector_store, path, wal=None):
+        super().__init__(vector_store, path)
+        self.mutex = threading.RLock()
+
+    def similarity_search(self, query, k=4, **kwargs):
+        with self.mutex:
+            return self.vector_store.similarity_search(query, k=k, **kwargs)
+
+    def add_documents(self, documents):
+        with self.mutex:
+            self.vector_store.add_documents(documents)
+            self.vector_store.save_local(self.path)
+            self.generation += 1
+
+
+class EmbedUnderReadLockVectorStore(ThreadSafeVectorStore):
+    """ThreadSafeVectorStore, but searches embed the query while holding the read lock"""
+
+    def similarity_search(self, query, k=4, **kwargs):
+        with self.lock.read():
+            return self.vector_store.similarity_search(query, k=k, **kwargs)
+
+
+def build_store(wrapper, path, num_vectors, dimensions, embeddings):
+    vectors = np.random.default_rng(0).standard_normal((num_vectors, dimensions)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(dimensions)
+    index.add(vectors)
+    ids = [str(i) for i in range(num_vectors)]
+    store = NefacFAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({i: Document(page_content=f"chunk {i}") for i in ids}),
+        index_to_docstore_id=dict(enumerate(ids)),
+        vector_file=Float16VectorFile.create(os.path.join(path, VECTOR_FILE_NAME), vectors),
+    )
+    return wrapper(store, path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+
+
+def run(store, readers, seconds, batch_size, ingest, stagger):
+    latencies = []
+    latencies_lock = threading.Lock()
+    stop = threading.Event()
+
+    def read():
+        local = []
+        # Start the readers out of step, so some query is always embedding as under real traffic
+        time.sleep(np.random.default_rng().uniform(0, stagger))
+        while not stop.is_set():
+            start = time.perf_counter()
+            store.similarity_search("query", k=3)
+            local.append(time.perf_counter() - start)
+        with latencies_lock:
+            latencies.extend(local)
+
+    def write():
+        batch = 0
+        while not stop.is_set():
+            store.add_documents([Document(page_content=f"new chunk {batch}-{i}") for i in range(batch_size)])
+            batch += 1
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    if ingest:
+        threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000, help="Initial corpus size")
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent query threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    parser.add_argument("--batch-size", type=int, default=50, help="Chunks per add_documents call")
+    parser.add_argument("--embed-latency", type=float, default=0.5, help="Simulated seconds per document embedding request")
+    parser.add_argument("--query-latency", type=float, default=0.15, help="Simulated seconds per query embedding request")
+    args = parser.parse_args()
+
+    embeddings = SimulatedEmbeddings(args.dimensions, args.embed_latency, args.query_latency)
+    print(f"Corpus: {args.vectors} x {args.dimensions}, {args.readers} readers, {args.seconds:.0f}s per run")
+    print(f"{'wrapper':<22}{'ingesting':>10}{'queries':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    wrappers = (("single lock", SingleLockVectorStore), ("embed under read lock", EmbedUnderReadLockVectorStore), ("read/write", ThreadSafeVectorStore))
+    for name, wrapper in wrappers:
+        for ingest in (False, True):
+            with tempfile.TemporaryDirectory() as path:
+                store = build_store(wrapper, path, args.vectors, args.dimensions, embeddings)
+                latencies = run(store, args.readers, args.seconds, args.batch_size, ingest, args.query_latency) * 1e3
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{name:<22}{'yes' if ingest else 'no':>10}{len(latencies):>10}{p50:>10.2f}{p99:>10.2f}{latencies.max():>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Pages/s and peak RSS of each PDF text extraction backend in document/pdf_loader.py.
+
+Each backend streams and chunks every PDF of a directory in a fresh process,
+so peak RSS is measured from the same starting point for all of them. The
+previous path, PyPDFLoader.load_and_split followed by a second split of the
+whole Document list, is included as a baseline.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_backends --pdfs docs/finished_tagging --repeat 3
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pypdfium2
+
+from document.pdf_loader import PDF_BACKENDS, parse_pdf
+
+BASELINE = "PyPDFLoader"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def extract(backend, pdf_paths, repeat):
+    """Chunk every PDF repeat times; runs in its own process"""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from document.constant import CHUNK_OVERLAP, CHUNK_SIZE
+
+    start_rss = peak_rss_mb()
+    chunks = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for pdf_path in pdf_paths:
+            if backend == BASELINE:
+                docs = PyPDFLoader(pdf_path).load_and_split()
+                chunks += len(RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).split_documents(docs))
+            else:
+                chunks += len(parse_pdf(pdf_path, "", "", backend))
+    return chunks, time.perf_counter() - start, start_rss, peak_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", default="docs/finished_tagging", help="Directory of sample PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per backend")
+    parser.add_argument("--backends", nargs="+", default=[BASELINE, *PDF_BACKENDS], choices=[BASELINE, *PDF_BACKENDS])
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.pdfs, "*.pdf")))
+    if not pdf_paths:
+        parser.error(f"No PDFs found in {args.pdfs}")
+
+    pages = 0
+    for pdf_path in pdf_paths:
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        pages += len(pdf) * args.repeat
+        pdf.close()
+
+    print(f"{len(pdf_paths)} PDFs from {args.pdfs}, {args.repeat} passes")
+    print(f"{'backend':<14}{'pages':>8}{'chunks':>8}{'seconds':>10}{'pages/s':>10}{'base MB':>10}{'peak MB':>10}")
+    for backend in args.backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            chunks, seconds, start_rss, peak_rss = executor.submit(extract, backend, pdf_paths, args.repeat).result()
+        print(f"{backend:<14}{pages:>8}{chunks:>8}{seconds:>10.2f}{pages / seconds:>10.1f}{start_rss:>10.0f}{peak_rss:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
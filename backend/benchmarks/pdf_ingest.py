@@ -0,0 +1,88 @@
+"""
+PDF ingestion throughput of document/pdf_loader.py.
+
+Parses every PDF of a directory (repeated --copies times, as byte-identical
+copies under new names) one at a time in-process, as pdfLoader used to, then
+with load_pdfs for each worker count. Copies are skipped by content hash, so
+load_pdfs parses each distinct file once; a second pass over the same files
+shows the cost of a run where everything is already loaded. Throughput is
+counted in chunks: PyPDFLoader.load_and_split's ~4000-character chunks for
+the previous loader, CHUNK_SIZE chunks for load_pdfs.
+
+Usage (from backend/):
+    python -m benchmarks.pdf_ingest --pdfs docs/finished_tagging --workers 1 2 4
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from document.constant import PDF_BACKEND
+from document.pdf_loader import PDF_BACKENDS, load_pdfs
+
+
+def sequential(pdf_paths):
+    """The previous loader: every file parsed in the calling process"""
+    chunks = 0
+    for pdf_path in pdf_paths:
+        chunks += len(PyPDFLoader(pdf_path).load_and_split())
+    return chunks
+
+
+def pooled(pdf_paths, title_to_chunks, workers, backend):
+    chunks = 0
+    for _, titles, error in load_pdfs(pdf_paths, title_to_chunks, max_workers=workers, backend=backend):
+        if error is not None:
+            raise error
+        chunks += sum(len(title_to_chunks[title]) for title in titles)
+    return chunks
+
+
+def report(name, files, chunks, seconds):
+    print(f"{name:<28}{files:>8}{chunks:>8}{seconds:>10.2f}{files / seconds:>10.1f}{chunks / seconds:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", default="docs/finished_tagging", help="Directory of sample PDFs")
+    parser.add_argument("--copies", type=int, default=2, help="Copies of each PDF under different names")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Process pool sizes to compare")
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=sorted(PDF_BACKENDS), help="Text extraction backend of load_pdfs")
+    args = parser.parse_args()
+
+    sources = sorted(glob.glob(os.path.join(args.pdfs, "*.pdf")))
+    if not sources:
+        parser.error(f"No PDFs found in {args.pdfs}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_paths = []
+        for copy in range(args.copies):
+            for source in sources:
+                pdf_paths.append(os.path.join(directory, f"copy{copy}_{os.path.basename(source)}"))
+                shutil.copyfile(source, pdf_paths[-1])
+
+        print(f"{len(sources)} PDFs x {args.copies} copies from {args.pdfs}")
+        print(f"{'loader':<28}{'files':>8}{'chunks':>8}{'seconds':>10}{'files/s':>10}{'chunks/s':>10}")
+
+        start = time.perf_counter()
+        chunks = sequential(pdf_paths)
+        report("sequential PyPDFLoader", len(pdf_paths), chunks, time.perf_counter() - start)
+
+        for workers in args.workers:
+            title_to_chunks = {}
+            start = time.perf_counter()
+            chunks = pooled(pdf_paths, title_to_chunks, workers, args.backend)
+            report(f"process pool ({workers} workers)", len(pdf_paths), chunks, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            chunks = pooled(pdf_paths, title_to_chunks, workers, args.backend)
+            report("  re-run, all loaded", len(pdf_paths), chunks, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
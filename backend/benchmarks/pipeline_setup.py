@@ -0,0 +1,46 @@
+"""
+Micro-benchmark for the per-request setup cost of the conversational pipeline.
+
+Compares rebuilding the whole chain on every request (the old behaviour of
+middleware_qa) with looking up the compiled pipeline from the registry.
+No network calls are made: only chain construction is timed.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline_setup --requests 200
+"""
+
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from llm.chain import build_conversational_chain, get_conversational_chain  # noqa: E402
+
+
+def time_per_request(setup, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        setup()
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Number of simulated requests")
+    args = parser.parse_args()
+
+    # Warm up imports and the registry so both sides are measured steady-state
+    get_conversational_chain()
+
+    rebuild = time_per_request(build_conversational_chain, args.requests)
+    registry = time_per_request(get_conversational_chain, args.requests)
+
+    print(f"Simulated requests:          {args.requests}")
+    print(f"Rebuild per request (before): {rebuild * 1e3:9.3f} ms")
+    print(f"Registry lookup (after):      {registry * 1e3:9.3f} ms")
+    print(f"Speedup:                      {rebuild / registry:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
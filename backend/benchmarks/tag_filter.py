@@ -0,0 +1,86 @@
+"""
+Latency and result counts of tag-filtered searches.
+
+Compares filtering with a metadata callback after the FAISS search (the
+approach of the former vector/utils.py:create_vectorstore_filter: fetch
+fetch_k candidates, then test each chunk's metadata in Python) with the
+tag bitmaps of vector/tags.py, which restrict the FAISS search itself
+through an ID selector. Chunks of a synthetic store get one audience each,
+drawn so that the filtered audiences cover different fractions of the
+corpus. Reports per-query latency and the fraction of queries that still
+get k results. No network calls are made.
+
+Usage (from backend/):
+    python -m benchmarks.tag_filter --chunks 50000 --queries 200
+"""
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import FakeEmbeddings
+
+from vector.store import NefacFAISS
+
+# Share of the corpus tagged with each audience
+AUDIENCES = {"citizen": 0.6, "journalist": 0.3, "lawyer": 0.09, "educator": 0.01}
+
+
+def run(store, vectors, k, **kwargs):
+    results, latencies = [], []
+    for vector in vectors:
+        start = time.perf_counter()
+        results.append(store.batch_search_with_score_by_vectors([vector], "similarity", k=k, **kwargs)[0])
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--fetch-k", type=int, default=20, help="Candidates the callback filter tests")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dimensions)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    audiences = rng.choice(list(AUDIENCES), size=args.chunks, p=list(AUDIENCES.values()))
+    ids = [str(i) for i in range(args.chunks)]
+    index = faiss.IndexFlatIP(args.dimensions)
+    index.add(vectors)
+    store = NefacFAISS(
+        embedding_function=FakeEmbeddings(size=args.dimensions),
+        index=index,
+        docstore=InMemoryDocstore({_id: Document(id=_id, page_content=f"chunk {_id}", metadata={"audience": [audience]}) for _id, audience in zip(ids, audiences)}),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+    start = time.perf_counter()
+    store.tag_index()
+    print(f"Corpus: {args.chunks} chunks x {args.dimensions}, {args.queries} queries, k={args.k}; tag index built in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    queries = rng.standard_normal((args.queries, args.dimensions)).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    print(f"{'audience':<12}{'share':>8}{'filter':>10}{'p50 ms':>10}{'p99 ms':>10}{'got k':>10}")
+    for audience, share in AUDIENCES.items():
+        candidates = {
+            "callback": {"filter": lambda metadata, audience=audience: audience in metadata["audience"], "fetch_k": args.fetch_k},
+            "bitmap": {"tag_filter": {"audience": [audience]}},
+        }
+        for name, kwargs in candidates.items():
+            run(store, queries[:5], args.k, **kwargs)  # warm up
+            results, latencies = run(store, queries, args.k, **kwargs)
+            assert all(audience in doc.metadata["audience"] for docs in results for doc, _ in docs)
+            full = np.mean([len(docs) == args.k for docs in results])
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"{audience:<12}{share:>8.0%}{name:>10}{p50:>10.2f}{p99:>10.2f}{full:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
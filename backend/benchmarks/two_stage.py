@@ -0,0 +1,86 @@
+"""
+Latency and recall of two-stage coarse-to-fine search against full flat search.
+
+The first stage searches a flat index of COARSE_DIMENSIONS-long prefixes of
+the vectors for k * factor candidates; the second re-scores them with the
+full vectors, as NefacFAISS does for search_type="two_stage".
+
+text-embedding-3 vectors concentrate their signal in the leading dimensions,
+so the synthetic corpus scales each dimension down with its position to
+mimic that; plain isotropic vectors would understate the recall. Pass --store
+to measure on a real store instead.
+
+Usage (from backend/):
+    python -m benchmarks.two_stage --vectors 50000 --k 3
+    python -m benchmarks.two_stage --store faiss_store
+"""
+
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from benchmarks.ann_recall import make_queries, recall_at_k, synthetic_vectors
+from vector.constant import COARSE_DIMENSIONS
+from vector.index import reconstruct_vectors
+from vector.persistence import checkpoint_path
+from vector.store import truncate_vectors
+
+
+def leading_dimension_vectors(num_vectors, dimensions, clusters, rng):
+    vectors = synthetic_vectors(num_vectors, dimensions, clusters, rng)
+    vectors *= (1.0 / (1.0 + np.arange(dimensions) / 64.0)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def two_stage_search(coarse, vectors, query, k, num_candidates):
+    _, candidates = coarse.search(truncate_vectors(query[None, :], coarse.d), num_candidates)
+    rows = candidates[0][candidates[0] != -1]
+    scores = vectors[rows] @ query
+    return rows[np.argsort(-scores)[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=None, help="Benchmark on the vectors of an existing FAISS store")
+    parser.add_argument("--vectors", type=int, default=50000, help="Synthetic corpus size")
+    parser.add_argument("--dimensions", type=int, default=3072, help="Synthetic vector dimensions")
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--coarse-dimensions", type=int, default=COARSE_DIMENSIONS)
+    parser.add_argument("--factors", type=int, nargs="+", default=[5, 10, 20, 40], help="Candidate pool sizes, as multiples of k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.store:
+        vectors = reconstruct_vectors(faiss.read_index(os.path.join(checkpoint_path(args.store), "index.faiss")))
+    else:
+        vectors = leading_dimension_vectors(args.vectors, args.dimensions, args.clusters, rng)
+    queries = make_queries(vectors, min(args.queries, len(vectors)), rng)
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    start = time.perf_counter()
+    exact_ids = np.array([exact.search(query[None, :], args.k)[1][0] for query in queries])
+    full_latency = (time.perf_counter() - start) / len(queries)
+
+    coarse = faiss.IndexFlatIP(args.coarse_dimensions)
+    coarse.add(truncate_vectors(vectors, args.coarse_dimensions))
+
+    print(f"Corpus: {len(vectors)} x {vectors.shape[1]}, coarse {args.coarse_dimensions}-d, {len(queries)} queries, k={args.k}")
+    print(f"{'search':<16}{'ms/query':>10}{'speedup':>10}{'recall@k':>10}")
+    print(f"{'full flat':<16}{full_latency * 1e3:>10.3f}{1.0:>10.1f}{1.0:>10.3f}")
+    for factor in args.factors:
+        start = time.perf_counter()
+        ids = np.array([two_stage_search(coarse, vectors, query, args.k, args.k * factor) for query in queries])
+        latency = (time.perf_counter() - start) / len(queries)
+        print(f"{f'two-stage x{factor}':<16}{latency * 1e3:>10.3f}{full_latency / latency:>10.1f}{recall_at_k(ids, exact_ids):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Per-worker memory of read-only store loading as gunicorn workers are added.
+
+Writes a synthetic store checkpoint, then starts 1, 2, 4, ... worker
+processes that each open it the way vector/load.py does and run a few
+searches, and reads every worker's RSS and PSS (proportional set size, where
+pages shared by N processes count 1/N) from /proc/<pid>/smaps_rollup while
+all of them are alive.
+
+"private copies" loads the index with a plain faiss.read_index and the
+docstore into an InMemoryDocstore, as every worker did before; "shared mmap"
+is load_checkpoint(read_only=True). With the shared store, per-worker PSS
+should fall as workers are added while the private copies stay flat. Linux
+only.
+
+Usage (from backend/):
+    python -m benchmarks.worker_memory --vectors 50000 --workers 1 2 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from benchmarks.ingest_query_latency import SimulatedEmbeddings
+from vector.docstore import MmapDocstore
+from vector.persistence import checkpoint_path, load_checkpoint, vector_file_path, write_checkpoint
+from vector.store import NefacFAISS
+from vector.vector_file import Float16VectorFile
+
+
+def memory_mb(pid):
+    """RSS and PSS of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] in ("Rss:", "Pss:"):
+                values[fields[0][:-1]] = int(fields[1]) / 1024
+    return values["Rss"], values["Pss"]
+
+
+def build_store(path, num_vectors, dimensions, embeddings):
+    vectors = np.random.default_rng(0).standard_normal((num_vectors, dimensions)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(dimensions)
+    index.add(vectors)
+    ids = [str(i) for i in range(num_vectors)]
+    store = NefacFAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=MmapDocstore.create(path, {i: Document(page_content=f"chunk {i} " * 40, metadata={"title": f"doc {int(i) // 20}"}) for i in ids}),
+        index_to_docstore_id=dict(enumerate(ids)),
+        vector_file=Float16VectorFile.create(vector_file_path(path), vectors),
+    )
+    write_checkpoint(store, path)
+
+
+def worker(path, embeddings, shared, ready, done):
+    store = load_checkpoint(path, embeddings, read_only=True)
+    if not shared:
+        store.index = faiss.read_index(os.path.join(checkpoint_path(path), "index.faiss"))
+        store.docstore = InMemoryDocstore({_id: store.docstore.search(_id) for _id in store.index_to_docstore_id.values()})
+    for _ in range(20):
+        store.similarity_search("query", k=3)
+    ready.set()
+    done.wait()
+
+
+def measure(path, embeddings, shared, num_workers):
+    context = multiprocessing.get_context("spawn")
+    done = context.Event()
+    readies = [context.Event() for _ in range(num_workers)]
+    processes = [context.Process(target=worker, args=(path, embeddings, shared, ready, done)) for ready in readies]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait()
+    usage = [memory_mb(process.pid) for process in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return np.mean([rss for rss, _ in usage]), np.mean([pss for _, pss in usage]), sum(pss for _, pss in usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50000, help="Corpus size")
+    parser.add_argument("--dimensions", type=int, default=3072)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    args = parser.parse_args()
+
+    embeddings = SimulatedEmbeddings(args.dimensions, 0, 0)
+    with tempfile.TemporaryDirectory() as path:
+        build_store(path, args.vectors, args.dimensions, embeddings)
+        print(f"Corpus: {args.vectors} x {args.dimensions} ({args.vectors * args.dimensions * 4 / 2**20:.0f} MB flat index)")
+        print(f"{'loading':<18}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'PSS total':>12}")
+        for name, shared in (("private copies", False), ("shared mmap", True)):
+            for num_workers in args.workers:
+                rss, pss, total = measure(path, embeddings, shared, num_workers)
+                print(f"{name:<18}{num_workers:>8}{rss:>12.0f}{pss:>12.0f}{total:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "cache"
+
+
+class DiskCache:
+    """
+    Persistent key -> bytes store backed by a single SQLite file.
+
+    Safe to share between threads (one connection per thread) and between
+    gunicorn workers (SQLite WAL mode serializes writers across processes).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        found: Dict[str, bytes] = {}
+        try:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._connection().execute(f"SELECT key, value FROM cache WHERE key IN ({placeholders})", batch).fetchall())
+        except sqlite3.Error as e:
+            # Like a failed write, a failed read (locked or corrupt file) is only a cache miss
+            logger.warning(f"Could not read from disk cache {self.path}: {e}")
+            return {}
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        try:
+            connection = self._connection()
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", items)
+        except sqlite3.Error as e:
+            # A cache write failing must never fail the caller
+            logger.warning(f"Could not write to disk cache {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def bytes_stored(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
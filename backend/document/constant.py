@@ -0,0 +1,37 @@
+# YouTube ingestion: videos processed at once, and a token bucket per host shared by
+# every yt-dlp / transcript API round trip (sustained requests per second, burst size)
+YOUTUBE_MAX_CONCURRENCY = 4
+YOUTUBE_REQUESTS_PER_SECOND = 2.0
+YOUTUBE_BURST = 4
+
+# Attempts per URL before it goes back to the waiting room, with full-jitter
+# exponential backoff between them (and between transcript API retries)
+YOUTUBE_MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Transcript cleaning: short clips are packed into requests of up to CLEANING_PACK_MAX_TOKENS
+# input tokens, sent CLEANING_MAX_CONCURRENCY at a time (prompt + input + output must fit
+# the YOUTUBE_MODEL_NAME context window)
+CLEANING_MAX_CONCURRENCY = 8
+CLEANING_PACK_MAX_TOKENS = 3000
+CLEANING_MAX_OUTPUT_TOKENS = 4096
+# Characters per token assumed for packing when the tiktoken encoding cannot be loaded
+CLEANING_CHARS_PER_TOKEN = 4
+
+# PDF parsing runs in a process pool of PDF_MAX_WORKERS processes, off the web worker's GIL
+PDF_MAX_WORKERS = 4
+# Text extraction backend for PDFs: "pypdfium2", "pdfplumber" or "pypdf" (see document/pdf_loader.py)
+PDF_BACKEND = "pypdfium2"
+
+# Chunk size and overlap, in characters, of every document added to the vector store
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 32
+
+# Taxonomy folders: one subfolder per tag, listing the PDF file names (docs.txt) and YouTube
+# URLs (yt_urls.txt) it applies to; each becomes a chunk metadata field (see document/taxonomy.py)
+TAXONOMY_FOLDERS = {
+    "audience": "docs/by_audience",
+    "nefac_category": "docs/by_content",
+    "resource_type": "docs/by_resource",
+}
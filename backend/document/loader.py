@@ -4,7 +4,9 @@ import os
 import pickle
 import shutil
 
-from document.pdf_loader import pdfLoader
+from document.constant import PDF_MAX_WORKERS, YOUTUBE_MAX_ATTEMPTS, YOUTUBE_MAX_CONCURRENCY
+from document.pdf_loader import load_pdfs
+from document.scheduler import run_bounded
 from document.youtube_loader import youtubeLoader
 
 # Configure logging
@@ -17,7 +19,16 @@ FINISHED_PATH = "docs/finished_tagging"
 COPY_DESTINATION_PATH = "../frontend/public/docs"  # New destination path for copying
 
 
-def load_all_documents():
+def load_all_documents(progress=None, pdf_workers=PDF_MAX_WORKERS):
+    """
+    Load new PDFs and YouTube videos from the waiting room.
+
+    PDFs are parsed in a pool of pdf_workers processes and skipped when their
+    content hash matches a PDF already loaded (see document/pdf_loader.py).
+    YouTube URLs are processed YOUTUBE_MAX_CONCURRENCY at a time, rate limited
+    per host (see document/scheduler.py). progress, if given, is called as
+    progress(done, total, url, succeeded) after each URL finishes.
+    """
     all_documents = set()
     new_docs = set()
 
@@ -36,8 +47,11 @@ def load_all_documents():
 
     # Process PDFs
     pdf_files = glob.glob(os.path.join(WAITING_ROOM_PATH, "*.pdf"))
-    for pdf_file in pdf_files:
-        new_doc = pdfLoader(pdf_file, title_to_chunks)
+    for pdf_file, new_doc, error in load_pdfs(pdf_files, title_to_chunks, max_workers=pdf_workers):
+        if error is not None:
+            # Left in the waiting room for the next run
+            logger.error(f"Error processing PDF {pdf_file}: {error}")
+            continue
         all_documents.update(new_doc)
         new_docs.update(new_doc)
         shutil.copy(pdf_file, os.path.join(COPY_DESTINATION_PATH, os.path.basename(pdf_file)))  # move to frontend for fetching WONT NEED WHEN WE ARE USING NEFAC WEBSITE
@@ -58,32 +72,40 @@ def load_all_documents():
     if total_videos > 0:
         logger.info(f"Starting to process {total_videos} YouTube videos")
 
-    # Process URLs and collect failed ones
-    failed_urls = []
-    for idx, url in enumerate(urls, 1):
+    # Process URLs concurrently and collect failed ones
+    valid_urls = []
+    for url in urls:
         # Skip empty lines or lines that don't look like URLs
         if not url or not url.startswith("http"):
             logger.warning(f"Skipping invalid URL: {url}")
             continue
+        valid_urls.append(url)
 
-        logger.info(f"Processing YouTube video {idx}/{total_videos}: {url}")
-
-        with open(finished_urls_file, "a") as finished:
-            try:
-                new_vid = youtubeLoader(url, title_to_chunks, url_to_title)
-                all_documents.update(new_vid)
-                new_docs.update(new_vid)
-                finished.write(url + "\n")
-                logger.info(f"Successfully processed video {idx}/{total_videos}")
-            except Exception as e:
-                logger.error(f"Error processing YouTube URL {url} (video {idx}/{total_videos}): {e}")
-                failed_urls.append(url)
-                continue
+    failed_urls = []
+    tasks = run_bounded(
+        valid_urls,
+        lambda url: youtubeLoader(url, title_to_chunks, url_to_title),
+        max_workers=YOUTUBE_MAX_CONCURRENCY,
+        max_attempts=YOUTUBE_MAX_ATTEMPTS,
+    )
+    with open(finished_urls_file, "a") as finished:
+        for done, task in enumerate(tasks, 1):
+            if task.error is None:
+                all_documents.update(task.result)
+                new_docs.update(task.result)
+                finished.write(task.item + "\n")
+                finished.flush()
+                logger.info(f"Processed YouTube video {done}/{len(valid_urls)} in {task.seconds:.1f}s ({task.attempts} attempts): {task.item}")
+            else:
+                failed_urls.append(task.item)
+                logger.error(f"Error processing YouTube URL {task.item} (video {done}/{len(valid_urls)}, {task.attempts} attempts): {task.error}")
+            if progress is not None:
+                progress(done, len(valid_urls), task.item, task.error is None)
 
     # Log completion status
     if total_videos > 0:
-        successful_videos = total_videos - len(failed_urls)
-        logger.info(f"YouTube video processing complete: {successful_videos}/{total_videos} successful, {len(failed_urls)} failed")
+        successful_videos = len(valid_urls) - len(failed_urls)
+        logger.info(f"YouTube video processing complete: {successful_videos}/{len(valid_urls)} successful, {len(failed_urls)} failed")
 
     # Rewrite failed URLs to waiting_room/yt_urls.txt
     with open(yt_urls_file, "w") as waiting_write:
@@ -96,3 +118,14 @@ def load_all_documents():
     logger.info("Saved title_to_chunks.pkl for sequential loading")
 
     return all_documents, url_to_title, title_to_chunks, new_docs
+
+
+def has_waiting_documents():
+    """Whether the waiting room holds any PDF or YouTube URL to load"""
+    if glob.glob(os.path.join(WAITING_ROOM_PATH, "*.pdf")):
+        return True
+    yt_urls_file = os.path.join(WAITING_ROOM_PATH, "yt_urls.txt")
+    if os.path.exists(yt_urls_file):
+        with open(yt_urls_file, "r") as waiting_read:
+            return any(line.strip() for line in waiting_read)
+    return False
@@ -1,16 +1,143 @@
+import hashlib
+import logging
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from document.constant import CHUNK_OVERLAP, CHUNK_SIZE, PDF_BACKEND, PDF_MAX_WORKERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def pdf_title(pdf_path):
+    return os.path.basename(pdf_path)[:-4].strip().replace("_", " ").replace("  ", " ")
+
+
+def content_hash(pdf_path):
+    """SHA-256 of the file contents, so renamed or duplicated PDFs are recognised"""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def known_content_hashes(title_to_chunks):
+    """Content hashes of the PDFs already loaded"""
+    return {chunk.metadata["content_hash"] for chunks in title_to_chunks.values() for chunk in chunks if "content_hash" in chunk.metadata}
+
+
+def pypdfium2_pages(pdf_path):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        for page_number in range(len(pdf)):
+            page = pdf[page_number]
+            text_page = page.get_textpage()
+            try:
+                yield text_page.get_text_bounded().replace("\r\n", "\n")
+            finally:
+                text_page.close()
+                page.close()
+    finally:
+        pdf.close()
+
+
+def pdfplumber_pages(pdf_path):
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+            # Drop the parsed layout objects of each page once its text is out
+            page.close()
+
+
+def pypdf_pages(pdf_path):
+    from pypdf import PdfReader
+
+    for page in PdfReader(pdf_path).pages:
+        yield page.extract_text()
+
+
+# Generators of the text of each page, in order; only one page is held at a time
+PDF_BACKENDS = {
+    "pypdfium2": pypdfium2_pages,
+    "pdfplumber": pdfplumber_pages,
+    "pypdf": pypdf_pages,
+}
+
+
+def parse_pdf(pdf_path, doc_title, doc_hash, backend=PDF_BACKEND):
+    """Extract and chunk one PDF page by page; runs in a worker process"""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for page_number, text in enumerate(PDF_BACKENDS[backend](pdf_path)):
+        for chunk in text_splitter.split_text(text):
+            chunks.append(
+                Document(
+                    page_content=chunk,
+                    metadata={
+                        "source": pdf_path,
+                        "page": page_number,
+                        "title": doc_title,
+                        "type": "pdf",
+                        "content_hash": doc_hash,
+                    },
+                )
+            )
+    return chunks
+
+
+def load_pdfs(pdf_paths, title_to_chunks, max_workers=PDF_MAX_WORKERS, backend=PDF_BACKEND):
+    """
+    Parse PDFs into CHUNK_SIZE chunks with the given text extraction backend,
+    in a pool of max_workers processes.
+
+    A PDF whose content hash matches one already in title_to_chunks (or an
+    earlier file of this batch) is skipped without being parsed, whatever its
+    file name. Yields (pdf_path, new titles, error) as each file finishes.
+    """
+    known_hashes = known_content_hashes(title_to_chunks)
+    pending = {}
+    for pdf_path in pdf_paths:
+        doc_hash = content_hash(pdf_path)
+        if doc_hash in known_hashes:
+            logger.info(f"Skipping already loaded PDF: {pdf_path}")
+            yield pdf_path, set(), None
+            continue
+        known_hashes.add(doc_hash)
+        pending[pdf_path] = (pdf_title(pdf_path), doc_hash)
+
+    if not pending:
+        return
+
+    # Spawned rather than forked: the calling process runs FAISS (OpenMP) and HTTP client threads, whose locks a fork could copy while held
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(pending)), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(parse_pdf, pdf_path, *pending[pdf_path], backend): pdf_path for pdf_path in pending}
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            doc_title = pending[pdf_path][0]
+            try:
+                pages = future.result()
+            except Exception as e:
+                yield pdf_path, set(), e
+                continue
+            if doc_title in title_to_chunks:
+                logger.warning(f"PDF {pdf_path} has new contents; replacing the chunks of {doc_title}")
+            title_to_chunks[doc_title] = pages
+            yield pdf_path, {doc_title}, None
 
 
 def pdfLoader(pdf_path, title_to_chunks):
-    doc_title = os.path.basename(pdf_path)[:-4].strip().replace("_", " ").replace("  ", " ")
-    if doc_title in title_to_chunks:
-        return set()
-    loader = PyPDFLoader(pdf_path)
-    pages = loader.load_and_split()
-    for page in pages:
-        page.metadata["title"] = doc_title
-        page.metadata["type"] = "pdf"
-        title_to_chunks[doc_title] = pages
-    return {doc_title}
+    new_docs = set()
+    for _, titles, error in load_pdfs([pdf_path], title_to_chunks, max_workers=1):
+        if error is not None:
+            raise error
+        new_docs.update(titles)
+    return new_docs
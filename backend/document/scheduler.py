@@ -0,0 +1,102 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+from urllib.parse import urlparse
+
+from document.constant import BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until tokens are available; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """One TokenBucket per host, so every request to the same site shares a budget"""
+
+    def __init__(self, rate: float, capacity: float, aliases: Optional[Dict[str, str]] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.aliases = aliases or {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def host(self, url: str) -> str:
+        host = (urlparse(url).hostname or url).lower()
+        return self.aliases.get(host, host)
+
+    def acquire(self, url: str) -> float:
+        host = self.host(url)
+        with self._lock:
+            bucket = self._buckets.setdefault(host, TokenBucket(self.rate, self.capacity))
+        waited = bucket.acquire()
+        if waited > 1:
+            logger.debug(f"Rate limited {host} for {waited:.1f}s")
+        return waited
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class TaskResult(NamedTuple):
+    item: Any
+    result: Any
+    error: Optional[BaseException]
+    attempts: int
+    seconds: float
+
+
+def run_bounded(items: Iterable[Any], worker: Callable[[Any], Any], max_workers: int, max_attempts: int = 1) -> Iterator[TaskResult]:
+    """
+    Run worker(item) for every item with at most max_workers in flight.
+
+    An item whose worker raises is retried after a jittered backoff, up to
+    max_attempts in total. Results are yielded as items finish, in completion
+    order, so the caller can record progress and outcomes as they happen.
+    """
+
+    def attempt(item):
+        start = time.monotonic()
+        for attempt_number in range(1, max_attempts + 1):
+            try:
+                return TaskResult(item, worker(item), None, attempt_number, time.monotonic() - start)
+            except Exception as e:
+                if attempt_number == max_attempts:
+                    return TaskResult(item, None, e, attempt_number, time.monotonic() - start)
+                delay = backoff_delay(attempt_number)
+                logger.warning(f"Attempt {attempt_number}/{max_attempts} failed for {item}: {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(attempt, item) for item in items]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,56 @@
+import logging
+import os
+
+from document.constant import TAXONOMY_FOLDERS
+from document.youtube_loader import extract_video_id
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TAXONOMY_FILE_NAMES = ("docs.txt", "yt_urls.txt")
+
+
+def source_key(source):
+    """Key a document is listed under in the taxonomy: its YouTube video ID, or its PDF file name"""
+    video_id = extract_video_id(source) if source.startswith("http") else None
+    return f"youtube:{video_id}" if video_id else os.path.basename(source)
+
+
+def load_taxonomy(folders=TAXONOMY_FOLDERS):
+    """
+    Read the taxonomy folders.
+
+    Returns:
+        dict: {source key: {field: [tags]}} for every document listed in a tag's
+        docs.txt or yt_urls.txt
+    """
+    taxonomy = {}
+    for field, folder in folders.items():
+        if not os.path.isdir(folder):
+            logger.warning(f"Taxonomy folder {folder} not found; no document gets a {field} tag")
+            continue
+        for tag in sorted(os.listdir(folder)):
+            for file_name in TAXONOMY_FILE_NAMES:
+                path = os.path.join(folder, tag, file_name)
+                if not os.path.exists(path):
+                    continue
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            tags = taxonomy.setdefault(source_key(line.strip()), {}).setdefault(field, [])
+                            if tag not in tags:
+                                tags.append(tag)
+    return taxonomy
+
+
+def document_tags(source, taxonomy):
+    """Tags of the document at source, with every field present (empty when it is not listed)"""
+    tags = taxonomy.get(source_key(source), {})
+    return {field: list(tags.get(field, [])) for field in TAXONOMY_FOLDERS}
+
+
+def tag_documents(docs, taxonomy):
+    """Attach the taxonomy tags of each chunk's source to its metadata, in place"""
+    for doc in docs:
+        doc.metadata.update(document_tags(doc.metadata.get("source", ""), taxonomy))
+    return docs
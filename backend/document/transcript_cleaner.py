@@ -0,0 +1,182 @@
+"""
+LLM cleaning of YouTube transcript clips as one batched stage.
+
+- Clips already cleaned once are served from a persistent DiskCache keyed by a
+  hash of the model, prompts and raw clip text, so re-ingesting a video never
+  pays for the same cleaning twice.
+- The remaining clips are packed, in order, into requests of up to
+  CLEANING_PACK_MAX_TOKENS tokens, each clip between numbered markers.
+- The requests run through `abatch` with at most CLEANING_MAX_CONCURRENCY in
+  flight. A packed response whose markers do not line up is retried clip by
+  clip with the single-clip prompt; a failed request keeps the raw text.
+"""
+
+import asyncio
+import functools
+import hashlib
+import logging
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+import tiktoken
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+from disk_cache import CACHE_DIR, DiskCache
+from document.constant import CLEANING_CHARS_PER_TOKEN, CLEANING_MAX_CONCURRENCY, CLEANING_MAX_OUTPUT_TOKENS, CLEANING_PACK_MAX_TOKENS
+from llm.constant import YOUTUBE_MODEL_NAME
+from load_env import load_env
+from prompts import TRANSCRIPT_CLEANING_PROMPT, TRANSCRIPT_PACKED_CLEANING_PROMPT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_env()
+
+CLEANING_CACHE_PATH = os.path.join(CACHE_DIR, "transcript_cleaning.sqlite3")
+
+llm = ChatOpenAI(
+    model=YOUTUBE_MODEL_NAME,
+    temperature=0.1,
+    max_tokens=CLEANING_MAX_OUTPUT_TOKENS,
+    api_key=os.getenv("OPENAI_API_KEY"),
+)
+single_prompt = PromptTemplate.from_template(TRANSCRIPT_CLEANING_PROMPT)
+packed_prompt = PromptTemplate.from_template(TRANSCRIPT_PACKED_CLEANING_PROMPT)
+cleaning_cache = DiskCache(CLEANING_CACHE_PATH)
+
+_CLIP_PATTERN = re.compile(r"<clip (\d+)>\s*(.*?)\s*</clip \1>", re.DOTALL)
+# Changing the model or either prompt invalidates every cached cleaning
+_CACHE_NAMESPACE = hashlib.sha256(f"{YOUTUBE_MODEL_NAME}\x00{TRANSCRIPT_CLEANING_PROMPT}\x00{TRANSCRIPT_PACKED_CLEANING_PROMPT}".encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    """
+    The tiktoken encoding of YOUTUBE_MODEL_NAME, loaded once, or None if it
+    cannot be loaded (its BPE file is downloaded on first use), so that packing
+    falls back to a length estimate instead of losing the video.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(YOUTUBE_MODEL_NAME)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load a tiktoken encoding, estimating {CLEANING_CHARS_PER_TOKEN} characters per token: {e}")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CLEANING_CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def _cache_key(text: str) -> str:
+    return hashlib.sha256(f"{_CACHE_NAMESPACE}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def pack_clips(texts: List[str], max_tokens: int = CLEANING_PACK_MAX_TOKENS) -> List[List[int]]:
+    """Group consecutive clip indices into packs of at most max_tokens tokens (a longer clip goes alone)"""
+    packs, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = _count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _prompt(texts: List[str]) -> str:
+    if len(texts) == 1:
+        return single_prompt.format(input_text=texts[0])
+    clips = "\n".join(f"<clip {n}>\n{text}\n</clip {n}>" for n, text in enumerate(texts, 1))
+    return packed_prompt.format(clip_count=len(texts), input_clips=clips)
+
+
+def _parse(response: str, count: int):
+    """Cleaned clips of a response, or None when it does not match the request"""
+    if count == 1:
+        return [response.strip()]
+    clips = {int(n): text for n, text in _CLIP_PATTERN.findall(response)}
+    if sorted(clips) != list(range(1, count + 1)):
+        return None
+    return [clips[n] for n in range(1, count + 1)]
+
+
+async def _clean_packs(texts: List[str], packs: List[List[int]]) -> Dict[int, str]:
+    """Clean every pack concurrently; returns cleaned text by clip index, for the clips that succeeded"""
+    prompts = [_prompt([texts[i] for i in pack]) for pack in packs]
+    responses = await llm.abatch(prompts, config={"max_concurrency": CLEANING_MAX_CONCURRENCY}, return_exceptions=True)
+
+    cleaned, unpacked = {}, []
+    for pack, response in zip(packs, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error cleaning {len(pack)} clips: {response}")
+            continue
+        clips = _parse(response.content, len(pack))
+        if clips is None:
+            logger.warning(f"Packed cleaning response did not return {len(pack)} clips; cleaning them one by one")
+            unpacked.extend([i] for i in pack)
+            continue
+        cleaned.update(zip(pack, clips))
+
+    if unpacked:
+        cleaned.update(await _clean_packs(texts, unpacked))
+    return cleaned
+
+
+async def aclean_texts(texts: List[str]) -> List[str]:
+    """
+    Clean auto-generated YouTube transcript clips.
+
+    Args:
+        texts (List[str]): Raw transcript text of each clip.
+
+    Returns:
+        List[str]: Cleaned text of each clip, the raw text where cleaning failed.
+    """
+    keys = [_cache_key(text) for text in texts]
+    try:
+        cached = {key: value.decode("utf-8") for key, value in cleaning_cache.get_many(list(set(keys))).items()}
+    except Exception as e:
+        logger.error(f"Could not read the transcript cleaning cache, keeping {len(texts)} clips raw: {e}")
+        return list(texts)
+
+    # Unique uncached texts, so repeated clips are cleaned once
+    missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+    if missing:
+        packs = pack_clips(missing)
+        logger.info(f"Cleaning {len(missing)} clips in {len(packs)} requests ({sum(key in cached for key in keys)} of {len(texts)} cached)")
+        cleaned = await _clean_packs(missing, packs)
+        new_entries = {_cache_key(missing[i]): text for i, text in cleaned.items()}
+        cleaning_cache.set_many((key, text.encode("utf-8")) for key, text in new_entries.items())
+        cached.update(new_entries)
+
+    return [cached.get(key, text) for text, key in zip(texts, keys)]
+
+
+def clean_texts(texts: List[str]) -> List[str]:
+    """Synchronous aclean_texts, for ingestion worker threads"""
+    return asyncio.run(aclean_texts(texts))
+
+
+def clean_text(text):
+    """
+    Clean an auto-generated YouTube transcript using an LLM.
+
+    Args:
+        text (str): Raw transcript text.
+
+    Returns:
+        str: Cleaned transcript text.
+    """
+    return clean_texts([text])[0]
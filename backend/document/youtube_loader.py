@@ -1,20 +1,21 @@
+import json
 import logging
 import os
-import random
+import re
 import time
 from urllib.parse import parse_qs, urlparse
 
+import requests
 import yt_dlp
-from langchain_community.document_loaders import YoutubeLoader
-from langchain_community.document_loaders.youtube import TranscriptFormat
 from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import RequestBlocked, YouTubeRequestFailed, YouTubeTranscriptApi
+from yt_dlp.networking.exceptions import HTTPError, TransportError
 
-from llm.constant import YOUTUBE_MODEL_NAME
+from disk_cache import CACHE_DIR, DiskCache
+from document.constant import YOUTUBE_BURST, YOUTUBE_REQUESTS_PER_SECOND
+from document.scheduler import HostRateLimiter, backoff_delay
+from document.transcript_cleaner import clean_texts
 from load_env import load_env
-from prompts import TRANSCRIPT_CLEANING_PROMPT
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,37 +23,29 @@ logger = logging.getLogger(__name__)
 
 load_env()
 
-llm = ChatOpenAI(
-    model=YOUTUBE_MODEL_NAME,
-    temperature=0.1,
-    max_tokens=1024,
-    api_key=os.getenv("OPENAI_API_KEY"),
+YOUTUBE_CACHE_PATH = os.path.join(CACHE_DIR, "youtube.sqlite3")
+# Keys of the yt-dlp info dict not worth caching
+PROBE_DROPPED_KEYS = ("formats", "requested_formats", "thumbnails", "heatmap", "http_headers")
+# HTTP status codes of an expired signed subtitle track URL
+EXPIRED_TRACK_STATUS_CODES = (403, 404, 410)
+# HTTP status codes worth retrying, and how they appear in error messages
+TRANSIENT_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+TRANSIENT_STATUS_PATTERN = re.compile(r"\b(?:HTTP Error (?:408|429|5\d\d)|(?:408|429|5\d\d) (?:Client|Server) Error)\b")
+TRANSIENT_ERROR_MARKERS = ("too many requests", "timed out", "temporary failure", "connection reset", "connection refused", "connection aborted", "remote end closed")
+# Probe errors meaning the video itself cannot be loaded, now or later
+UNAVAILABLE_VIDEO_MARKERS = ("private video", "video unavailable", "this video is not available", "deleted", "removed", "members-only", "sign in to confirm your age", "unsupported url", "incomplete youtube id")
+
+# Raw info dicts and transcripts by video ID
+youtube_cache = DiskCache(YOUTUBE_CACHE_PATH)
+
+# Shared by every concurrent ingestion worker; all YouTube hostnames draw on one budget
+youtube_rate_limiter = HostRateLimiter(
+    YOUTUBE_REQUESTS_PER_SECOND,
+    YOUTUBE_BURST,
+    aliases={"youtu.be": "youtube.com", "www.youtube.com": "youtube.com", "m.youtube.com": "youtube.com"},
 )
 
 
-def clean_text(text):
-    """
-    Clean an auto-generated YouTube transcript using an LLM.
-
-    Args:
-        text (str): Raw transcript text.
-
-    Returns:
-        str: Cleaned transcript text.
-    """
-    # Define the prompt template
-    prompt_template = PromptTemplate.from_template(TRANSCRIPT_CLEANING_PROMPT)
-
-    prompt = prompt_template.format(input_text=text)
-
-    try:
-        cleaned_text = llm.invoke(prompt).content.strip()
-        return cleaned_text
-    except Exception as e:
-        logger.error(f"Error cleaning text: {str(e)}")
-        return text  # Return original text as fallback
-
-
 def extract_video_id(url):
     """Extract video ID from YouTube URL"""
     try:
@@ -71,6 +64,135 @@ def extract_video_id(url):
         return None
 
 
+# ============================================================================
+# FETCH LAYER
+# ============================================================================
+# Each video is probed with yt-dlp once; availability, metadata and subtitle
+# tracks all come from that info dict. The info dict and the raw transcript
+# are cached on disk by video ID, so re-runs make no network calls. The signed
+# subtitle track URLs of a cached info dict expire; a refused one is re-probed.
+
+
+def _cache_key(kind, url):
+    return f"{kind}:{extract_video_id(url) or url}"
+
+
+def _cache_get(kind, url):
+    value = youtube_cache.get(_cache_key(kind, url))
+    return json.loads(value) if value is not None else None
+
+
+def _cache_set(kind, url, value):
+    youtube_cache.set(_cache_key(kind, url), json.dumps(value).encode("utf-8"))
+
+
+def probe_video(url, refresh=False):
+    """
+    Return the yt-dlp info dict of a video, from the cache when possible.
+
+    The subtitle track URLs in the info dict are signed and expire, so a
+    cached one may no longer work; refresh probes the video again.
+
+    Raises:
+        yt_dlp.utils.DownloadError: If the video cannot be probed
+    """
+    info = None if refresh else _cache_get("info", url)
+    if info is not None:
+        return info
+
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+    }
+    youtube_rate_limiter.acquire(url)
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+    # Stream formats are large and unused; subtitle tracks are kept
+    info = {key: value for key, value in info.items() if key not in PROBE_DROPPED_KEYS}
+    _cache_set("info", url, info)
+    return info
+
+
+def _error_and_cause(error):
+    # yt-dlp wraps the original exception in a DownloadError
+    exc_info = getattr(error, "exc_info", None)
+    return (error, exc_info[1]) if exc_info else (error,)
+
+
+def http_status(error):
+    """HTTP status code of a failed yt-dlp or requests request, or None"""
+    for candidate in _error_and_cause(error):
+        if isinstance(candidate, HTTPError):
+            return candidate.status
+        if isinstance(candidate, requests.HTTPError) and candidate.response is not None:
+            return candidate.response.status_code
+    return None
+
+
+def is_transient_error(error):
+    """
+    Whether a failed YouTube request may succeed if retried: rate limiting
+    (429, IP blocks), server errors and network failures, as opposed to a
+    video that is private, removed or has no transcripts.
+    """
+    status = http_status(error)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES
+    if any(isinstance(candidate, (TransportError, RequestBlocked, requests.ConnectionError, requests.Timeout, TimeoutError, ConnectionError)) for candidate in _error_and_cause(error)):
+        return True
+    message = error.reason if isinstance(error, YouTubeRequestFailed) else str(error)
+    return bool(TRANSIENT_STATUS_PATTERN.search(message)) or any(marker in message.lower() for marker in TRANSIENT_ERROR_MARKERS)
+
+
+def is_unavailable_error(error):
+    """Whether a probe error means the video is permanently unavailable (private, removed, ...)"""
+    return not is_transient_error(error) and any(marker in str(error).lower() for marker in UNAVAILABLE_VIDEO_MARKERS)
+
+
+def describe_probe_error(error):
+    """Short reason a video could not be probed"""
+    if "Private video" in str(error):
+        return "Private video"
+    elif "Video unavailable" in str(error):
+        return "Video unavailable"
+    elif "deleted" in str(error).lower():
+        return "Video deleted"
+    return f"Access error: {str(error)}"
+
+
+def availability_from_info(info):
+    """Whether a probed video is accessible, and why not"""
+    if info.get("availability") in [
+        "private",
+        "premium_only",
+        "subscriber_only",
+    ]:
+        return False, f"Video is {info.get('availability', 'restricted')}"
+    return True, "Available"
+
+
+def metadata_from_info(info):
+    """Metadata of a probed video, as stored on its chunks"""
+    return {
+        "title": info.get("title", "Title not found"),
+        "description": info.get("description", ""),
+        "duration": info.get("duration", 0),
+        "view_count": info.get("view_count", 0),
+        "upload_date": info.get("upload_date", ""),
+        "uploader": info.get("uploader", ""),
+        "channel": info.get("channel", ""),
+        "channel_id": info.get("channel_id", ""),
+        "tags": info.get("tags", []),
+        "categories": info.get("categories", []),
+        "language": info.get("language", ""),
+        "subtitles_available": bool(info.get("automatic_captions", {})),
+        "like_count": info.get("like_count", 0),
+        "age_limit": info.get("age_limit", 0),
+    }
+
+
 def check_video_availability(url):
     """Check if YouTube video exists and is accessible"""
     video_id = extract_video_id(url)
@@ -78,33 +200,25 @@ def check_video_availability(url):
         return False, "Invalid YouTube URL"
 
     try:
-        # Use yt-dlp to check video availability
-        ydl_opts = {
-            "quiet": True,
-            "no_warnings": True,
-            "skip_download": True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if info.get("availability") in [
-                "private",
-                "premium_only",
-                "subscriber_only",
-            ]:
-                return False, f"Video is {info.get('availability', 'restricted')}"
-            return True, "Available"
+        return availability_from_info(probe_video(url))
     except Exception as e:
-        if "Private video" in str(e):
-            return False, "Private video"
-        elif "Video unavailable" in str(e):
-            return False, "Video unavailable"
-        elif "deleted" in str(e).lower():
-            return False, "Video deleted"
-        return False, f"Access error: {str(e)}"
+        return False, describe_probe_error(e)
+
+
+def _raw_transcript(fetched):
+    """Plain {"text", "start", "duration"} dicts, whichever youtube-transcript-api version fetched them"""
+    if hasattr(fetched, "to_raw_data"):
+        return fetched.to_raw_data()
+    return list(fetched)
 
 
 def get_transcript_direct(url, max_retries=3):
-    """Try to get transcript using YouTube Transcript API directly with enhanced retry mechanism"""
+    """
+    Try to get transcript using YouTube Transcript API directly with enhanced retry mechanism
+
+    Raises:
+        Exception: On a transient error (see is_transient_error)
+    """
     video_id = extract_video_id(url)
     if not video_id:
         return None, "Invalid video ID"
@@ -114,60 +228,67 @@ def get_transcript_direct(url, max_retries=3):
 
     for attempt in range(max_retries):
         try:
-            # Add small delay between attempts to avoid rate limiting
+            # Jittered backoff between attempts to avoid rate limiting
             if attempt > 0:
-                delay = random.uniform(1, 3) * attempt
+                delay = backoff_delay(attempt)
                 logger.info(f"Retrying transcript fetch after {delay:.1f}s delay (attempt {attempt + 1}/{max_retries})")
                 time.sleep(delay)
 
             # Get available transcripts
+            youtube_rate_limiter.acquire(url)
             transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
 
             # Try preferred languages first
             for lang in language_preferences:
                 try:
                     transcript = transcript_list.find_transcript([lang])
-                    transcript_data = transcript.fetch()
+                    youtube_rate_limiter.acquire(url)
+                    transcript_data = _raw_transcript(transcript.fetch())
                     return transcript_data, f"Transcript found in {lang}"
                 except Exception as e:
-                    if "no element found" not in str(e).lower():
+                    if "no element found" not in str(e).lower() and not is_transient_error(e):
                         continue  # Try next language
                     else:
-                        raise e  # Propagate XML parsing errors for retry
+                        raise e  # Propagate XML parsing and transient errors for retry
 
             # If no preferred language found, try manual transcripts first
             try:
                 for transcript in transcript_list:
                     if not transcript.is_generated:  # Manual transcripts
-                        transcript_data = transcript.fetch()
+                        youtube_rate_limiter.acquire(url)
+                        transcript_data = _raw_transcript(transcript.fetch())
                         return (
                             transcript_data,
                             f"Manual transcript found in {transcript.language}",
                         )
             except Exception as e:
-                if "no element found" not in str(e).lower():
+                if "no element found" not in str(e).lower() and not is_transient_error(e):
                     pass  # Continue to auto-generated
                 else:
-                    raise e  # Propagate XML parsing errors for retry
+                    raise e  # Propagate XML parsing and transient errors for retry
 
             # Finally try any auto-generated transcript
             try:
                 for transcript in transcript_list:
                     if transcript.is_generated:  # Auto-generated transcripts
-                        transcript_data = transcript.fetch()
+                        youtube_rate_limiter.acquire(url)
+                        transcript_data = _raw_transcript(transcript.fetch())
                         return (
                             transcript_data,
                             f"Auto-generated transcript found in {transcript.language}",
                         )
             except Exception as e:
-                if "no element found" not in str(e).lower():
+                if "no element found" not in str(e).lower() and not is_transient_error(e):
                     pass
                 else:
-                    raise e  # Propagate XML parsing errors for retry
+                    raise e  # Propagate XML parsing and transient errors for retry
 
             return None, "No transcripts available"
 
         except Exception as e:
+            if is_transient_error(e):
+                # Rate limiting and network errors are retried with the whole video (see youtubeLoader)
+                raise
             error_msg = str(e).lower()
             if "disabled" in error_msg:
                 return None, "Transcripts disabled"
@@ -184,108 +305,128 @@ def get_transcript_direct(url, max_retries=3):
     return None, f"Failed after {max_retries} attempts"
 
 
-def get_transcript_ytdlp(url):
-    """Get transcript using yt-dlp as fallback method with enhanced language support"""
-    video_id = extract_video_id(url)
-    if not video_id:
-        return None, "Invalid video ID"
+def _subtitle_track(info):
+    """Best json3 subtitle track of a probed video: manual before automatic, preferred languages first"""
+    language_preferences = ["en", "en-US", "en-GB", "en-orig"]
+    sources = [("manual", info.get("subtitles") or {}), ("automatic", info.get("automatic_captions") or {})]
 
-    import json
-    import tempfile
-    from pathlib import Path
+    for kind, tracks in sources:
+        for lang in language_preferences:
+            for track in tracks.get(lang, []):
+                if track.get("ext") == "json3":
+                    return track["url"], f"{kind} {lang}"
 
-    # Try multiple language preferences
-    language_preferences = [
-        ["en"],  # English first
-        ["en-US"],  # US English
-        ["en-GB"],  # UK English
-        ["en-orig"],  # Original English
-        ["*"],  # Any language available
-    ]
+    # Any language available, the original-language automatic track if there is one
+    for kind, tracks in sources:
+        for lang in sorted(tracks, key=lambda lang: not lang.endswith("-orig")):
+            for track in tracks[lang]:
+                if track.get("ext") == "json3":
+                    return track["url"], f"{kind} {lang}"
+    return None, None
 
-    for lang_pref in language_preferences:
-        try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                ydl_opts = {
-                    "quiet": True,
-                    "no_warnings": True,
-                    "skip_download": True,
-                    "writeautomaticsub": True,
-                    "subtitleslangs": lang_pref,
-                    "subtitlesformat": "json3",  # JSON format for easier parsing
-                    "outtmpl": f"{temp_dir}/%(id)s.%(ext)s",
-                }
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-
-                # Look for subtitle files
-                subtitle_files = list(Path(temp_dir).glob(f"{video_id}.*.json3"))
-                if not subtitle_files:
-                    continue  # Try next language preference
-
-                # Read and parse the JSON subtitle file
-                with open(subtitle_files[0], "r", encoding="utf-8") as f:
-                    subtitle_data = json.load(f)
-
-                # Convert to transcript format
-                transcript_entries = []
-                for event in subtitle_data.get("events", []):
-                    if "segs" in event:
-                        # Combine all segments in this event
-                        text = "".join(seg.get("utf8", "") for seg in event["segs"])
-                        if text.strip():
-                            transcript_entries.append(
-                                {
-                                    "text": text.strip(),
-                                    "start": event.get("tStartMs", 0) / 1000.0,  # Convert to seconds
-                                    "duration": event.get("dDurationMs", 0) / 1000.0,
-                                }
-                            )
-
-                if transcript_entries:
-                    lang_used = lang_pref[0] if lang_pref[0] != "*" else "auto-detected"
-                    return (
-                        transcript_entries,
-                        f"Transcript extracted via yt-dlp ({lang_used})",
-                    )
+def get_transcript_ytdlp(url, info=None):
+    """
+    Get transcript from the subtitle tracks of the probed video as fallback method
 
+    Raises:
+        Exception: On a transient error (see is_transient_error)
+    """
+    if info is None:
+        try:
+            info = probe_video(url)
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            return None, f"yt-dlp extraction failed: {str(e)}"
+
+    track_url, track_name = _subtitle_track(info)
+    for attempt in range(2):
+        if track_url is None:
+            return None, "No subtitles found in any supported language"
+        try:
+            youtube_rate_limiter.acquire(url)
+            with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True}) as ydl:
+                subtitle_data = json.loads(ydl.urlopen(track_url).read())
+            break
         except Exception as e:
-            if lang_pref == language_preferences[-1]:  # Last attempt
+            if is_transient_error(e):
+                raise
+            if attempt > 0 or http_status(e) not in EXPIRED_TRACK_STATUS_CODES:
                 return None, f"yt-dlp extraction failed: {str(e)}"
-            continue  # Try next language preference
+            # The track URL of a cached info dict has expired: probe again for a fresh one
+            logger.info(f"Subtitle track of {url} was refused ({http_status(e)}); probing the video again")
+            try:
+                track_url, track_name = _subtitle_track(probe_video(url, refresh=True))
+            except Exception as probe_error:
+                if is_transient_error(probe_error):
+                    raise
+                return None, f"yt-dlp extraction failed: {str(probe_error)}"
+
+    # Convert to transcript format
+    transcript_entries = []
+    for event in subtitle_data.get("events", []):
+        if "segs" in event:
+            # Combine all segments in this event
+            text = "".join(seg.get("utf8", "") for seg in event["segs"])
+            if text.strip():
+                transcript_entries.append(
+                    {
+                        "text": text.strip(),
+                        "start": event.get("tStartMs", 0) / 1000.0,  # Convert to seconds
+                        "duration": event.get("dDurationMs", 0) / 1000.0,
+                    }
+                )
+
+    if not transcript_entries:
+        return None, f"Subtitle track ({track_name}) is empty"
+    return transcript_entries, f"Transcript extracted via yt-dlp ({track_name})"
+
+
+def get_transcript(url, info):
+    """
+    Raw transcript entries of a video, from the cache when possible.
+
+    Tries the YouTube Transcript API, then the subtitle tracks listed in the
+    probed info dict. A video whose info lists no subtitle tracks at all is
+    cached as having no transcript, so it is not retried on every run.
 
-    return None, "No subtitles found in any supported language"
+    Returns:
+        tuple: (list of {"text", "start", "duration"} or None, message)
+
+    Raises:
+        Exception: The transient error of a method, when neither found a transcript
+    """
+    cached = _cache_get("transcript", url)
+    if cached is not None:
+        return cached["entries"], f"{cached['message']} (cached)"
+
+    transient_error = None
+    try:
+        transcript_data, transcript_msg = get_transcript_direct(url)
+    except Exception as e:
+        transient_error = e
+        transcript_data, transcript_msg = None, str(e)
+    if not transcript_data:
+        logger.warning(f"Direct transcript API failed for {url}: {transcript_msg}")
+        try:
+            transcript_data, transcript_msg = get_transcript_ytdlp(url, info)
+        except Exception as e:
+            transient_error = transient_error or e
+            transcript_data = None
+    if not transcript_data and transient_error is not None:
+        # Whether the video has a transcript is unknown; retry rather than load it without one
+        raise transient_error
+
+    if transcript_data or not (info.get("subtitles") or info.get("automatic_captions")):
+        _cache_set("transcript", url, {"entries": transcript_data, "message": transcript_msg})
+    return transcript_data, transcript_msg
 
 
 def get_youtube_metadata(url):
     """Get comprehensive YouTube video metadata using yt-dlp"""
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-        "skip_download": True,
-    }
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-            metadata = {
-                "title": info.get("title", "Title not found"),
-                "description": info.get("description", ""),
-                "duration": info.get("duration", 0),
-                "view_count": info.get("view_count", 0),
-                "upload_date": info.get("upload_date", ""),
-                "uploader": info.get("uploader", ""),
-                "channel": info.get("channel", ""),
-                "channel_id": info.get("channel_id", ""),
-                "tags": info.get("tags", []),
-                "categories": info.get("categories", []),
-                "language": info.get("language", ""),
-                "subtitles_available": bool(info.get("automatic_captions", {})),
-                "like_count": info.get("like_count", 0),
-                "age_limit": info.get("age_limit", 0),
-            }
-            return metadata
+        return metadata_from_info(probe_video(url))
     except Exception as e:
         logger.error(f"Error fetching metadata for {url}: {str(e)}")
         return {"title": "Title not found"}
@@ -356,16 +497,23 @@ def youtubeLoader(url, title_to_chunks, url_to_title):
 
     logger.info(f"Starting processing for YouTube URL: {url}")
 
-    # Step 1: Check video availability
-    logger.info(f"Checking video availability for: {url}")
-    is_available, availability_msg = check_video_availability(url)
+    # Step 1: Probe the video once and check availability
+    logger.info(f"Probing video for: {url}")
+    try:
+        info = probe_video(url)
+    except Exception as e:
+        if not is_unavailable_error(e):
+            # Rate limited, a server or network error, or unknown: retried, then back to the waiting room
+            raise
+        logger.warning(f"Skipping YouTube video {url}: {describe_probe_error(e)}")
+        return set()
+    is_available, availability_msg = availability_from_info(info)
     if not is_available:
         logger.warning(f"Skipping YouTube video {url}: {availability_msg}")
         return set()
 
-    # Step 2: Get video metadata
-    logger.info(f"Fetching video metadata for: {url}")
-    video_metadata = get_youtube_metadata(url)
+    # Step 2: Get video metadata from the same probe
+    video_metadata = metadata_from_info(info)
     title = video_metadata.get("title", "Title not found")
     if title == "Title not found":
         logger.warning(f"Could not fetch title for {url}, using URL as title")
@@ -373,66 +521,25 @@ def youtubeLoader(url, title_to_chunks, url_to_title):
     else:
         logger.info(f"Video title: {title}")
 
-    # Step 3: Try multiple methods to get transcript
+    # Step 3: Get the raw transcript and split it into 60-second clips
     loaded_clips = []
-
-    # Method 1: Try LangChain YoutubeLoader
     try:
-        logger.info(f"Attempting LangChain loader for: {title}")
-        loader = YoutubeLoader.from_youtube_url(
-            url,
-            add_video_info=False,
-            transcript_format=TranscriptFormat.CHUNKS,
-            chunk_size_seconds=60,
-        )
-        loaded_clips = loader.load()
-        logger.info(f"Successfully loaded {len(loaded_clips)} clips using LangChain loader for: {title}")
-
+        transcript_data, transcript_msg = get_transcript(url, info)
+        if transcript_data:
+            loaded_clips = create_document_from_transcript(transcript_data, title, url)
+            logger.info(f"Loaded {len(loaded_clips)} clips ({transcript_msg}) for: {title}")
+        else:
+            logger.warning(f"No transcript for {title}: {transcript_msg}")
     except Exception as e:
-        logger.warning(f"LangChain loader failed for {title}: {str(e)}")
-
-        # Method 2: Try direct YouTube Transcript API
-        try:
-            logger.info(f"Attempting direct transcript API for: {title}")
-            transcript_data, transcript_msg = get_transcript_direct(url)
-            if transcript_data:
-                loaded_clips = create_document_from_transcript(transcript_data, title, url)
-                logger.info(f"Successfully loaded {len(loaded_clips)} clips using direct API ({transcript_msg}) for: {title}")
-            else:
-                logger.warning(f"Direct transcript API failed for {title}: {transcript_msg}")
-
-                # Method 3: Try yt-dlp as final fallback
-                try:
-                    logger.info(f"Attempting yt-dlp fallback for: {title}")
-                    transcript_data, transcript_msg = get_transcript_ytdlp(url)
-                    if transcript_data:
-                        loaded_clips = create_document_from_transcript(transcript_data, title, url)
-                        logger.info(f"Successfully loaded {len(loaded_clips)} clips using yt-dlp ({transcript_msg}) for: {title}")
-                    else:
-                        logger.warning(f"yt-dlp fallback failed for {title}: {transcript_msg}")
-                except Exception as e3:
-                    logger.error(f"yt-dlp fallback error for {title}: {str(e3)}")
-
-        except Exception as e2:
-            logger.error(f"Direct transcript API error for {title}: {str(e2)}")
-
-            # Method 3: Try yt-dlp as final fallback
-            try:
-                logger.info(f"Attempting yt-dlp fallback for: {title}")
-                transcript_data, transcript_msg = get_transcript_ytdlp(url)
-                if transcript_data:
-                    loaded_clips = create_document_from_transcript(transcript_data, title, url)
-                    logger.info(f"Successfully loaded {len(loaded_clips)} clips using yt-dlp ({transcript_msg}) for: {title}")
-                else:
-                    logger.warning(f"yt-dlp fallback failed for {title}: {transcript_msg}")
-            except Exception as e3:
-                logger.error(f"yt-dlp fallback error for {title}: {str(e3)}")
+        if is_transient_error(e):
+            raise
+        logger.error(f"Transcript error for {title}: {str(e)}")
 
     # Step 4: Process loaded clips if we have any
     if loaded_clips:
         logger.info(f"Processing {len(loaded_clips)} clips for: {title}")
 
-        # Clean and enrich metadata for each clip
+        # Enrich metadata for each clip
         for i, clip in enumerate(loaded_clips, 1):
             logger.debug(f"Processing clip {i}/{len(loaded_clips)} for: {title}")
 
@@ -455,15 +562,10 @@ def youtubeLoader(url, title_to_chunks, url_to_title):
             if "page" not in clip.metadata:
                 clip.metadata["page"] = clip.metadata.get("start_seconds", 0)
 
-            # Clean the text using LLM
-            try:
-                logger.debug(f"Cleaning text for clip {i}/{len(loaded_clips)} of: {title}")
-                cleaned_text = clean_text(clip.page_content)
-                logger.debug(f"Original text: {clip.page_content[:100]}...")
-                logger.debug(f"Cleaned text: {cleaned_text[:100]}...")
-                clip.page_content = cleaned_text
-            except Exception as e:
-                logger.error(f"Error cleaning text for {title}: {str(e)}, using original text")
+        # Clean the text of every clip with the LLM in one batched, cached stage
+        cleaned_texts = clean_texts([clip.page_content for clip in loaded_clips])
+        for clip, cleaned_text in zip(loaded_clips, cleaned_texts):
+            clip.page_content = cleaned_text
 
         title_to_chunks[title] = loaded_clips
         url_to_title[url] = title
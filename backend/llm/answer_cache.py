@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    query: str
+    events: List[str]
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of streamed /ask-llm answers keyed by query embedding.
+
+    A lookup hits when a cached query lies within max_distance (cosine
+    distance) of the new one. Entries are tied to the index generation they
+    were answered from and are dropped as soon as that generation changes.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_distance: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()  # slot -> entry, oldest first
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, dim) unit vectors, one row per slot
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._generation: Optional[Any] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def lookup(self, embedding: Sequence[float], generation: Any) -> Optional[List[str]]:
+        """Return the cached SSE events for the closest query within max_distance, if any."""
+        query_vector = _normalize(embedding)
+        with self._lock:
+            self._check_generation(generation)
+            self._expire()
+
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+            similarities = self._vectors[slots] @ query_vector
+            best = int(np.argmax(similarities))
+
+            if 1.0 - float(similarities[best]) > self.max_distance:
+                self.misses += 1
+                return None
+
+            slot = int(slots[best])
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            entry = self._entries[slot]
+            logger.info(f"Answer cache hit (distance {1.0 - float(similarities[best]):.4f}) for cached query: {entry.query}")
+            return list(entry.events)
+
+    def store(self, query: str, embedding: Sequence[float], events: List[str], generation: Any) -> None:
+        """Cache the SSE events streamed for query."""
+        if not events or self.max_entries <= 0:
+            return
+
+        query_vector = _normalize(embedding)
+        with self._lock:
+            # The index changed while this answer was generated
+            if generation != self._generation:
+                return
+
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query_vector.shape[0]), dtype=np.float32)
+
+            if not self._free_slots:
+                evicted_slot, _ = self._entries.popitem(last=False)
+                self._free_slots.append(evicted_slot)
+                self.evictions += 1
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = query_vector
+            self._entries[slot] = _CacheEntry(query=query, events=list(events), created_at=time.monotonic())
+
+    def invalidate(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "generation": self._generation,
+            }
+
+    def _check_generation(self, generation: Any) -> None:
+        if generation != self._generation:
+            if self._entries:
+                logger.info(f"Index generation changed ({self._generation} -> {generation}), invalidating answer cache")
+                self._clear()
+            self._generation = generation
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Entries are kept in LRU order, not insertion order, so scan them all
+        expired = [slot for slot, entry in self._entries.items() if entry.created_at < cutoff]
+        for slot in expired:
+            del self._entries[slot]
+            self._free_slots.append(slot)
+        self.expirations += len(expired)
+
+    def _clear(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
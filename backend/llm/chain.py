@@ -1,22 +1,31 @@
 import json
 import logging
-from typing import Any, AsyncGenerator, Dict
+import threading
+from typing import Any, AsyncGenerator, Dict, Iterable, Mapping, NamedTuple, Optional
 
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import AIMessageChunk
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnableBranch, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 
+from llm.answer_cache import SemanticAnswerCache
 from llm.constant import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_DISTANCE,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS,
     LAMBDA_MULT,
     MODEL_NAME,
     NUMBER_OF_NEAREST_NEIGHBORS,
+    ROUTER_MODE,
+    SEARCH_TYPE,
     THRESHOLD,
 )
+from llm.context import CONTEXT_USAGE_CONFIG_KEY, ContextUsage
 from load_env import load_env
 from prompts import (
     CONTEXTUALIZE_PROMPT,
@@ -25,8 +34,11 @@ from prompts import (
     METHOD_SELECTION_PROMPT,
     RETRIEVAL_PROMPT,
 )
-from vector.load import vector_store
+from vector.embeddings import get_embedding_model
+from vector.load import get_index_generation, vector_store
+from vector.store import TAG_FILTER_CONFIG_KEY
 
+from .planner import get_query_planner
 from .query_translation.decomposition import get_decomposition_chain
 from .query_translation.hyDe import get_hyDe_chain
 from .query_translation.multi_query import get_multi_query_chain
@@ -37,7 +49,13 @@ load_env()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-large")
+embedding_model = get_embedding_model()
+
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_distance=ANSWER_CACHE_MAX_DISTANCE,
+)
 
 store: Dict[str, ChatMessageHistory] = {}
 seen_documents = set()
@@ -56,32 +74,75 @@ def serialize_aimessagechunk(chunk: Any) -> str:
         raise TypeError(f"Object of type {type(chunk).__name__} is not correctly formatted for serialization")
 
 
-async def middleware_qa(
-    query: str,
-    convoHistory: str,
-) -> AsyncGenerator[str, None]:
+class PipelineConfig(NamedTuple):
+    """Model and retrieval settings a compiled pipeline is built for."""
+
+    model_name: str = MODEL_NAME
+    k: int = NUMBER_OF_NEAREST_NEIGHBORS
+    lambda_mult: float = LAMBDA_MULT
+    score_threshold: float = THRESHOLD
+    search_type: str = SEARCH_TYPE
+    router: str = ROUTER_MODE
+
+
+DEFAULT_PIPELINE_CONFIG = PipelineConfig()
+
+# Compiled pipelines, built once per worker and shared by every request
+_pipelines: Dict[PipelineConfig, Runnable] = {}
+_pipelines_lock = threading.Lock()
+
+
+def build_conversational_chain(config: PipelineConfig = DEFAULT_PIPELINE_CONFIG) -> Runnable:
+    """Build the full conversational RAG pipeline for the given config."""
     # ============================================================================
     # INITIALIZATION MODEL
     # ============================================================================
-    model = ChatOpenAI(model=MODEL_NAME, streaming=True)
+    model = ChatOpenAI(model=config.model_name, streaming=True)
 
     # ============================================================================
     # RETRIEVER SETUP
     # ============================================================================
-    retriever = RunnableLambda(
-        lambda question: vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={
-                "k": NUMBER_OF_NEAREST_NEIGHBORS,
-                "lambda_mult": LAMBDA_MULT,
-                "score_threshold": THRESHOLD,
-            },
-        ).invoke(question)
-    ).with_config(tags=["retriever"])
+    search_kwargs = {
+        "k": config.k,
+        "lambda_mult": config.lambda_mult,
+        "score_threshold": config.score_threshold,
+    }
+    # batch() (e.g. retriever.map() over generated queries) embeds and searches every query at once
+    retriever = vector_store.as_retriever(search_type=config.search_type, search_kwargs=search_kwargs, include_scores=True).with_config(tags=["retriever"])
+
+    # ============================================================================
+    # QUERY TRANSLATION CHAINS
+    # ============================================================================
+    multi_query_chain = get_multi_query_chain(retriever)
+    decomposition_chain = get_decomposition_chain(retriever)
+    step_back_chain = get_step_back_chain(retriever)
+    hyde_chain = get_hyDe_chain(retriever)
+    rag_fusion_chain = get_rag_fusion_chain(retriever)
+
+    strategy_router = RunnableBranch(
+        (lambda x: "multiquery" in str(x.get("method", "")) if isinstance(x, dict) else "", multi_query_chain),
+        (lambda x: "decompose" in str(x.get("method", "")) if isinstance(x, dict) else "", decomposition_chain),
+        (lambda x: "stepback" in str(x.get("method", "")) if isinstance(x, dict) else "", step_back_chain),
+        (lambda x: "hyde" in str(x.get("method", "")) if isinstance(x, dict) else "", hyde_chain),
+        (lambda x: "ragfusion" in str(x.get("method", "")) if isinstance(x, dict) else "", rag_fusion_chain),
+        (multi_query_chain),
+    )
 
     # ============================================================================
     # FULL RETRIEVAL PIPELINE
     # ============================================================================
+    answer_chain = (
+        ChatPromptTemplate.from_messages(
+            [
+                ("system", RETRIEVAL_PROMPT),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("human", "{question}"),
+            ]
+        )
+        | model.with_config(tags=["final_answer"])
+        | (lambda x: {"answer": x})
+    )
+
     retrieval_chain = (
         RunnablePassthrough.assign(
             context=(
@@ -97,25 +158,10 @@ async def middleware_qa(
                     | StrOutputParser()
                 ).with_config(tags=["contextualize_q_chain"])
                 | {"question": RunnablePassthrough(), "method": (ChatPromptTemplate.from_template(METHOD_SELECTION_PROMPT) | model | StrOutputParser())}
-                | RunnableBranch(
-                    (lambda x: "multiquery" in str(x.get("method", "")) if isinstance(x, dict) else "", get_multi_query_chain(retriever)),
-                    (lambda x: "decompose" in str(x.get("method", "")) if isinstance(x, dict) else "", get_decomposition_chain(retriever)),
-                    (lambda x: "stepback" in str(x.get("method", "")) if isinstance(x, dict) else "", get_step_back_chain(retriever)),
-                    (lambda x: "hyde" in str(x.get("method", "")) if isinstance(x, dict) else "", get_hyDe_chain(retriever)),
-                    (lambda x: "ragfusion" in str(x.get("method", "")) if isinstance(x, dict) else "", get_rag_fusion_chain(retriever)),
-                    (get_multi_query_chain(retriever)),
-                )
+                | strategy_router
             ).with_config(tags=["full_retrieval_pipeline"])
         )
-        | ChatPromptTemplate.from_messages(
-            [
-                ("system", RETRIEVAL_PROMPT),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("human", "{question}"),
-            ]
-        )
-        | model.with_config(tags=["final_answer"])
-        | (lambda x: {"answer": x})
+        | answer_chain
     )
 
     # ============================================================================
@@ -136,32 +182,15 @@ async def middleware_qa(
     # ============================================================================
     # MAIN ROUTER
     # ============================================================================
-    router = RunnableBranch(
-        (
-            lambda x: "document request"
-            in (
-                ChatPromptTemplate.from_messages(
-                    [
-                        ("system", INTENT_CLASSIFICATION_PROMPT),
-                        MessagesPlaceholder(variable_name="chat_history"),
-                        ("human", "{question}"),
-                    ]
-                )
-                | model
-                | StrOutputParser()
-            )
-            .with_config(tags=["doc_request_classifier"])
-            .invoke(x)
-            .lower(),
-            retrieval_chain,
-        ),
-        general_chain,
-    )
+    if config.router == "planner":
+        router = _build_planner_router(model, strategy_router, answer_chain, general_chain)
+    else:
+        router = _build_legacy_router(model, retrieval_chain, general_chain)
 
     # ============================================================================
     # CONVERSATIONAL CHAIN WITH HISTORY
     # ============================================================================
-    conversational_chain = RunnableWithMessageHistory(
+    return RunnableWithMessageHistory(
         router,
         get_session_history,
         input_messages_key="question",
@@ -169,21 +198,109 @@ async def middleware_qa(
         output_messages_key="answer",
     )
 
+
+def _build_legacy_router(model: ChatOpenAI, retrieval_chain: Runnable, general_chain: Runnable) -> Runnable:
+    """Route with a separate intent classification call (contextualization and method selection run inside retrieval_chain)."""
+    intent_classifier = (
+        ChatPromptTemplate.from_messages(
+            [
+                ("system", INTENT_CLASSIFICATION_PROMPT),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("human", "{question}"),
+            ]
+        )
+        | model
+        | StrOutputParser()
+    ).with_config(tags=["doc_request_classifier"])
+
+    return RunnableBranch(
+        (
+            lambda x: "document request" in intent_classifier.invoke(x).lower(),
+            retrieval_chain,
+        ),
+        general_chain,
+    )
+
+
+def _build_planner_router(model: ChatOpenAI, strategy_router: Runnable, answer_chain: Runnable, general_chain: Runnable) -> Runnable:
+    """Route on a single query planner call that returns the standalone question, intent and strategy."""
+    planned_retrieval_chain = RunnablePassthrough.assign(context=(lambda x: {"question": x["plan"]["question"], "method": x["plan"]["strategy"], "dependent": x["plan"]["dependent"]}) | strategy_router).with_config(tags=["full_retrieval_pipeline"]) | answer_chain
+
+    return RunnablePassthrough.assign(plan=get_query_planner(model)) | RunnableBranch(
+        (lambda x: x["plan"]["intent"] == "document request", planned_retrieval_chain),
+        general_chain,
+    )
+
+
+def get_conversational_chain(config: PipelineConfig = DEFAULT_PIPELINE_CONFIG) -> Runnable:
+    """Return the compiled pipeline for config, building it on first use."""
+    pipeline = _pipelines.get(config)
+    if pipeline is None:
+        with _pipelines_lock:
+            pipeline = _pipelines.get(config)
+            if pipeline is None:
+                logger.info(f"Building conversational pipeline for {config}")
+                pipeline = build_conversational_chain(config)
+                _pipelines[config] = pipeline
+    return pipeline
+
+
+async def middleware_qa(
+    query: str,
+    convoHistory: str,
+    config: PipelineConfig = DEFAULT_PIPELINE_CONFIG,
+    tag_filter: Optional[Mapping[str, Iterable[str]]] = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Stream the answer to query as server-sent events.
+
+    tag_filter restricts every retrieval to chunks with the given taxonomy
+    tags (see TagIndex.bitmap); it is passed to the retriever through the run
+    config, so the compiled pipeline is shared by every filter.
+    """
+    conversational_chain = get_conversational_chain(config)
+
+    # ============================================================================
+    # ANSWER CACHE LOOKUP
+    # ============================================================================
+    # Answers that depend on an ongoing conversation, a tag filter or a non-default pipeline are never cached
+    query_embedding = None
+    generation = get_index_generation()
+    if ANSWER_CACHE_ENABLED and not convoHistory and not tag_filter and config == DEFAULT_PIPELINE_CONFIG:
+        try:
+            query_embedding = await embedding_model.aembed_query(query)
+            cached_events = answer_cache.lookup(query_embedding, generation)
+        except Exception as e:
+            logger.error(f"Answer cache lookup failed: {e}")
+            query_embedding, cached_events = None, None
+
+        if cached_events is not None:
+            for cached_event in cached_events:
+                yield cached_event
+            return
+
     # ============================================================================
     # STREAMING EXECUTION
     # ============================================================================
     input_data = {"question": query, "chat_history": convoHistory}
+    # Every context packed for this request adds its token counts to context_usage
+    context_usage = ContextUsage()
+    run_config = {"configurable": {"session_id": "abc123", CONTEXT_USAGE_CONFIG_KEY: context_usage}}
+    if tag_filter:
+        run_config["configurable"][TAG_FILTER_CONFIG_KEY] = tag_filter
+    streamed_events = []
 
     try:
         i = 0
-        async for event in conversational_chain.astream_events(input_data, config={"configurable": {"session_id": "abc123"}}, version="v1"):
+        async for event in conversational_chain.astream_events(input_data, config=run_config, version="v1"):
             # Handle final answer streaming
             if "final_answer" in event.get("tags", []) and event["event"] == "on_chat_model_stream":
                 chunk_content = serialize_aimessagechunk(event["data"]["chunk"])  # type: ignore
                 if len(chunk_content) != 0:
                     data_dict = {"message": chunk_content, "order": i}
                     data_json = json.dumps(data_dict)
-                    yield f"data: {data_json}\n\n"
+                    streamed_events.append(f"data: {data_json}\n\n")
+                    yield streamed_events[-1]
 
             # Handle reformulated question streaming
             sources_tags = ["seq:step:2", "main_chain", "contextualize_q_chain"]
@@ -192,7 +309,8 @@ async def middleware_qa(
                 if len(chunk_content) != 0:
                     data_dict = {"reformulated": chunk_content, "order": i}
                     data_json = json.dumps(data_dict)
-                    yield f"data: {data_json}\n\n"
+                    streamed_events.append(f"data: {data_json}\n\n")
+                    yield streamed_events[-1]
 
             # Handle document retrieval
             if "retriever" in event.get("tags", []) and event["event"] == "on_retriever_end":
@@ -219,11 +337,18 @@ async def middleware_qa(
                 if formatted_documents:
                     final_output = {"context": formatted_documents, "order": i}
                     data_json = json.dumps(final_output)
-                    yield f"data: {data_json}\n\n"
+                    streamed_events.append(f"data: {data_json}\n\n")
+                    yield streamed_events[-1]
                 seen_documents.clear()
 
             i += 1
 
+        if context_usage.contexts:
+            logger.info(f"Packed {context_usage.contexts} contexts into {context_usage.tokens} tokens, saving {context_usage.saved_tokens} of {context_usage.original_tokens} ({context_usage.duplicates} duplicate chunks, {context_usage.dropped} over budget)")
+
+        if query_embedding is not None:
+            answer_cache.store(query, query_embedding, streamed_events, generation)
+
     except Exception as e:
         logger.error(f"Error in middleware_qa: {e}")
         error_chunk = {
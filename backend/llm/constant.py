@@ -1,6 +1,34 @@
 NUMBER_OF_NEAREST_NEIGHBORS = 3
 LAMBDA_MULT = 0.25
 THRESHOLD = 0.7
+# "similarity" searches the main index; "two_stage" searches shortened vectors first
+# and re-scores the shortlist with the full ones; "hybrid" fuses it with BM25 search
+# over the chunk text, for exact terms such as statute numbers (see vector/store.py)
+SEARCH_TYPE = "similarity"
 MODEL_NAME = "gpt-4"
 QUERY_TRANSLATION_MODEL_NAME = "gpt-4"
 YOUTUBE_MODEL_NAME = "gpt-4"
+
+# "legacy": separate contextualization, intent classification and method selection calls
+# "planner": one structured-output call returns the standalone question, intent and strategy;
+# selectable so its latency can be compared with the legacy router before it becomes the default
+ROUTER_MODE = "legacy"
+
+# Semantic answer cache for /ask-llm
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 512
+ANSWER_CACHE_TTL_SECONDS = 6 * 60 * 60
+ANSWER_CACHE_MAX_DISTANCE = 0.05  # cosine distance between query embeddings
+
+# Decomposition: independent sub-questions are answered concurrently, at most this many at a time
+DECOMPOSITION_MAX_CONCURRENCY = 4
+
+# Fusion of the per-query results of rag fusion (see llm/fusion.py for the methods) and the RRF rank constant
+RAG_FUSION_METHOD = "rrf"
+RRF_K = 60
+
+# Retrieved chunks are packed into at most CONTEXT_MAX_TOKENS tokens of context per prompt,
+# deduplicated, with one header per source, in relevance order (see llm/context.py)
+CONTEXT_MAX_TOKENS = 2500
+# Characters per token assumed when no tiktoken encoding can be loaded (e.g. offline)
+CONTEXT_CHARS_PER_TOKEN = 4
@@ -0,0 +1,214 @@
+"""
+Token-budgeted assembly of retrieved chunks into prompt context.
+
+Replaces format_docs, which repeats the title/type/link/summary lines of
+every chunk and has no size limit:
+- a chunk retrieved more than once (same chunk id, or the same text) is kept once
+- chunks of one source share a single header with its title, type, link and summary
+- chunks are added in relevance order (the order given) for as long as the
+  context fits max_tokens, counted with tiktoken for QUERY_TRANSLATION_MODEL_NAME
+  (estimated from the length when the encoding cannot be loaded)
+
+Contexts that share one prompt (the step-back chain's two) are packed
+together: the budget is filled rank by rank across them, so a chunk both
+retrieved is kept once, in the context that ranked it higher.
+
+Every packing is added to the request's ContextUsage, passed as
+config["configurable"][CONTEXT_USAGE_CONFIG_KEY], so middleware_qa can report
+the tokens saved against format_docs.
+"""
+
+import functools
+import logging
+import math
+import threading
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import tiktoken
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import ensure_config
+
+from llm.constant import CONTEXT_CHARS_PER_TOKEN, CONTEXT_MAX_TOKENS, QUERY_TRANSLATION_MODEL_NAME
+from llm.fusion import document_key
+from llm.utils import format_docs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Key of a run's config["configurable"] holding the ContextUsage of the request
+CONTEXT_USAGE_CONFIG_KEY = "context_usage"
+NO_DOCUMENTS = "No documents available"
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    """
+    The tiktoken encoding of QUERY_TRANSLATION_MODEL_NAME, loaded once, or None
+    if it cannot be loaded (its BPE file is downloaded on first use), so that
+    packing degrades to an estimate instead of failing every retrieval.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(QUERY_TRANSLATION_MODEL_NAME)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load a tiktoken encoding, estimating {CONTEXT_CHARS_PER_TOKEN} characters per token: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+class PackedContext(NamedTuple):
+    """Context text of one prompt slot, with its token count and what packing removed"""
+
+    text: str
+    tokens: int
+    # Tokens format_docs would have produced for the same documents
+    original_tokens: int
+    chunks: int
+    duplicates: int
+    dropped: int
+
+
+class ContextUsage:
+    """Token counts of every context packed for one request (contexts may be packed in several threads)"""
+
+    def __init__(self):
+        self.contexts = 0
+        self.tokens = 0
+        self.original_tokens = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, packed: Sequence[PackedContext]) -> None:
+        with self._lock:
+            for context in packed:
+                self.contexts += 1
+                self.tokens += context.tokens
+                self.original_tokens += context.original_tokens
+                self.duplicates += context.duplicates
+                self.dropped += context.dropped
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _source(doc: Document) -> Tuple[str, str]:
+    return doc.metadata.get("title", "Unknown Source"), doc.metadata.get("source", "")
+
+
+def _header(doc: Document) -> str:
+    title, link = _source(doc)
+    lines = [f"title: {title}", f"type: {doc.metadata.get('type', 'unknown')}"]
+    if link:
+        lines.append(f"link: {link}")
+    if doc.metadata.get("summary"):
+        lines.append(f"summary: {doc.metadata['summary']}")
+    return "\n".join(lines)
+
+
+def _chunk(doc: Document) -> str:
+    timestamp = doc.metadata.get("page")
+    if doc.metadata.get("type") == "youtube" and timestamp:
+        return f"content (timestamp_seconds: {timestamp}): {doc.page_content}"
+    return f"content: {doc.page_content}"
+
+
+def _render(docs: List[Document]) -> str:
+    """One section per source, in order of its first chunk: the header, then its chunks"""
+    sections: Dict[Tuple[str, str], List[str]] = {}
+    for doc in docs:
+        sections.setdefault(_source(doc), [_header(doc)]).append(_chunk(doc))
+    return "\n\n".join("\n".join(lines) for lines in sections.values()) if sections else NO_DOCUMENTS
+
+
+def pack_contexts(results: Sequence[Sequence[Document]], max_tokens: int = CONTEXT_MAX_TOKENS) -> List[PackedContext]:
+    """
+    Pack ranked lists of retrieved documents that share one prompt into one
+    context text each, together at most about max_tokens tokens.
+
+    Candidates are taken rank by rank across the lists (every list's first
+    chunk, then every list's second, ...); duplicates are skipped and a chunk
+    that does not fit is dropped, so smaller ones after it can still fill the budget.
+    """
+    seen: Set[Hashable] = set()
+    kept: List[List[Document]] = [[] for _ in results]
+    sources: List[Set[Tuple[str, str]]] = [set() for _ in results]
+    duplicates, dropped = [0] * len(results), [0] * len(results)
+    used = 0
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for i, docs in enumerate(results):
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            keys = (document_key(doc), doc.page_content.strip())
+            if any(key in seen for key in keys):
+                duplicates[i] += 1
+                continue
+            seen.update(keys)
+            # A new source costs its header; the separators are about one token each
+            cost = count_tokens(_chunk(doc)) + 1
+            if _source(doc) not in sources[i]:
+                cost += count_tokens(_header(doc)) + 1
+            if used + cost > max_tokens:
+                dropped[i] += 1
+                continue
+            used += cost
+            kept[i].append(doc)
+            sources[i].add(_source(doc))
+
+    texts = [_render(docs) for docs in kept]
+    tokens = [count_tokens(text) for text in texts]
+    # Token counts of the pieces are an estimate; drop the least relevant chunks until the texts really fit
+    while sum(tokens) > max_tokens and any(kept):
+        i = max(range(len(kept)), key=lambda j: len(kept[j]))
+        kept[i].pop()
+        dropped[i] += 1
+        texts[i] = _render(kept[i])
+        tokens[i] = count_tokens(texts[i])
+
+    return [PackedContext(text, num_tokens, count_tokens(format_docs(list(docs))), len(docs_kept), num_duplicates, num_dropped) for text, num_tokens, docs, docs_kept, num_duplicates, num_dropped in zip(texts, tokens, results, kept, duplicates, dropped)]
+
+
+def pack_context(docs: Sequence[Document], max_tokens: int = CONTEXT_MAX_TOKENS) -> PackedContext:
+    return pack_contexts([docs], max_tokens)[0]
+
+
+def record_usage(config: Optional[RunnableConfig], packed: Sequence[PackedContext]) -> None:
+    """Add packed to the request's ContextUsage, if it has one"""
+    usage = ensure_config(config).get("configurable", {}).get(CONTEXT_USAGE_CONFIG_KEY)
+    if usage is not None:
+        usage.add(packed)
+    for context in packed:
+        logger.debug(f"Packed {context.chunks} chunks into {context.tokens} tokens ({context.original_tokens} unpacked, {context.duplicates} duplicates, {context.dropped} over budget)")
+
+
+def context_packer(max_tokens: int = CONTEXT_MAX_TOKENS) -> Runnable:
+    """Runnable turning a ranked list of retrieved documents into context text (see pack_contexts)"""
+
+    def pack(docs: List[Document], config: RunnableConfig) -> str:
+        packed = pack_context(docs, max_tokens)
+        record_usage(config, [packed])
+        return packed.text
+
+    return RunnableLambda(pack, name="pack_context")
+
+
+def joint_context_packer(max_tokens: int = CONTEXT_MAX_TOKENS) -> Runnable:
+    """Runnable turning several ranked lists that share one prompt into one context text each, within one budget"""
+
+    def pack(results: List[List[Document]], config: RunnableConfig) -> List[str]:
+        packed = pack_contexts(results, max_tokens)
+        record_usage(config, packed)
+        return [context.text for context in packed]
+
+    return RunnableLambda(pack, name="pack_contexts")
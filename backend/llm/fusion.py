@@ -0,0 +1,131 @@
+"""
+Fusion of several ranked retrieval results into one list.
+
+Documents are keyed by their stable chunk id (Document.id, set by the vector
+store) and mapped to small integers once; every fusion method then works on
+numpy arrays of those integers, and the fused list is materialized once at
+the end by picking the first retrieved copy of each chunk. Nothing is
+serialized, unlike fingerprinting each Document with langchain dumps/loads.
+
+Methods:
+- union:        every chunk once, ordered by its best rank in any list
+- rrf:          reciprocal rank fusion, sum of 1 / (k + rank)
+- weighted_rrf: RRF with a weight per result list
+- combsum:      sum of each list's min-max normalized search scores
+                (metadata[SCORE_METADATA_KEY], see NefacRetriever.include_scores)
+"""
+
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from llm.constant import RRF_K
+from vector.store import SCORE_METADATA_KEY
+
+FUSION_METHODS = ("union", "rrf", "weighted_rrf", "combsum")
+
+
+def document_key(doc: Document) -> Hashable:
+    """Stable chunk id of a retrieved document; content and source for documents without one"""
+    if doc.id is not None:
+        return doc.id
+    return (doc.page_content, doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def encode_results(results: Sequence[Sequence[Document]]) -> Tuple[List[np.ndarray], List[Document]]:
+    """
+    Map the documents of each result list to integer ids.
+
+    Returns:
+        Tuple[List[np.ndarray], List[Document]]: The ids of each list in rank
+        order, and the first retrieved copy of each chunk, indexed by id.
+    """
+    ids: Dict[Hashable, int] = {}
+    documents: List[Document] = []
+    rankings = []
+    for docs in results:
+        ranking = np.empty(len(docs), dtype=np.int64)
+        for rank, doc in enumerate(docs):
+            key = document_key(doc)
+            _id = ids.get(key)
+            if _id is None:
+                _id = ids[key] = len(documents)
+                documents.append(doc)
+            ranking[rank] = _id
+        rankings.append(ranking)
+    return rankings, documents
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def fuse_ids(
+    rankings: Sequence[np.ndarray],
+    method: str = "rrf",
+    scores: Optional[Sequence[np.ndarray]] = None,
+    weights: Optional[Sequence[float]] = None,
+    k: int = RRF_K,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked lists of integer ids.
+
+    Args:
+        rankings (Sequence[np.ndarray]): Ids of each result list, best first.
+        method (str): One of FUSION_METHODS.
+        scores (Optional[Sequence[np.ndarray]]): Search score of each id, per list (combsum only).
+        weights (Optional[Sequence[float]]): Weight of each list (weighted_rrf only, default 1).
+        k (int): RRF rank constant.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Fused ids, best first, and their fused scores.
+        Ties keep the order in which the ids were first retrieved.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method}; expected one of {FUSION_METHODS}")
+    if not rankings or not any(len(ranking) for ranking in rankings):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    ids = np.concatenate(rankings)
+    ranks = np.concatenate([np.arange(len(ranking)) for ranking in rankings])
+    num_ids = int(ids.max()) + 1
+
+    if method == "union":
+        fused = np.full(num_ids, -np.inf)
+        np.maximum.at(fused, ids, -ranks.astype(np.float64))
+    elif method == "combsum":
+        if scores is None:
+            raise ValueError("combsum fusion needs the search scores of every list")
+        fused = np.bincount(ids, weights=np.concatenate([_min_max(np.asarray(s, dtype=np.float64)) for s in scores]), minlength=num_ids)
+    else:
+        contributions = 1.0 / (k + ranks)
+        if method == "weighted_rrf" and weights is not None:
+            contributions *= np.repeat(np.asarray(weights, dtype=np.float64), [len(ranking) for ranking in rankings])
+        fused = np.bincount(ids, weights=contributions, minlength=num_ids)
+
+    present = np.zeros(num_ids, dtype=bool)
+    present[ids] = True
+    candidates = np.flatnonzero(present)
+    order = candidates[np.argsort(-fused[candidates], kind="stable")]
+    return order, fused[order]
+
+
+def fuse(
+    results: Sequence[Sequence[Document]],
+    method: str = "rrf",
+    weights: Optional[Sequence[float]] = None,
+    k: int = RRF_K,
+) -> List[Document]:
+    """Fuse ranked lists of retrieved documents into one list, each chunk once (see fuse_ids)"""
+    rankings, documents = encode_results(results)
+    scores = None
+    if method == "combsum":
+        scores = [np.array([doc.metadata.get(SCORE_METADATA_KEY, 0.0) for doc in docs], dtype=np.float64) for docs in results]
+    order, _ = fuse_ids(rankings, method, scores=scores, weights=weights, k=k)
+    return [documents[_id] for _id in order]
@@ -1,5 +1,5 @@
 import logging
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Iterable, Mapping, Optional
 
 from llm.chain import middleware_qa
 
@@ -7,11 +7,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def ask_llm_stream(_: object, query: str, convoHistory: str = "") -> AsyncGenerator[str, None]:
+async def ask_llm_stream(_: object, query: str, convoHistory: str = "", tag_filter: Optional[Mapping[str, Iterable[str]]] = None) -> AsyncGenerator[str, None]:
     """
     Stream responses from the new clean LLM implementation.
-    Now uses the improved 5-query vector search approach.
+    Now uses the improved 5-query vector search approach, restricted to
+    chunks with the tags in tag_filter when one is given.
     """
-    logger.info(f"Query: {query}")
-    async for chunk in middleware_qa(query, convoHistory):
+    logger.info(f"Query: {query}" + (f" (tags: {tag_filter})" if tag_filter else ""))
+    async for chunk in middleware_qa(query, convoHistory, tag_filter=tag_filter):
         yield chunk
@@ -0,0 +1,67 @@
+import logging
+from typing import Literal
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable, RunnableBranch, RunnableLambda, RunnablePassthrough
+from pydantic import BaseModel, Field
+
+from prompts import QUERY_CLASSIFIER_PROMPT, QUERY_PLANNER_PROMPT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Intent = Literal["document request", "general query"]
+Strategy = Literal["multiquery", "ragfusion", "stepback", "decompose", "hyde", "default"]
+
+
+class QueryClassification(BaseModel):
+    """Intent and retrieval strategy for a question that needs no reformulation."""
+
+    intent: Intent = Field(description="Whether the user wants documents/resources or a general answer")
+    strategy: Strategy = Field(description="The query transformation strategy to use for retrieval")
+    dependent_sub_questions: bool = Field(default=False, description="For 'decompose' only: whether each sub-question can only be answered using the answer to the previous one")
+
+
+class QueryPlan(QueryClassification):
+    """Standalone question, intent and retrieval strategy from a single LLM call."""
+
+    standalone_question: str = Field(description="The latest user question rewritten so it can be understood without the chat history")
+
+
+def get_query_planner(model: BaseChatModel) -> Runnable:
+    """
+    Build the single-pass query planner.
+
+    Replaces the contextualize -> intent classification -> method selection
+    round trips with one structured-output call. When there is no chat history
+    the question is already standalone, so contextualization is skipped.
+
+    Returns:
+        Runnable: Takes {"question", "chat_history"} and returns
+        {"question", "intent", "strategy", "dependent"}.
+    """
+    planner = (
+        ChatPromptTemplate.from_messages(
+            [
+                ("system", QUERY_PLANNER_PROMPT),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("human", "{question}"),
+            ]
+        )
+        | model.with_structured_output(QueryPlan, method="function_calling")
+        | RunnableLambda(lambda plan: {"question": plan.standalone_question, "intent": plan.intent, "strategy": plan.strategy, "dependent": plan.dependent_sub_questions})
+    )
+
+    classification = ChatPromptTemplate.from_messages(
+        [
+            ("system", QUERY_CLASSIFIER_PROMPT),
+            ("human", "{question}"),
+        ]
+    ) | model.with_structured_output(QueryClassification, method="function_calling")
+    classifier = RunnablePassthrough.assign(plan=classification) | RunnableLambda(lambda x: {"question": x["question"], "intent": x["plan"].intent, "strategy": x["plan"].strategy, "dependent": x["plan"].dependent_sub_questions})
+
+    return RunnableBranch(
+        (lambda x: bool(x.get("chat_history")), planner),
+        classifier,
+    ).with_config(tags=["query_planner"])
@@ -1,12 +1,13 @@
 from operator import itemgetter
 
+from langchain_core.language_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 
-from llm.constant import QUERY_TRANSLATION_MODEL_NAME
-from llm.utils import format_docs
+from llm.constant import DECOMPOSITION_MAX_CONCURRENCY, QUERY_TRANSLATION_MODEL_NAME
+from llm.context import context_packer
 from load_env import load_env
 from prompts import DECOMPOSITION_PROMPT, FINAL_SYNTHESIS_TEMPLATE, QA_TEMPLATE
 
@@ -14,41 +15,71 @@ load_env()
 
 model = ChatOpenAI(temperature=0, model_name=QUERY_TRANSLATION_MODEL_NAME)
 
-generate_queries_decomposition = ChatPromptTemplate.from_template(DECOMPOSITION_PROMPT) | model | StrOutputParser() | (lambda x: x.strip().split("\n"))
-
 qa_template = QA_TEMPLATE
 
-rag_chain = (
-    {
-        "context": itemgetter("context"),
-        "sub_question": itemgetter("sub_question"),
-        "q_a_pairs": itemgetter("q_a_pairs"),
-    }
-    | ChatPromptTemplate.from_template(qa_template)
-    | model
-    | StrOutputParser()
-)
 
+def _decomposition_input(x):
+    """Question and dependency flag from the strategy router input (or a bare question)"""
+    if isinstance(x, dict):
+        return {"question": x["question"], "dependent": bool(x.get("dependent", False))}
+    return {"question": x, "dependent": False}
+
+
+def _q_a_pair(sub_question, answer):
+    return f"Question: {sub_question}\nAnswer: {answer}"
+
+
+def get_decomposition_chain(retriever, model: BaseChatModel = model, max_concurrency: int = DECOMPOSITION_MAX_CONCURRENCY):
+    """
+    Decomposition Chain
+
+    Independent sub-questions are answered concurrently, at most max_concurrency
+    at a time. When the planner marks them as dependent, they are answered in
+    order, each one seeing the previous question/answer pairs.
+    """
+    generate_queries_decomposition = ChatPromptTemplate.from_template(DECOMPOSITION_PROMPT) | model | StrOutputParser() | (lambda x: x.strip().split("\n"))
+
+    rag_chain = (
+        {
+            "context": itemgetter("context"),
+            "sub_question": itemgetter("sub_question"),
+            "q_a_pairs": itemgetter("q_a_pairs"),
+        }
+        | ChatPromptTemplate.from_template(qa_template)
+        | model
+        | StrOutputParser()
+    )
+    batch_config = {"max_concurrency": max_concurrency}
+
+    def sub_question_inputs(input_dict):
+        return [{"sub_question": sub_question, "q_a_pairs": "", "context": context} for sub_question, context in zip(input_dict["sub_questions"], input_dict["contexts"])]
+
+    def synthesis_input(input_dict, q_a_pairs):
+        return {"context": "\n---\n".join(q_a_pairs), "question": input_dict["question"]}
 
-def get_decomposition_chain(retriever):
     def process_sub_questions(input_dict):
-        sub_questions = input_dict["sub_questions"]
-        main_question = input_dict["question"]
-        contexts = input_dict["contexts"]
+        inputs = sub_question_inputs(input_dict)
+        if not input_dict["dependent"]:
+            answers = rag_chain.batch(inputs, config=batch_config)
+            return synthesis_input(input_dict, [_q_a_pair(x["sub_question"], answer) for x, answer in zip(inputs, answers)])
+
+        q_a_pairs = []
+        for x in inputs:
+            answer = rag_chain.invoke({**x, "q_a_pairs": "\n---\n".join(q_a_pairs)})
+            q_a_pairs.append(_q_a_pair(x["sub_question"], answer))
+        return synthesis_input(input_dict, q_a_pairs)
+
+    async def aprocess_sub_questions(input_dict):
+        inputs = sub_question_inputs(input_dict)
+        if not input_dict["dependent"]:
+            answers = await rag_chain.abatch(inputs, config=batch_config)
+            return synthesis_input(input_dict, [_q_a_pair(x["sub_question"], answer) for x, answer in zip(inputs, answers)])
 
         q_a_pairs = []
-        for i in range(len(sub_questions)):
-            current_context = "\n---\n".join(q_a_pairs) if q_a_pairs else ""
-            answer = rag_chain.invoke(
-                {
-                    "sub_question": sub_questions[i],
-                    "q_a_pairs": current_context,
-                    "context": contexts[i],
-                }
-            )
-            q_a_pairs.append(f"Question: {sub_questions[i]}\nAnswer: {answer}")
-
-        return {"context": "\n---\n".join(q_a_pairs), "question": main_question}
+        for x in inputs:
+            answer = await rag_chain.ainvoke({**x, "q_a_pairs": "\n---\n".join(q_a_pairs)})
+            q_a_pairs.append(_q_a_pair(x["sub_question"], answer))
+        return synthesis_input(input_dict, q_a_pairs)
 
     final_template = FINAL_SYNTHESIS_TEMPLATE
 
@@ -56,16 +87,18 @@ def get_decomposition_chain(retriever):
     final_rag_chain = final_prompt | model | StrOutputParser()
 
     return (
-        RunnableLambda(lambda x: {"question": x})
+        RunnableLambda(_decomposition_input)
         | {
             "question": itemgetter("question"),
+            "dependent": itemgetter("dependent"),
             "sub_questions": {"question": itemgetter("question")} | generate_queries_decomposition,
         }
         | {
             "sub_questions": itemgetter("sub_questions"),
-            "contexts": itemgetter("sub_questions") | (retriever | format_docs).map(),
+            "contexts": itemgetter("sub_questions") | (retriever | context_packer()).map(),
             "question": itemgetter("question"),
+            "dependent": itemgetter("dependent"),
         }
-        | RunnableLambda(process_sub_questions)
+        | RunnableLambda(process_sub_questions, afunc=aprocess_sub_questions)
         | final_rag_chain
     )
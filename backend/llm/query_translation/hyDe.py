@@ -3,6 +3,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
 from llm.constant import QUERY_TRANSLATION_MODEL_NAME
+from llm.context import context_packer
 from prompts import HYDE_FINAL_PROMPT, HYDE_GENERATION_PROMPT
 
 model = ChatOpenAI(temperature=0, model_name=QUERY_TRANSLATION_MODEL_NAME)
@@ -18,7 +19,7 @@ def get_hyDe_chain(retriever):
     """Get the HyDE chain."""
     hyde_rag_chain = (
         # Generate hypothetical document
-        {"context": hyde_generation | retriever, "question": lambda x: x["question"]}
+        {"context": hyde_generation | retriever | context_packer(), "question": lambda x: x["question"]}
         | final_prompt
         | model
         | StrOutputParser()
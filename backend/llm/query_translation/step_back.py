@@ -1,9 +1,10 @@
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_openai import ChatOpenAI
 
 from llm.constant import QUERY_TRANSLATION_MODEL_NAME
+from llm.context import joint_context_packer
 from load_env import load_env
 from prompts import STEP_BACK_RESPONSE_PROMPT, STEP_BACK_SYSTEM_PROMPT
 
@@ -53,10 +54,14 @@ response_prompt = ChatPromptTemplate.from_template(STEP_BACK_RESPONSE_PROMPT)
 
 
 def get_step_back_chain(retriever):
+    # Both questions are retrieved in one batch once the step-back question exists, and
+    # their results packed into one context budget (a chunk both retrieved appears once)
     return (
-        {
-            "normal_context": RunnableLambda(lambda x: x["question"]) | retriever,
-            "step_back_context": generate_step_back_question | retriever,
+        RunnablePassthrough.assign(step_back_question=generate_step_back_question)
+        | RunnablePassthrough.assign(contexts=RunnableLambda(lambda x: [x["question"], x["step_back_question"]]) | retriever.map() | joint_context_packer())
+        | {
+            "normal_context": RunnableLambda(lambda x: x["contexts"][0]),
+            "step_back_context": RunnableLambda(lambda x: x["contexts"][1]),
             "question": RunnableLambda(lambda x: x["question"]),
         }
         | response_prompt
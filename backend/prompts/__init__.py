@@ -11,6 +11,8 @@ from .chain import (
     GENERAL_PROMPT,
     INTENT_CLASSIFICATION_PROMPT,
     METHOD_SELECTION_PROMPT,
+    QUERY_CLASSIFIER_PROMPT,
+    QUERY_PLANNER_PROMPT,
     RETRIEVAL_PROMPT,
 )
 
@@ -44,7 +46,7 @@ from .step_back import (
 )
 
 # Import prompts from youtube_loader.py
-from .youtube_loader import TRANSCRIPT_CLEANING_PROMPT
+from .youtube_loader import TRANSCRIPT_CLEANING_PROMPT, TRANSCRIPT_PACKED_CLEANING_PROMPT
 
 __all__ = [
     # Chain prompts
@@ -53,8 +55,11 @@ __all__ = [
     "RETRIEVAL_PROMPT",
     "GENERAL_PROMPT",
     "INTENT_CLASSIFICATION_PROMPT",
+    "QUERY_PLANNER_PROMPT",
+    "QUERY_CLASSIFIER_PROMPT",
     # YouTube loader prompts
     "TRANSCRIPT_CLEANING_PROMPT",
+    "TRANSCRIPT_PACKED_CLEANING_PROMPT",
     # Query translation prompts
     "MULTI_QUERY_PERSPECTIVES_PROMPT",
     "DECOMPOSITION_PROMPT",
@@ -86,3 +86,31 @@ Examples:
 - "Do you have documents on data privacy laws?" → document request
 
 Respond with 'document request' or 'general query'."""
+
+# ============================================================================
+# QUERY PLANNER PROMPTS
+# ============================================================================
+_PLAN_INSTRUCTIONS = """Determine the user's intent:
+- 'document request' if the user is requesting specific information, documents, resources, or media on any particular topic.
+- 'general query' if the user is asking a general question, making a statement, or seeking broad explanations.
+Ignore whether the topic is related to NEFAC's focus areas; focus solely on the structure and intent of the query.
+
+Then choose the best query transformation strategy for searching NEFAC's database of YouTube transcripts, FOI guides and First Amendment resources:
+- multiquery - ambiguous questions
+- ragfusion - complex questions
+- stepback - specific questions needing context
+- decompose - multi-part questions
+- hyde - technical questions
+- default - straightforward questions
+
+For 'decompose', also say whether the sub-questions are dependent: true only when a later part of the question can only be answered using the answer to an earlier one (e.g. "Which law applies, and what is its appeal deadline?"). Leave it false when the parts can be answered independently."""
+
+QUERY_PLANNER_PROMPT = f"""You are the query planner for NEFAC, the New England First Amendment Coalition.
+
+First, given the chat history and the latest user question, formulate a standalone question that can be understood without the chat history. Do NOT answer it, just reformulate if needed.
+
+{_PLAN_INSTRUCTIONS}"""
+
+QUERY_CLASSIFIER_PROMPT = f"""You are the query planner for NEFAC, the New England First Amendment Coalition.
+
+{_PLAN_INSTRUCTIONS}"""
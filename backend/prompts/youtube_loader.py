@@ -33,3 +33,42 @@ Cleaned: NEFAC has been working on a new project.
 Now, clean the following transcript text:
 Raw: "{input_text}"
 Cleaned:"""
+
+# ============================================================================
+# PACKED TRANSCRIPT CLEANING PROMPT
+# ============================================================================
+# Several clips in one request; each comes back between the same markers
+TRANSCRIPT_PACKED_CLEANING_PROMPT = """You are a professional transcript editor specializing in cleaning auto-generated YouTube transcripts for NEFAC (New England First Amendment Coalition). Your task is to:
+1. Correct grammar, punctuation, and spelling errors.
+2. Remove filler words (e.g., "um," "uh," "like") and redundant phrases.
+3. Remove YouTube-specific artifacts (e.g., "[Music]," "[Applause]").
+4. Standardize proper names to their most likely correct form.
+5. Ensure the text is clear, concise, and preserves the original meaning.
+6. Fix all spellings of NEFAC (e.g. kneefact -> NEFAC)
+
+The transcript below is split into {clip_count} numbered clips. Clean each clip independently and return every clip, in order, between the same markers it came in, e.g.:
+<clip 1>
+cleaned text of clip 1
+</clip 1>
+Do not merge, split, drop or add clips, and return nothing outside the markers.
+
+Example:
+<clip 1>
+Um, so like, we're gonna talk about, uh, AI today and stuff.
+</clip 1>
+<clip 2>
+kneefact has been working on a, uh, [Music] new project.
+</clip 2>
+
+Cleaned:
+<clip 1>
+We're going to talk about AI today.
+</clip 1>
+<clip 2>
+NEFAC has been working on a new project.
+</clip 2>
+
+Now, clean the following clips:
+{input_clips}
+
+Cleaned:"""
@@ -12,6 +12,41 @@ class LoadingStatusResponse(BaseModel):
     total: int
     status: str
     is_loading: bool
+    # Checkpoint number served by the worker that answered, and the latest one published
+    generation: int = 0
+    published_generation: int = 0
+    worker_pid: Optional[int] = None
+
+
+class AnswerCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    expirations: int
+    invalidations: int
+    generation: Optional[int] = None
+
+
+class EmbeddingCacheStats(BaseModel):
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    hit_rate: float
+    memory_entries: int
+    memory_bytes: int
+    disk_entries: int
+    disk_bytes: int
+
+
+class CacheStatusResponse(BaseModel):
+    """
+    Defines the response schema for the /cache-status endpoint.
+    """
+
+    answer_cache: AnswerCacheStats
+    embedding_cache: EmbeddingCacheStats
 
 
 # Schemas for the /ask-llm streaming response events
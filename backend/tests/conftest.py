@@ -0,0 +1,70 @@
+"""
+Shared fixtures: small on-disk vector stores with deterministic fake
+embeddings, so no test calls the OpenAI API.
+"""
+
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector.docstore import MmapDocstore
+from vector.persistence import vector_file_path, write_checkpoint
+from vector.store import NefacFAISS
+from vector.vector_file import Float16VectorFile
+
+DIMENSIONS = 32
+
+
+def pytest_configure(config):
+    # Modules build their OpenAI clients when imported; no test sends a request
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=DIMENSIONS)
+
+
+@pytest.fixture
+def new_store(embeddings):
+    """Factory of empty writable stores (flat unless given a trained index), created in a directory the way vector.ingest creates one"""
+
+    def make(path, dimensions=DIMENSIONS, store_embeddings=None, index=None):
+        os.makedirs(path, exist_ok=True)
+        return NefacFAISS(
+            embedding_function=store_embeddings or embeddings,
+            index=index if index is not None else faiss.IndexFlatIP(dimensions),
+            docstore=MmapDocstore.create(path, {}),
+            index_to_docstore_id={},
+            vector_file=Float16VectorFile.create(vector_file_path(path), np.zeros((0, dimensions))),
+        )
+
+    return make
+
+
+@pytest.fixture
+def published_store(embeddings):
+    """Factory writing a checkpoint of num_vectors random unit vectors to a directory, as the ingestion process publishes one"""
+
+    def make(path, num_vectors, dimensions=DIMENSIONS, store_embeddings=None):
+        vectors = np.random.default_rng(0).standard_normal((num_vectors, dimensions)).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        index = faiss.IndexFlatIP(dimensions)
+        index.add(vectors)
+        ids = [str(i) for i in range(num_vectors)]
+        os.makedirs(path, exist_ok=True)
+        store = NefacFAISS(
+            embedding_function=store_embeddings or embeddings,
+            index=index,
+            docstore=MmapDocstore.create(path, {_id: Document(page_content=f"chunk {_id}", metadata={"title": f"doc {int(_id) // 10}"}) for _id in ids}),
+            index_to_docstore_id=dict(enumerate(ids)),
+            vector_file=Float16VectorFile.create(vector_file_path(path), vectors),
+        )
+        write_checkpoint(store, path)
+        return store
+
+    return make
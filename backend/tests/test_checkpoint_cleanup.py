@@ -0,0 +1,43 @@
+"""
+A web worker keeps serving the checkpoint it loaded after the writer has
+published newer ones and removed that checkpoint's files.
+"""
+
+import os
+
+from langchain_core.documents import Document
+
+from vector.docstore import TEXT_FILE_NAME
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog, load_checkpoint, read_manifest
+from vector.store import VECTOR_FILE_NAME, ThreadSafeVectorStore
+
+
+def chunks(document_key, count=5):
+    return [Document(page_content=f"{document_key} chunk {i}", metadata={"title": document_key}) for i in range(count)]
+
+
+def test_worker_searches_a_checkpoint_whose_files_were_removed(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    for number in range(10):
+        writer.upsert_documents(f"doc {number}", chunks(f"doc {number}"))
+    writer.checkpoint()
+    served = load_checkpoint(path, embeddings, read_only=True)
+
+    # A compaction, then another checkpoint within the same poll interval
+    for number in range(5):
+        writer.delete_document(f"doc {number}")
+    writer.checkpoint()
+    writer.upsert_documents("doc 10", chunks("doc 10"))
+    writer.checkpoint()
+
+    assert read_manifest(path)["data"] != "."
+    assert not os.path.exists(os.path.join(path, served.checkpoint_name))
+    assert not os.path.exists(os.path.join(path, TEXT_FILE_NAME))
+    assert not os.path.exists(os.path.join(path, VECTOR_FILE_NAME))
+
+    results = served.similarity_search_by_vector(embeddings.embed_query("doc 2 chunk 3"), k=1)
+    assert [doc.page_content for doc in results] == ["doc 2 chunk 3"]
+    assert len(served.vectors()) == 50
+    hybrid = served.hybrid_search_with_score("doc 7 chunk 1", k=1)
+    assert hybrid[0][0].page_content == "doc 7 chunk 1"
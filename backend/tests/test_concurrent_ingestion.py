@@ -0,0 +1,68 @@
+"""
+Searches share a read lock and the writer only takes the write lock for the
+in-memory add, so queries do not wait on document embedding while ingestion runs.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog
+from vector.store import ThreadSafeVectorStore
+
+# Seconds each document embedding request takes
+EMBED_SECONDS = 0.2
+NUM_READERS = 4
+QUERY_SECONDS = 2
+
+
+class SlowDocumentEmbeddings(DeterministicFakeEmbedding):
+    """Document batches take EMBED_SECONDS, like an API call; queries are immediate"""
+
+    def embed_documents(self, texts):
+        time.sleep(EMBED_SECONDS)
+        return super().embed_documents(texts)
+
+
+def test_query_p99_stays_bounded_while_ingesting(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    store = ThreadSafeVectorStore(new_store(path, store_embeddings=SlowDocumentEmbeddings(size=embeddings.size)), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    store.upsert_documents("seed", [Document(page_content=f"seed chunk {i}") for i in range(200)])
+
+    stop = threading.Event()
+    upserted = []
+
+    def ingest():
+        while not stop.is_set():
+            number = len(upserted)
+            store.upsert_documents(f"doc {number}", [Document(page_content=f"doc {number} chunk {i}") for i in range(20)])
+            upserted.append(number)
+
+    def query(reader):
+        latencies = []
+        deadline = time.monotonic() + QUERY_SECONDS
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            assert len(store.similarity_search(f"question from reader {reader}", k=4)) == 4
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(NUM_READERS) as pool:
+            latencies = np.concatenate([np.array(result) for result in pool.map(query, range(NUM_READERS))])
+    finally:
+        stop.set()
+        writer.join()
+
+    # Ingestion made progress while the readers were searching
+    assert len(upserted) >= QUERY_SECONDS / EMBED_SECONDS / 2
+    assert store.vector_store.index.ntotal == 200 + 20 * len(upserted)
+    # No query waited on an embedding request
+    assert np.percentile(latencies, 99) < EMBED_SECONDS / 2
@@ -0,0 +1,83 @@
+"""Token-budgeted packing of retrieved chunks into prompt context"""
+
+import pytest
+from langchain_core.documents import Document
+
+from llm import context
+from llm.context import NO_DOCUMENTS, ContextUsage, count_tokens, pack_context, pack_contexts
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count tokens from the length, so the tests do not depend on downloading a BPE file
+    monkeypatch.setattr(context, "_encoding", lambda: None)
+
+
+def chunk(_id, text, title="Guide", source="https://nefac.org/guide"):
+    return Document(id=_id, page_content=text, metadata={"title": title, "source": source, "type": "pdf"})
+
+
+def test_duplicates_are_kept_once_under_one_header_per_source():
+    docs = [
+        chunk("a", "Public records requests must be answered within ten business days."),
+        chunk("b", "Agencies may charge for copies."),
+        chunk("a", "Public records requests must be answered within ten business days."),
+        chunk("c", "Agencies may charge for copies."),
+        chunk("d", "Open meetings require notice.", title="Meetings", source="https://nefac.org/meetings"),
+    ]
+
+    packed = pack_context(docs, max_tokens=1000)
+
+    assert packed.chunks == 3
+    assert packed.duplicates == 2
+    assert packed.dropped == 0
+    assert packed.text.count("title: Guide") == 1
+    assert packed.text.count("title: Meetings") == 1
+    assert packed.text.index("ten business days") < packed.text.index("charge for copies") < packed.text.index("require notice")
+    assert packed.tokens < packed.original_tokens
+
+
+def test_budget_keeps_the_most_relevant_chunks_that_fit():
+    docs = [chunk(str(i), f"chunk {i} " + "word " * 30) for i in range(10)]
+    budget = 150
+
+    packed = pack_context(docs, max_tokens=budget)
+
+    assert packed.tokens == count_tokens(packed.text) <= budget
+    assert 0 < packed.chunks < len(docs)
+    assert packed.dropped == len(docs) - packed.chunks
+    assert "chunk 0 " in packed.text
+    assert f"chunk {len(docs) - 1} " not in packed.text
+
+
+def test_a_smaller_chunk_can_fill_the_budget_after_a_large_one_is_dropped():
+    docs = [chunk("small", "short"), chunk("large", "long " * 200), chunk("tail", "also short")]
+
+    packed = pack_context(docs, max_tokens=60)
+
+    assert "short" in packed.text and "also short" in packed.text
+    assert "long long" not in packed.text
+    assert packed.dropped == 1
+
+
+def test_joint_contexts_share_the_budget_and_keep_a_shared_chunk_in_the_higher_ranked_list():
+    shared = chunk("shared", "Both chains retrieved this chunk.")
+    step_back = [chunk("s1", "General background."), shared]
+    direct = [shared, chunk("d1", "Specific detail.")]
+
+    step_back_context, direct_context = pack_contexts([step_back, direct], max_tokens=1000)
+
+    assert "Both chains retrieved" in direct_context.text
+    assert "Both chains retrieved" not in step_back_context.text
+    assert step_back_context.duplicates == 1
+
+
+def test_empty_results_and_usage_totals():
+    usage = ContextUsage()
+    packed = pack_contexts([[], [chunk("a", "text")]])
+    usage.add(packed)
+
+    assert packed[0].text == NO_DOCUMENTS
+    assert usage.contexts == 2
+    assert usage.tokens == sum(p.tokens for p in packed)
+    assert usage.saved_tokens == usage.original_tokens - usage.tokens
@@ -0,0 +1,102 @@
+"""Decomposition answers independent sub-questions concurrently and dependent ones in order"""
+
+import asyncio
+import re
+import threading
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from llm import context
+from llm.query_translation.decomposition import get_decomposition_chain
+
+_lock = threading.Lock()
+
+
+class StubChatModel(BaseChatModel):
+    """Answers after a fixed latency, recording every prompt and the most requests ever in flight"""
+
+    latency: float = 0.1
+    prompts: List[str] = []
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt = messages[-1].content
+        with _lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with _lock:
+            self.in_flight -= 1
+
+        if "break down" in prompt:
+            text = "sub 1\nsub 2\nsub 3"
+        elif "answering the following sub-question" in prompt:
+            text = "answer " + re.search(r"sub (\d)", prompt).group(1)
+        else:
+            text = "final answer"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def qa_prompts(self) -> List[str]:
+        return [prompt for prompt in self.prompts if "answering the following sub-question" in prompt]
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    monkeypatch.setattr(context, "_encoding", lambda: None)
+
+
+retriever = RunnableLambda(lambda query: [Document(id=query, page_content=f"context for {query}", metadata={"title": query})])
+
+
+def test_independent_sub_questions_are_answered_concurrently():
+    model = StubChatModel(prompts=[])
+    chain = get_decomposition_chain(retriever, model=model, max_concurrency=4)
+
+    assert chain.invoke("How do I appeal a records denial?") == "final answer"
+
+    assert len(model.qa_prompts()) == 3
+    assert model.max_in_flight == 3
+    assert not any("Question: sub" in prompt for prompt in model.qa_prompts())
+    synthesis = model.prompts[-1]
+    assert all(f"Question: sub {n}\nAnswer: answer {n}" in synthesis for n in (1, 2, 3))
+
+
+def test_concurrency_is_bounded():
+    model = StubChatModel(prompts=[])
+
+    get_decomposition_chain(retriever, model=model, max_concurrency=2).invoke("How do I appeal a records denial?")
+
+    assert model.max_in_flight == 2
+
+
+def test_dependent_sub_questions_see_the_previous_answers():
+    model = StubChatModel(prompts=[])
+    chain = get_decomposition_chain(retriever, model=model)
+
+    chain.invoke({"question": "How do I appeal a records denial?", "dependent": True})
+
+    assert model.max_in_flight == 1
+    last = model.qa_prompts()[-1]
+    assert "Question: sub 1\nAnswer: answer 1" in last
+    assert "Question: sub 2\nAnswer: answer 2" in last
+
+
+def test_async_path_is_concurrent_too():
+    model = StubChatModel(prompts=[])
+    chain = get_decomposition_chain(retriever, model=model, max_concurrency=4)
+
+    assert asyncio.run(chain.ainvoke("How do I appeal a records denial?")) == "final answer"
+    assert model.max_in_flight == 3
@@ -0,0 +1,22 @@
+"""A DiskCache that cannot be read or written behaves as an empty cache instead of failing its caller"""
+
+from disk_cache import DiskCache
+
+
+def test_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    cache.set_many([("a", b"1"), ("b", b"2")])
+
+    assert cache.get("a") == b"1"
+    assert cache.get("missing") is None
+    assert cache.get_many(["a", "b", "missing"]) == {"a": b"1", "b": b"2"}
+
+
+def test_corrupt_file_is_a_miss(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"not a database" * 100)
+    cache = DiskCache(str(path))
+
+    assert cache.get("a") is None
+    assert cache.get_many(["a", "b"]) == {}
+    cache.set_many([("a", b"1")])
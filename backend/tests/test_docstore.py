@@ -0,0 +1,68 @@
+"""The memory-mapped columnar docstore"""
+
+import pytest
+from langchain_core.documents import Document
+
+from vector.docstore import MmapDocstore
+
+
+def documents(*ids):
+    return {_id: Document(page_content=f"text of {_id} ✓", metadata={"title": f"title {_id}", "page": 3}) for _id in ids}
+
+
+def test_search_returns_the_added_documents(tmp_path):
+    docstore = MmapDocstore.create(str(tmp_path), documents("a", "b"))
+    docstore.add(documents("c"))
+
+    found = docstore.search("c")
+    assert found.page_content == "text of c ✓"
+    assert found.metadata == {"title": "title c", "page": 3}
+    assert found.id == "c"
+    assert len(docstore) == 3
+    assert docstore.search("missing") == "ID missing not found."
+    with pytest.raises(ValueError):
+        docstore.add(documents("a"))
+
+
+def test_deleted_ids_are_gone_but_keep_their_record(tmp_path):
+    docstore = MmapDocstore.create(str(tmp_path), documents("a", "b", "c"))
+    docstore.delete(["b"])
+
+    assert "b" not in docstore
+    assert docstore.record_ids() == ["a", None, "c"]
+    assert docstore.search("c").page_content == "text of c ✓"
+    with pytest.raises(ValueError):
+        docstore.delete(["b"])
+
+
+def test_open_drops_records_written_after_the_checkpoint(tmp_path):
+    docstore = MmapDocstore.create(str(tmp_path), documents("a", "b"))
+    checkpoint_ids = docstore.record_ids()
+    docstore.add(documents("c", "d"))
+
+    reopened = MmapDocstore.open(str(tmp_path), checkpoint_ids)
+    reopened.add(documents("e"))
+
+    assert reopened.record_ids() == ["a", "b", "e"]
+    assert reopened.search("e").page_content == "text of e ✓"
+    assert reopened.search("b").page_content == "text of b ✓"
+
+
+def test_columns_are_remapped_once_they_grow(tmp_path):
+    docstore = MmapDocstore.create(str(tmp_path), documents("a"))
+    assert docstore.search("a").page_content == "text of a ✓"
+
+    docstore.add(documents("b"))
+
+    assert docstore.search("b").page_content == "text of b ✓"
+
+
+def test_copy_to_another_directory(tmp_path):
+    docstore = MmapDocstore.create(str(tmp_path / "old"), documents("a", "b"))
+    docstore.delete(["a"])
+
+    copy = docstore.copy_to(str(tmp_path / "new"))
+
+    assert copy.directory == str(tmp_path / "new")
+    assert copy.record_ids() == [None, "b"]
+    assert copy.search("b").page_content == "text of b ✓"
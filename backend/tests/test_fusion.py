@@ -0,0 +1,65 @@
+"""Fusion of ranked result lists by chunk id"""
+
+import pytest
+from langchain_core.documents import Document
+
+from llm.fusion import fuse
+from vector.store import SCORE_METADATA_KEY
+
+
+def doc(_id, score=0.0, copy=0):
+    return Document(id=_id, page_content=f"text of {_id}", metadata={SCORE_METADATA_KEY: score, "copy": copy})
+
+
+def ids(docs):
+    return [d.id for d in docs]
+
+
+def test_union_keeps_each_chunk_once_by_best_rank():
+    results = [[doc("a"), doc("b"), doc("c")], [doc("d"), doc("c", copy=1), doc("a", copy=1)]]
+
+    fused = fuse(results, "union")
+
+    assert ids(fused) == ["a", "d", "b", "c"]
+    # The first retrieved copy of each chunk is the one returned
+    assert all(d.metadata["copy"] == 0 for d in fused)
+
+
+def test_rrf_matches_the_reciprocal_rank_formula():
+    results = [[doc("a"), doc("b"), doc("c")], [doc("c"), doc("d")], [doc("b"), doc("c")]]
+    k = 60
+    expected = {}
+    for docs in results:
+        for rank, d in enumerate(docs):
+            expected[d.id] = expected.get(d.id, 0.0) + 1 / (k + rank)
+
+    assert ids(fuse(results, "rrf", k=k)) == sorted(expected, key=lambda _id: -expected[_id])
+
+
+def test_weighted_rrf_favours_the_heavier_list():
+    results = [[doc("a"), doc("b")], [doc("b"), doc("a")]]
+
+    assert ids(fuse(results, "weighted_rrf", weights=[2.0, 1.0])) == ["a", "b"]
+    assert ids(fuse(results, "weighted_rrf", weights=[1.0, 2.0])) == ["b", "a"]
+
+
+def test_combsum_adds_normalized_scores():
+    results = [[doc("a", 0.9), doc("b", 0.5), doc("c", 0.1)], [doc("c", 0.8), doc("b", 0.7), doc("a", 0.2)]]
+
+    # a: 1 + 0, b: 0.5 + 5/6, c: 0 + 1
+    assert ids(fuse(results, "combsum")) == ["b", "a", "c"]
+
+
+def test_documents_without_ids_are_keyed_by_content_and_source():
+    first = Document(page_content="same", metadata={"source": "x", "page": 1})
+    second = Document(page_content="same", metadata={"source": "x", "page": 1})
+    other_page = Document(page_content="same", metadata={"source": "x", "page": 2})
+
+    assert fuse([[first], [second, other_page]], "rrf") == [first, other_page]
+
+
+def test_empty_and_unknown_methods():
+    assert fuse([], "rrf") == []
+    assert fuse([[], []], "union") == []
+    with pytest.raises(ValueError):
+        fuse([[doc("a")]], "borda")
@@ -0,0 +1,58 @@
+"""BM25 lexical index and hybrid dense + lexical search"""
+
+import numpy as np
+
+from vector.lexical import LexicalIndex, tokenize
+
+STATUTE = "RSA 91-A:4 requires a response within five business days."
+
+
+def test_joined_identifiers_are_indexed_whole_by_prefix_and_by_part():
+    tokens = tokenize("See RSA 91-A:4 and the G.L. c. 66")
+
+    assert {"rsa", "91-a:4", "91-a", "91", "4", "g.l", "66"} <= set(tokens)
+    assert not {"a", "and", "the"} & set(tokens)
+
+
+def test_bm25_ranks_shorter_matching_rows_first_and_skips_the_rest():
+    index = LexicalIndex.build(["statute 91-A:4 governs requests", "meetings need notice", "records requests"])
+
+    rows, scores = index.search("requests", k=3)
+    assert rows.tolist() == [2, 0]
+    assert scores[0] > scores[1] > 0
+
+    assert index.search("91-a", k=3)[0].tolist() == [0]
+    assert index.search("requests", k=3, exclude=[2])[0].tolist() == [0]
+    assert index.search("zoning", k=3)[0].tolist() == []
+
+
+def test_rows_added_after_a_build_are_searchable():
+    index = LexicalIndex.build(["meetings need notice"])
+    index.add(["records requests", "more meetings"])
+
+    assert index.num_rows == 3
+    assert sorted(index.search("meetings", k=3)[0].tolist()) == [0, 2]
+
+
+def test_a_saved_index_loads_memory_mapped_with_the_same_scores(tmp_path):
+    index = LexicalIndex.build(["statute 91-A:4 governs requests", "meetings need notice", "records requests"])
+    index.save(str(tmp_path))
+
+    loaded = LexicalIndex.load(str(tmp_path), mmap=True)
+
+    assert isinstance(loaded.rows, np.memmap)
+    np.testing.assert_array_equal(loaded.scores("records requests"), index.scores("records requests"))
+    assert LexicalIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_hybrid_search_finds_an_exact_citation_the_embeddings_miss(tmp_path, new_store):
+    store = new_store(str(tmp_path))
+    ids = store.add_texts([f"Filler chunk {i} about open government." for i in range(30)] + [STATUTE])
+    query = "What does 91-A:4 require?"
+
+    assert STATUTE not in [doc.page_content for doc in store.similarity_search(query, k=3)]
+    assert STATUTE in [doc.page_content for doc, _ in store.hybrid_search_with_score(query, k=3)]
+    assert [doc.page_content for doc, _ in store.hybrid_search_with_score(query, k=1, dense_weight=0.2)] == [STATUTE]
+
+    store.delete([ids[-1]])
+    assert STATUTE not in [doc.page_content for doc, _ in store.hybrid_search_with_score(query, k=3)]
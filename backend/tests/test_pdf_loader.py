@@ -0,0 +1,78 @@
+"""Parsing PDFs page by page in a process pool, skipping contents already loaded"""
+
+import shutil
+
+import pytest
+from langchain_core.documents import Document
+
+from document.pdf_loader import PDF_BACKENDS, content_hash, load_pdfs, parse_pdf
+
+
+def write_pdf(path, pages):
+    """A minimal PDF with one line of Helvetica text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(pages))
+
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_contents_already_loaded_are_skipped_without_parsing(tmp_path):
+    pdf_path = write_pdf(tmp_path / "Guide.pdf", ["Public records"])
+    renamed = str(tmp_path / "Renamed_Guide.pdf")
+    shutil.copy(pdf_path, renamed)
+    loaded = {"Guide": [Document(page_content="Public records", metadata={"content_hash": content_hash(pdf_path)})]}
+
+    assert list(load_pdfs([renamed], loaded)) == [(renamed, set(), None)]
+    assert list(loaded) == ["Guide"]
+
+
+def test_duplicates_in_a_batch_are_parsed_once(tmp_path):
+    pytest.importorskip("pypdfium2")
+    pdf_path = write_pdf(tmp_path / "Open_Meetings_Guide.pdf", ["Meetings require notice"])
+    copy = str(tmp_path / "copy.pdf")
+    shutil.copy(pdf_path, copy)
+    title_to_chunks = {}
+
+    results = {path: (titles, error) for path, titles, error in load_pdfs([pdf_path, copy], title_to_chunks, max_workers=2)}
+
+    assert results == {pdf_path: ({"Open Meetings Guide"}, None), copy: (set(), None)}
+    assert {chunk.metadata["content_hash"] for chunk in title_to_chunks["Open Meetings Guide"]} == {content_hash(pdf_path)}
+
+
+def test_a_file_that_fails_to_parse_is_reported_and_the_rest_load(tmp_path):
+    pytest.importorskip("pypdfium2")
+    broken = tmp_path / "Broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    good = write_pdf(tmp_path / "Good.pdf", ["Agencies may charge for copies"])
+    title_to_chunks = {}
+
+    results = {path: (titles, error) for path, titles, error in load_pdfs([str(broken), good], title_to_chunks)}
+
+    assert results[good] == ({"Good"}, None)
+    assert results[str(broken)][0] == set() and results[str(broken)][1] is not None
+    assert list(title_to_chunks) == ["Good"]
+
+
+@pytest.mark.parametrize("backend", sorted(PDF_BACKENDS))
+def test_every_backend_chunks_pages_in_order_with_their_page_number(tmp_path, backend):
+    pytest.importorskip(backend)
+    pdf_path = write_pdf(tmp_path / "Guide.pdf", ["Meetings require notice", "Minutes are public records"])
+
+    chunks = parse_pdf(pdf_path, "Guide", "hash", backend=backend)
+
+    assert [(chunk.metadata["page"], chunk.page_content.strip()) for chunk in chunks] == [(0, "Meetings require notice"), (1, "Minutes are public records")]
+    assert all(chunk.metadata["title"] == "Guide" and chunk.metadata["content_hash"] == "hash" for chunk in chunks)
@@ -0,0 +1,109 @@
+"""Write-ahead log replay and checkpoints of the vector store"""
+
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from vector.constant import CHECKPOINTS_TO_KEEP
+from vector.persistence import CHECKPOINT_PREFIX, WAL_FILE_NAME, WriteAheadLog, load_checkpoint, read_manifest, write_checkpoint
+from vector.store import COARSE_INDEX_FILE_NAME, ThreadSafeVectorStore
+
+
+def chunks(document_key, count=3):
+    return [Document(page_content=f"{document_key} chunk {i}", metadata={"title": document_key}) for i in range(count)]
+
+
+def open_writer(path, embeddings):
+    """Open the store the way the ingestion process does after a restart: the latest checkpoint plus the log"""
+    wal = WriteAheadLog(os.path.join(path, WAL_FILE_NAME))
+    vector_store = load_checkpoint(path, embeddings)
+    wal.replay(vector_store)
+    return ThreadSafeVectorStore(vector_store, path, wal)
+
+
+def contents(store):
+    return sorted(store.vector_store.docstore.search(_id).page_content for _id in store.vector_store.row_ids())
+
+
+def test_additions_since_the_last_checkpoint_are_replayed_after_a_restart(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    writer.upsert_documents("doc 0", chunks("doc 0"))
+    writer.checkpoint()
+    writer.upsert_documents("doc 1", chunks("doc 1"))
+    writer.upsert_documents("doc 0", chunks("doc 0", count=2))
+    assert writer.wal.size() > 0
+
+    restarted = open_writer(path, embeddings)
+
+    assert contents(restarted) == contents(writer)
+    assert restarted.vector_store.index.ntotal == writer.vector_store.index.ntotal
+    assert restarted.vector_store.document_chunk_ids == writer.vector_store.document_chunk_ids
+    assert len(restarted.vector_store.vectors()) == writer.vector_store.index.ntotal
+
+
+def test_a_torn_log_tail_is_truncated(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    writer.checkpoint()
+    writer.upsert_documents("doc 0", chunks("doc 0"))
+    intact_size = writer.wal.size()
+    with open(writer.wal.path, "ab") as f:
+        f.write(b"\x05\x00\x00\x00 half a record")
+
+    restarted = open_writer(path, embeddings)
+
+    assert contents(restarted) == contents(writer)
+    assert restarted.wal.size() == intact_size
+
+
+def test_records_already_in_a_checkpoint_are_not_applied_twice(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    writer.checkpoint()
+    writer.upsert_documents("doc 0", chunks("doc 0"))
+    # A crash after CURRENT was replaced but before the log was truncated
+    write_checkpoint(writer.vector_store, path)
+
+    restarted = open_writer(path, embeddings)
+
+    assert restarted.vector_store.index.ntotal == 3
+    assert contents(restarted) == contents(writer)
+
+
+def test_checkpoints_replace_current_and_old_ones_are_removed(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    for number in range(CHECKPOINTS_TO_KEEP + 2):
+        writer.upsert_documents(f"doc {number}", chunks(f"doc {number}"))
+        writer.checkpoint()
+
+    manifest = read_manifest(path)
+    assert manifest["checkpoint"] == writer.vector_store.checkpoint_name
+    assert manifest["ntotal"] == 3 * (CHECKPOINTS_TO_KEEP + 2)
+    assert writer.wal.size() == 0
+    assert len([name for name in os.listdir(path) if name.startswith(CHECKPOINT_PREFIX)]) == CHECKPOINTS_TO_KEEP
+
+    reader = load_checkpoint(path, embeddings, read_only=True)
+    assert reader.checkpoint_name == manifest["checkpoint"]
+    assert reader.index.ntotal == manifest["ntotal"]
+
+
+def test_every_checkpoint_has_a_coarse_index_and_read_only_loads_require_it(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    writer = ThreadSafeVectorStore(new_store(path), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    writer.upsert_documents("doc 0", chunks("doc 0"))
+    writer.upsert_documents("doc 1", chunks("doc 1"))
+    writer.checkpoint()
+    assert load_checkpoint(path, embeddings, read_only=True).coarse_index().ntotal == 6
+
+    writer.delete_document("doc 0")
+    writer.checkpoint(compact=True)
+    assert writer.vector_store._coarse_index.ntotal == 3
+    assert load_checkpoint(path, embeddings, read_only=True).two_stage_search("doc 1 chunk 2", k=1)[0].page_content == "doc 1 chunk 2"
+
+    os.remove(os.path.join(path, writer.vector_store.checkpoint_name, COARSE_INDEX_FILE_NAME))
+    with pytest.raises(ValueError, match=COARSE_INDEX_FILE_NAME):
+        load_checkpoint(path, embeddings, read_only=True)
+    assert load_checkpoint(path, embeddings).coarse_index().ntotal == 3
@@ -0,0 +1,170 @@
+"""Filtering searches by taxonomy tags through per-tag bitmaps and FAISS ID selectors"""
+
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from vector.index import build_index, search_parameters, train_index
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog, load_checkpoint
+from vector.store import TAG_FILTER_CONFIG_KEY, ThreadSafeVectorStore
+from vector.tags import TagIndex
+
+NUM_DOCUMENTS = 40
+QUERY = "doc 1 chunk 0"
+JOURNALISTS = {"audience": ["journalists"]}
+
+INDEXES = {
+    "flat": lambda dimensions: None,
+    # As many lists as nprobe, so the IVF search is exhaustive too
+    "ivf_flat": lambda dimensions: build_index("ivf_flat", dimensions, num_vectors=16),
+    "hnsw": lambda dimensions: build_index("hnsw", dimensions),
+    "pq": lambda dimensions: faiss.IndexPQ(dimensions, 8, 4, faiss.METRIC_INNER_PRODUCT),
+}
+
+
+def document_tags(number):
+    """Every fourth document is for journalists, every other one a guide"""
+    return {"audience": "journalists" if number % 4 == 0 else "lawyers", "resource_type": "guide" if number % 2 == 0 else "video"}
+
+
+def chunks(number):
+    return [Document(page_content=f"doc {number} chunk {i}", metadata={"title": f"doc {number}", **document_tags(number)}) for i in range(3)]
+
+
+def tagged_store(path, new_store, embeddings, index_type="flat"):
+    index = INDEXES[index_type](embeddings.size)
+    if index is not None:
+        train_index(index, np.array(embeddings.embed_documents([doc.page_content for n in range(NUM_DOCUMENTS) for doc in chunks(n)])))
+    store = ThreadSafeVectorStore(new_store(path, index=index), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+    for number in range(NUM_DOCUMENTS):
+        store.upsert_documents(f"doc {number}", chunks(number))
+    return store
+
+
+def numbers(results):
+    return {int(doc.metadata["title"].split()[1]) for doc, _ in results}
+
+
+@pytest.mark.parametrize("index_type", sorted(INDEXES))
+def test_filtered_searches_return_only_tagged_rows(tmp_path, embeddings, new_store, index_type):
+    store = tagged_store(str(tmp_path), new_store, embeddings, index_type).vector_store
+    query = embeddings.embed_query(QUERY)
+
+    assert store.similarity_search_with_score_by_vector(query, k=1)[0][0].page_content == QUERY
+    results = store.similarity_search_with_score_by_vector(query, k=5, tag_filter=JOURNALISTS)
+
+    assert len(results) == 5
+    assert {number % 4 for number in numbers(results)} == {0}
+
+
+@pytest.mark.parametrize("index_type", ["flat", "pq"])
+def test_exact_indexes_return_the_best_tagged_rows(tmp_path, embeddings, new_store, index_type):
+    store = tagged_store(str(tmp_path), new_store, embeddings, index_type).vector_store
+    query = embeddings.embed_query(QUERY)
+    tagged = [doc.page_content for n in range(0, NUM_DOCUMENTS, 4) for doc in chunks(n)]
+    scores = np.array(embeddings.embed_documents(tagged)) @ np.array(query)
+    expected = [tagged[i] for i in np.argsort(-scores, kind="stable")[:5]]
+
+    results = store.similarity_search_with_score_by_vector(query, k=5, tag_filter=JOURNALISTS)
+
+    assert [doc.page_content for doc, _ in results] == expected
+    if index_type == "pq":
+        # IndexPQ cannot take a selector, so the tagged rows are scored against the full vectors
+        assert search_parameters(store.index, faiss.IDSelectorBitmap(store.tag_index().bitmap(JOURNALISTS))) is None
+
+
+@pytest.mark.parametrize("search_type", ["similarity", "mmr", "two_stage", "hybrid"])
+def test_values_of_a_field_are_ored_and_fields_are_anded(tmp_path, embeddings, new_store, search_type):
+    store = tagged_store(str(tmp_path), new_store, embeddings).vector_store
+
+    either = store.batch_search([QUERY], search_type, k=4, tag_filter={"audience": ["journalists", "lawyers"]})[0]
+    both = store.batch_search([QUERY], search_type, k=4, tag_filter={"audience": ["lawyers"], "resource_type": ["guide"]})[0]
+    unknown = store.batch_search([QUERY], search_type, k=4, tag_filter={"audience": ["judges"]})[0]
+
+    assert QUERY in [doc.page_content for doc, _ in either]
+    assert len(both) == 4 and {number % 4 for number in numbers(both)} == {2}
+    assert unknown == []
+
+
+def test_the_retriever_reads_the_filter_from_the_run_config(tmp_path, embeddings, new_store):
+    retriever = tagged_store(str(tmp_path), new_store, embeddings).as_retriever(search_kwargs={"k": 3})
+
+    unfiltered = retriever.invoke(QUERY)
+    filtered = retriever.invoke(QUERY, config={"configurable": {TAG_FILTER_CONFIG_KEY: JOURNALISTS}})
+
+    assert unfiltered[0].page_content == QUERY
+    assert len(filtered) == 3 and all(doc.metadata["audience"] == "journalists" for doc in filtered)
+
+
+def test_bitmaps_use_the_faiss_selector_layout():
+    index = TagIndex.build([["audience:journalists"], [], ["audience:journalists", "resource_type:guide"]] + [[]] * 6 + [["resource_type:guide"]])
+
+    assert index.bitmap(JOURNALISTS).tolist() == [0b101, 0]
+    assert index.bitmap({"audience": ["journalists"], "resource_type": ["guide"]}).tolist() == [0b100, 0]
+    assert index.bitmap({"resource_type": "guide"}).tolist() == [0b100, 0b10]
+    assert index.bitmap({"audience": []}) is None
+    with pytest.raises(ValueError):
+        index.bitmap({"title": ["doc 1"]})
+
+
+def test_retagged_bitmaps_survive_checkpoints_and_compaction(tmp_path, embeddings, new_store):
+    path = str(tmp_path)
+    store = tagged_store(path, new_store, embeddings)
+    query = embeddings.embed_query(QUERY)
+
+    def journalist_documents(vector_store):
+        return numbers(vector_store.similarity_search_with_score_by_vector(query, k=3 * NUM_DOCUMENTS, tag_filter=JOURNALISTS))
+
+    def moved_tags(metadata):
+        """Journalists move from every fourth document starting at 0 to every fourth starting at 1"""
+        number = int(metadata["title"].split()[1])
+        return {"audience": "journalists" if number % 4 == 1 else "lawyers", "resource_type": metadata["resource_type"]}
+
+    changed = store.retag(moved_tags)
+
+    assert changed == 3 * NUM_DOCUMENTS // 2
+    assert journalist_documents(store.vector_store) == set(range(1, NUM_DOCUMENTS, 4))
+
+    store.checkpoint()
+    assert journalist_documents(load_checkpoint(path, embeddings, read_only=True)) == set(range(1, NUM_DOCUMENTS, 4))
+
+    store.delete_document("doc 1")
+    assert journalist_documents(store.vector_store) == set(range(5, NUM_DOCUMENTS, 4))
+
+    store.checkpoint(compact=True)
+    served = load_checkpoint(path, embeddings, read_only=True)
+
+    assert not served.tombstones and served.index.ntotal == 3 * (NUM_DOCUMENTS - 1)
+    assert journalist_documents(served) == set(range(5, NUM_DOCUMENTS, 4))
+
+
+def test_ask_llm_passes_the_tag_filter_to_the_pipeline_config(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import llm.chain
+    from app import app
+
+    class RecordingChain:
+        """Stands in for the compiled pipeline, recording the config of every run"""
+
+        def __init__(self):
+            self.configs = []
+
+        async def astream_events(self, input_data, config=None, version=None):
+            self.configs.append(config)
+            for event in ():
+                yield event
+
+    chain = RecordingChain()
+    monkeypatch.setattr(llm.chain, "get_conversational_chain", lambda config=None: chain)
+    monkeypatch.setattr(llm.chain, "ANSWER_CACHE_ENABLED", False)
+    client = TestClient(app)
+
+    client.get("/ask-llm", params={"query": "How do I appeal?", "audience": ["journalists", "lawyers"], "content": "open meetings", "resource": "guide"})
+    client.get("/ask-llm", params={"query": "How do I appeal?"})
+
+    assert chain.configs[0]["configurable"][TAG_FILTER_CONFIG_KEY] == {"audience": ["journalists", "lawyers"], "nefac_category": ["open meetings"], "resource_type": ["guide"]}
+    assert TAG_FILTER_CONFIG_KEY not in chain.configs[1]["configurable"]
@@ -0,0 +1,38 @@
+"""Cleaning never loses a video's clips: anything that fails keeps the raw text"""
+
+import pytest
+import tiktoken
+
+from document import transcript_cleaner
+
+
+@pytest.fixture(autouse=True)
+def fresh_encoding():
+    transcript_cleaner._encoding.cache_clear()
+    yield
+    transcript_cleaner._encoding.cache_clear()
+
+
+def test_packs_clips_by_estimated_length_when_tiktoken_cannot_load(monkeypatch):
+    def unavailable(*args):
+        raise OSError("could not download the BPE file")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", unavailable)
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+
+    # 40 characters are estimated at 10 tokens
+    assert transcript_cleaner.pack_clips(["a" * 40] * 3, max_tokens=20) == [[0, 1], [2]]
+
+
+def test_keeps_raw_clips_when_the_cache_cannot_be_read(monkeypatch):
+    def unreadable(keys):
+        raise RuntimeError("database disk image is malformed")
+
+    async def clean_packs(texts, packs):
+        raise AssertionError("clips were sent for cleaning")
+
+    monkeypatch.setattr(transcript_cleaner.cleaning_cache, "get_many", unreadable)
+    monkeypatch.setattr(transcript_cleaner, "_clean_packs", clean_packs)
+
+    clips = ["um so the the public records law", "uh you can appeal"]
+    assert transcript_cleaner.clean_texts(clips) == clips
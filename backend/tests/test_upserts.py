@@ -0,0 +1,94 @@
+"""Content-addressed upserts, deletes and compaction of the vector store"""
+
+import os
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog
+from vector.store import ThreadSafeVectorStore, chunk_id
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Records every text embedded as a document"""
+
+    embedded: List[str] = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"title": "guide"}) for text in texts]
+
+
+def writer(path, new_store, embeddings):
+    return ThreadSafeVectorStore(new_store(path, store_embeddings=embeddings), path, WriteAheadLog(os.path.join(path, WAL_FILE_NAME)))
+
+
+def live_texts(store):
+    return sorted(store.vector_store.docstore.search(_id).page_content for _id in store.vector_store.row_ids())
+
+
+def test_only_changed_chunks_are_embedded(tmp_path, embeddings, new_store):
+    counting = CountingEmbeddings(size=embeddings.size, embedded=[])
+    store = writer(str(tmp_path), new_store, counting)
+
+    assert store.upsert_documents("guide", chunks("one", "two", "three")) == (3, 0)
+    assert store.upsert_documents("guide", chunks("one", "two", "three")) == (0, 0)
+    assert store.upsert_documents("guide", chunks("one", "three", "four")) == (1, 1)
+
+    assert counting.embedded == ["one", "two", "three", "four"]
+    assert live_texts(store) == ["four", "one", "three"]
+    assert store.vector_store.document_chunk_ids["guide"] == [chunk_id("guide", text) for text in ("one", "three", "four")]
+
+
+def test_removed_chunks_are_never_returned(tmp_path, embeddings, new_store):
+    store = writer(str(tmp_path), new_store, embeddings)
+    store.upsert_documents("guide", chunks("one", "two"))
+    store.upsert_documents("guide", chunks("one"))
+
+    results = store.similarity_search("two", k=2)
+
+    assert [doc.page_content for doc in results] == ["one"]
+
+
+def test_the_same_text_in_two_documents_is_two_chunks(tmp_path, embeddings, new_store):
+    store = writer(str(tmp_path), new_store, embeddings)
+    store.upsert_documents("guide", chunks("shared"))
+    store.upsert_documents("faq", chunks("shared"))
+
+    assert store.delete_document("guide") == 1
+    assert live_texts(store) == ["shared"]
+    assert "guide" not in store.vector_store.document_chunk_ids
+
+
+def test_compaction_drops_tombstoned_rows(tmp_path, embeddings, new_store):
+    store = writer(str(tmp_path), new_store, embeddings)
+    for number in range(4):
+        store.upsert_documents(f"doc {number}", chunks(*(f"doc {number} chunk {i}" for i in range(5))))
+    store.delete_document("doc 1")
+    store.delete_document("doc 2")
+
+    store.checkpoint(compact=True)
+
+    assert store.vector_store.index.ntotal == 10
+    assert not store.vector_store.tombstones
+    assert len(store.vector_store.vectors()) == 10
+    assert [doc.page_content for doc in store.similarity_search("doc 3 chunk 4", k=1)] == ["doc 3 chunk 4"]
+    assert store.upsert_documents("doc 0", chunks(*(f"doc 0 chunk {i}" for i in range(5)))) == (0, 0)
+
+
+@pytest.mark.parametrize("search_type", ["similarity", "mmr", "two_stage", "hybrid"])
+def test_searches_skip_tombstoned_rows_inside_faiss(tmp_path, embeddings, new_store, search_type):
+    store = writer(str(tmp_path), new_store, embeddings)
+    store.upsert_documents("old", chunks(*(f"old chunk {i}" for i in range(30))))
+    store.upsert_documents("new", chunks(*(f"new chunk {i}" for i in range(4))))
+    store.delete_document("old")
+
+    results = store.vector_store.batch_search(["old chunk 0"], search_type, k=4)[0]
+
+    assert sorted(doc.page_content for doc, _ in results) == [f"new chunk {i}" for i in range(4)]
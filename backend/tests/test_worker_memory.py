@@ -0,0 +1,70 @@
+"""
+Web workers open the store read-only and memory-map it, so adding workers
+must not add a copy of the index per worker.
+"""
+
+import multiprocessing
+import sys
+
+import numpy as np
+import psutil
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="PSS is only reported on Linux")
+
+NUM_VECTORS = 50_000
+DIMENSIONS = 256
+
+
+def _worker(path, embeddings, imported, go, ready, done):
+    from vector.persistence import load_checkpoint
+
+    imported.set()
+    go.wait()
+    store = load_checkpoint(path, embeddings, read_only=True)
+    # A flat search reads every row of the index
+    queries = np.random.default_rng().standard_normal((8, store.index.d)).astype(np.float32)
+    for query in queries:
+        store.similarity_search_with_score_by_vector(query, k=4)
+    ready.set()
+    done.wait()
+
+
+def _pss(processes):
+    return sum(psutil.Process(process.pid).memory_full_info().pss for process in processes)
+
+
+def store_memory(path, embeddings, num_workers):
+    """Total PSS that num_workers worker processes gain by opening and searching the store at path"""
+    context = multiprocessing.get_context("spawn")
+    go, done = context.Event(), context.Event()
+    imported = [context.Event() for _ in range(num_workers)]
+    ready = [context.Event() for _ in range(num_workers)]
+    processes = [context.Process(target=_worker, args=(path, embeddings, imported[i], go, ready[i], done)) for i in range(num_workers)]
+    for process in processes:
+        process.start()
+    try:
+        assert all(event.wait(120) for event in imported)
+        before = _pss(processes)
+        go.set()
+        assert all(event.wait(120) for event in ready)
+        return _pss(processes) - before
+    finally:
+        done.set()
+        for process in processes:
+            process.join(30)
+
+
+def test_workers_share_one_copy_of_the_index(tmp_path, published_store):
+    embeddings = DeterministicFakeEmbedding(size=DIMENSIONS)
+    published_store(str(tmp_path), NUM_VECTORS, DIMENSIONS, store_embeddings=embeddings)
+    index_bytes = NUM_VECTORS * DIMENSIONS * 4
+
+    one_worker = store_memory(str(tmp_path), embeddings, 1)
+    four_workers = store_memory(str(tmp_path), embeddings, 4)
+
+    # The single worker did page the whole index in
+    assert one_worker >= index_bytes
+    # Private copies would take about four times as much
+    assert four_workers < 2 * one_worker
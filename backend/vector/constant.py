@@ -0,0 +1,63 @@
+import os
+
+from disk_cache import CACHE_DIR
+
+EMBEDDING_MODEL_NAME = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = 3072
+
+# Two-tier query/document embedding cache
+EMBEDDING_MEMORY_CACHE_SIZE = 4096
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+# Seconds the entry and byte counts of the disk tier (full-table scans) are reused for
+EMBEDDING_DISK_STATS_TTL_SECONDS = 60
+
+# FAISS index type: "flat", "ivf_flat", "hnsw", "ivf_pq", "sq8" or "pq" (see vector/index.py)
+FAISS_INDEX_TYPE = "flat"
+IVF_NLIST = None  # None sizes the lists from the corpus (about 4 * sqrt(n))
+IVF_NPROBE = 16
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+PQ_M = 96  # sub-quantizers, must divide EMBEDDING_DIMENSIONS
+PQ_NBITS = 8
+
+# Quantized index types are searched for RERANK_FACTOR * k candidates, which are
+# re-ranked exactly against the float16 side file. Migrating to one of them
+# calibrates the factor so recall@k stays within RERANK_RECALL_TOLERANCE of exact search.
+QUANTIZED_INDEX_TYPES = ("sq8", "pq", "ivf_pq")
+RERANK_FACTOR = 4
+RERANK_RECALL_TOLERANCE = 0.01
+
+# "two_stage" search: COARSE_DIMENSIONS-long prefixes of the vectors are searched
+# for k * TWO_STAGE_CANDIDATE_FACTOR candidates, re-scored with the full vectors
+COARSE_DIMENSIONS = 256
+TWO_STAGE_CANDIDATE_FACTOR = 20
+
+# Additions go to a write-ahead log; a full checkpoint is written once the log
+# reaches CHECKPOINT_WAL_BYTES or CHECKPOINT_INTERVAL_SECONDS after the last one
+CHECKPOINT_WAL_BYTES = 64 * 1024 * 1024
+CHECKPOINT_INTERVAL_SECONDS = 5 * 60
+CHECKPOINTS_TO_KEEP = 2
+
+# Deleted and replaced chunks are tombstoned; the next checkpoint compacts the store
+# once tombstones make up COMPACTION_TOMBSTONE_FRACTION of its rows
+COMPACTION_TOMBSTONE_FRACTION = 0.2
+
+# Store directory, written only by the ingestion process (python -m vector.ingest)
+FAISS_STORE_PATH = "faiss_store"
+# Seconds between waiting-room checks of `python -m vector.ingest --watch`
+INGEST_POLL_SECONDS = 60
+# Seconds between each web worker's checks for a newly published checkpoint
+INDEX_POLL_SECONDS = 5
+
+# "hybrid" search: a BM25 inverted index over the chunk text (see vector/lexical.py) is searched next to
+# FAISS for k * HYBRID_CANDIDATE_FACTOR candidates each; the union is ranked by
+# HYBRID_DENSE_WEIGHT * dense + (1 - HYBRID_DENSE_WEIGHT) * lexical, both min-max normalized
+BM25_K1 = 1.2
+BM25_B = 0.75
+HYBRID_CANDIDATE_FACTOR = 4
+HYBRID_DENSE_WEIGHT = 0.5
+
+# Chunk metadata fields holding taxonomy tags (from docs/by_audience, by_content and by_resource),
+# each kept as one bitmap per value over the index rows so searches can be filtered inside FAISS
+TAG_FIELDS = ("audience", "nefac_category", "resource_type")
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OFFSETS_FILE_NAME = "docs.offsets"
+TEXT_FILE_NAME = "docs.text"
+METADATA_FILE_NAME = "docs.meta"
+DOCSTORE_FILE_NAMES = (OFFSETS_FILE_NAME, TEXT_FILE_NAME, METADATA_FILE_NAME)
+
+# text start, text end, metadata start, metadata end
+_OFFSET_COLUMNS = 4
+_OFFSET_ROW_BYTES = _OFFSET_COLUMNS * np.dtype(np.int64).itemsize
+
+
+class MmapDocstore(Docstore, AddableMixin):
+    """
+    Append-only docstore of chunk text and metadata in memory-mapped files.
+
+    Text (UTF-8) and metadata (JSON) are written to two byte columns, and an
+    offsets file holds one int64 row (text start, text end, metadata start,
+    metadata end) per record. Only the id -> record map is kept in memory:
+    search() reads and decodes just the requested records, so loading a store
+    does not deserialize the corpus, and every worker shares the page cache.
+
+    Deleted ids are dropped from the map; their records stay in the files.
+    """
+
+    def __init__(self, directory: str, record_ids: Optional[List[Optional[str]]] = None):
+        self.directory = directory
+        self._record_ids: List[Optional[str]] = list(record_ids or [])
+        self._records: Dict[str, int] = {_id: record for record, _id in enumerate(self._record_ids) if _id is not None}
+        self._lock = threading.Lock()
+        self._maps: Dict[str, np.memmap] = {}
+
+    def path(self, file_name: str) -> str:
+        return os.path.join(self.directory, file_name)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, _id: str) -> bool:
+        return _id in self._records
+
+    def record_ids(self) -> List[Optional[str]]:
+        """Id of every record in file order, None for deleted ones"""
+        return list(self._record_ids)
+
+    def _map(self, file_name: str, dtype, min_size: int) -> np.ndarray:
+        """Memory map of a column, reopened once it has grown past what is needed"""
+        with self._lock:
+            mapped = self._maps.get(file_name)
+            if mapped is None or mapped.nbytes < min_size:
+                if os.path.getsize(self.path(file_name)) == 0:
+                    mapped = np.zeros(0, dtype=dtype)
+                else:
+                    mapped = np.memmap(self.path(file_name), dtype=dtype, mode="r")
+                self._maps[file_name] = mapped
+            return mapped
+
+    def map_columns(self) -> "MmapDocstore":
+        """
+        Map every column now instead of on first lookup. Lookups of the records
+        written so far then never touch the files by name again, so they keep
+        working after the writer removes the files (e.g. once a compaction supersedes them).
+        """
+        for file_name, dtype in ((OFFSETS_FILE_NAME, np.int64), (TEXT_FILE_NAME, np.uint8), (METADATA_FILE_NAME, np.uint8)):
+            self._map(file_name, dtype, 0)
+        return self
+
+    def _offsets(self, record: int) -> np.ndarray:
+        return self._map(OFFSETS_FILE_NAME, np.int64, (record + 1) * _OFFSET_ROW_BYTES).reshape(-1, _OFFSET_COLUMNS)[record]
+
+    def search(self, search: str) -> Union[str, Document]:
+        record = self._records.get(search)
+        if record is None:
+            return f"ID {search} not found."
+
+        text_start, text_end, metadata_start, metadata_end = (int(offset) for offset in self._offsets(record))
+        text = bytes(self._map(TEXT_FILE_NAME, np.uint8, text_end)[text_start:text_end]).decode("utf-8")
+        metadata = json.loads(bytes(self._map(METADATA_FILE_NAME, np.uint8, metadata_end)[metadata_start:metadata_end]))
+        return Document(id=search, page_content=text, metadata=metadata)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._records)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+
+        text_sizes = os.path.getsize(self.path(TEXT_FILE_NAME))
+        metadata_sizes = os.path.getsize(self.path(METADATA_FILE_NAME))
+        text_chunks, metadata_chunks, offsets = [], [], []
+        for doc in texts.values():
+            text = doc.page_content.encode("utf-8")
+            metadata = json.dumps(doc.metadata, default=str).encode("utf-8")
+            offsets.append((text_sizes, text_sizes + len(text), metadata_sizes, metadata_sizes + len(metadata)))
+            text_chunks.append(text)
+            metadata_chunks.append(metadata)
+            text_sizes += len(text)
+            metadata_sizes += len(metadata)
+
+        # Offsets last, so a crash mid-add never exposes a partial record
+        with open(self.path(TEXT_FILE_NAME), "ab") as f:
+            f.write(b"".join(text_chunks))
+        with open(self.path(METADATA_FILE_NAME), "ab") as f:
+            f.write(b"".join(metadata_chunks))
+        with open(self.path(OFFSETS_FILE_NAME), "ab") as f:
+            f.write(np.array(offsets, dtype=np.int64).tobytes())
+
+        for _id in texts:
+            self._records[_id] = len(self._record_ids)
+            self._record_ids.append(_id)
+
+    def delete(self, ids: List) -> None:
+        overlapping = set(ids).intersection(self._records)
+        if not overlapping:
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for _id in ids:
+            self._record_ids[self._records.pop(_id)] = None
+
+    def truncate(self, num_records: int) -> None:
+        """Drop records past num_records (e.g. added after the last checkpoint)"""
+        size = os.path.getsize(self.path(OFFSETS_FILE_NAME))
+        if size == num_records * _OFFSET_ROW_BYTES:
+            return
+        if size < num_records * _OFFSET_ROW_BYTES:
+            raise ValueError(f"{self.path(OFFSETS_FILE_NAME)} has {size // _OFFSET_ROW_BYTES} records, expected {num_records}")
+
+        logger.warning(f"Truncating docstore in {self.directory} from {size // _OFFSET_ROW_BYTES} to {num_records} records")
+        with self._lock:
+            self._maps.clear()
+        if num_records == 0:
+            ends = (0, 0, 0, 0)
+        else:
+            with open(self.path(OFFSETS_FILE_NAME), "rb") as f:
+                f.seek((num_records - 1) * _OFFSET_ROW_BYTES)
+                ends = np.frombuffer(f.read(_OFFSET_ROW_BYTES), dtype=np.int64)
+        os.truncate(self.path(OFFSETS_FILE_NAME), num_records * _OFFSET_ROW_BYTES)
+        os.truncate(self.path(TEXT_FILE_NAME), int(ends[1]))
+        os.truncate(self.path(METADATA_FILE_NAME), int(ends[3]))
+
+    def copy_to(self, directory: str) -> "MmapDocstore":
+        os.makedirs(directory, exist_ok=True)
+        for file_name in DOCSTORE_FILE_NAMES:
+            shutil.copyfile(self.path(file_name), os.path.join(directory, file_name))
+        return MmapDocstore(directory, self._record_ids)
+
+    @classmethod
+    def open(cls, directory: str, record_ids: List[Optional[str]]) -> "MmapDocstore":
+        """Open the docstore files in directory as of a checkpoint holding record_ids"""
+        docstore = cls(directory, record_ids)
+        docstore.truncate(len(record_ids))
+        return docstore
+
+    @classmethod
+    def create(cls, directory: str, documents: Dict[str, Document]) -> "MmapDocstore":
+        """Write new docstore files in directory containing exactly documents"""
+        os.makedirs(directory, exist_ok=True)
+        for file_name in DOCSTORE_FILE_NAMES:
+            open(os.path.join(directory, file_name), "wb").close()
+        docstore = cls(directory)
+        if documents:
+            docstore.add(documents)
+        return docstore
@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+from langchain_openai import OpenAIEmbeddings
+
+from disk_cache import DiskCache
+from load_env import load_env
+from vector.constant import (
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_DISK_STATS_TTL_SECONDS,
+    EMBEDDING_MEMORY_CACHE_SIZE,
+    EMBEDDING_MODEL_NAME,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_env()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Two-tier cache in front of an embeddings model.
+
+    Lookups go to an in-process LRU first, then to a persistent DiskCache
+    shared by every worker and by ingestion. Only texts missing from both
+    tiers are sent to the model, in a single batched request. The async
+    methods read and write the SQLite tier in a worker thread, so a busy
+    cache file never blocks the event loop.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, dimensions: int, memory_cache_size: int, disk_cache: Optional[DiskCache]):
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.memory_cache_size = memory_cache_size
+        self.disk_cache = disk_cache
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # (monotonic time, entries, bytes) of the disk tier, as counting them scans the whole table
+        self._disk_totals: Optional[Tuple[float, int, int]] = None
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{self.dimensions}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup_memory(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+        return found
+
+    def _lookup_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Vectors of keys found on disk, promoted into memory"""
+        if not keys or self.disk_cache is None:
+            return {}
+        on_disk = {key: np.frombuffer(value, dtype=np.float32) for key, value in self.disk_cache.get_many(keys).items()}
+        with self._lock:
+            self.disk_hits += len(on_disk)
+            for key, vector in on_disk.items():
+                self._remember(key, vector)
+        return on_disk
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors by key, promoting disk hits into memory."""
+        found = self._lookup_memory(keys)
+        found.update(self._lookup_disk([key for key in dict.fromkeys(keys) if key not in found]))
+        return found
+
+    async def _alookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = self._lookup_memory(keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.disk_cache is not None:
+            found.update(await run_in_executor(None, self._lookup_disk, missing))
+        return found
+
+    def _store_memory(self, keys: List[str], vectors: List[List[float]]) -> Dict[str, np.ndarray]:
+        computed = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(keys, vectors)}
+        with self._lock:
+            self.misses += len(computed)
+            for key, vector in computed.items():
+                self._remember(key, vector)
+        return computed
+
+    def _store_disk(self, computed: Dict[str, np.ndarray]) -> None:
+        if self.disk_cache is not None:
+            self.disk_cache.set_many((key, vector.tobytes()) for key, vector in computed.items())
+
+    def _store(self, keys: List[str], vectors: List[List[float]]) -> Dict[str, np.ndarray]:
+        computed = self._store_memory(keys, vectors)
+        self._store_disk(computed)
+        return computed
+
+    async def _astore(self, keys: List[str], vectors: List[List[float]]) -> Dict[str, np.ndarray]:
+        computed = self._store_memory(keys, vectors)
+        if self.disk_cache is not None:
+            await run_in_executor(None, self._store_disk, computed)
+        return computed
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_cache_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _missing(texts: List[str], keys: List[str], found: Dict[str, np.ndarray]) -> Dict[str, str]:
+        # Unique missing texts by key, so duplicates in one batch are embedded once
+        return {key: text for text, key in zip(texts, keys) if key not in found}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            found.update(self._store(list(missing), self.embeddings.embed_documents(list(missing.values()))))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = await self._alookup(keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            found.update(await self._astore(list(missing), await self.embeddings.aembed_documents(list(missing.values()))))
+        return [found[key].tolist() for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def disk_totals(self) -> Tuple[int, int]:
+        """Entries and bytes of the disk tier, recounted at most every EMBEDDING_DISK_STATS_TTL_SECONDS"""
+        if self.disk_cache is None:
+            return 0, 0
+        totals = self._disk_totals
+        if totals is None or time.monotonic() - totals[0] >= EMBEDDING_DISK_STATS_TTL_SECONDS:
+            totals = (time.monotonic(), len(self.disk_cache), self.disk_cache.bytes_stored())
+            self._disk_totals = totals
+        return totals[1], totals[2]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of both tiers; the disk totals may query SQLite, so call it off the event loop"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": sum(vector.nbytes for vector in self._memory.values()),
+            }
+        stats["disk_entries"], stats["disk_bytes"] = self.disk_totals()
+        return stats
+
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model() -> CachedEmbeddings:
+    """Get the embedding provider shared by query time and ingestion"""
+    global _embedding_model
+
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = CachedEmbeddings(
+                OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME, dimensions=EMBEDDING_DIMENSIONS),
+                model=EMBEDDING_MODEL_NAME,
+                dimensions=EMBEDDING_DIMENSIONS,
+                memory_cache_size=EMBEDDING_MEMORY_CACHE_SIZE,
+                disk_cache=DiskCache(EMBEDDING_CACHE_PATH),
+            )
+        return _embedding_model
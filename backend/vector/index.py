@@ -0,0 +1,303 @@
+"""
+FAISS index factory for the vector store.
+
+Supported index types:
+- flat:     exact brute-force inner product search (IndexFlatIP)
+- ivf_flat: inverted file over a k-means coarse quantizer, full vectors in the lists
+- hnsw:     hierarchical navigable small world graph over full vectors
+- ivf_pq:   inverted file with product-quantized residuals
+- sq8:      exhaustive search over 8-bit scalar-quantized vectors (4x smaller than flat)
+- pq:       exhaustive search over product-quantized codes (PQ_M bytes per vector)
+
+The quantized types (sq8, pq, ivf_pq) are meant to be paired with exact
+re-ranking against the float16 side file kept by vector.store.NefacFAISS.
+
+Embeddings from text-embedding-3-large are unit length, so inner product is
+cosine similarity for every type.
+
+Usage (from backend/), to migrate an existing store to another index type
+(e.g. to a quantized one once the corpus is large):
+    python -m vector.index migrate --index-type hnsw
+"""
+
+import argparse
+import contextlib
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+from llm.constant import NUMBER_OF_NEAREST_NEIGHBORS
+from vector.constant import (
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    IVF_NLIST,
+    IVF_NPROBE,
+    PQ_M,
+    PQ_NBITS,
+    QUANTIZED_INDEX_TYPES,
+    RERANK_RECALL_TOLERANCE,
+)
+from vector.embeddings import get_embedding_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "pq")
+
+
+def default_nlist(num_vectors):
+    """Number of IVF lists for a corpus of num_vectors (about 4 * sqrt(n), at least 1)"""
+    return max(1, min(num_vectors, int(4 * math.sqrt(num_vectors))))
+
+
+def min_training_vectors(index_type, nlist=None):
+    """Smallest number of vectors the given index type can be trained on"""
+    if index_type == "ivf_flat":
+        return nlist or 1
+    if index_type in ("ivf_pq", "pq"):
+        # k-means over 2**nbits centroids per sub-quantizer
+        return max(nlist or 1, 2**PQ_NBITS)
+    if index_type == "sq8":
+        return 1
+    return 0
+
+
+def build_index(index_type, dimensions, num_vectors=0):
+    """
+    Create an empty FAISS index of the given type.
+
+    Args:
+        index_type (str): One of INDEX_TYPES
+        dimensions (int): Embedding dimensions
+        num_vectors (int, optional): Expected corpus size, used to size IVF lists
+
+    Returns:
+        faiss.Index: The index, untrained for the IVF types
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimensions)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimensions, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dimensions, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+
+    if index_type == "pq":
+        _check_pq_dimensions(dimensions)
+        return faiss.IndexPQ(dimensions, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+
+    nlist = IVF_NLIST or default_nlist(num_vectors)
+    quantizer = faiss.IndexFlatIP(dimensions)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivf_pq":
+        _check_pq_dimensions(dimensions)
+        index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    index.nprobe = min(IVF_NPROBE, nlist)
+    return index
+
+
+def _check_pq_dimensions(dimensions):
+    if dimensions % PQ_M != 0:
+        raise ValueError(f"PQ_M={PQ_M} must divide the embedding dimensions ({dimensions})")
+
+
+def get_index_type(index):
+    """Return the INDEX_TYPES name of a FAISS index"""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+
+def configure_search(index):
+    """Apply the search-time parameters from vector/constant.py to a loaded index"""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(IVF_NPROBE, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def search_parameters(index, selector):
+    """
+    SearchParameters restricting a search of index to the ids in selector, with
+    the index's own nprobe / efSearch, or None for index types that cannot
+    filter inside the search (pq)
+    """
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    if isinstance(index, faiss.IndexPQ):
+        return None
+    return faiss.SearchParameters(sel=selector)
+
+
+def read_index(path, mmap=False, index_type=None):
+    """
+    Read a FAISS index from path.
+
+    With mmap the index data is memory-mapped read-only instead of copied into
+    the process, so every worker that opens the same file shares one physical
+    copy in the page cache. Flat-code indexes (flat, sq8, pq, and the storage
+    of hnsw) are mapped with IO_FLAG_MMAP_IFC, which FAISS has since 1.11
+    (the version pinned in pyproject.toml); the IVF types map their inverted
+    lists with IO_FLAG_MMAP. A memory-mapped index cannot be modified.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    if index_type not in ("ivf_flat", "ivf_pq"):
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        if not isinstance(index, faiss.IndexIVF):
+            return index
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+def train_index(index, vectors):
+    """Train index on vectors if it needs training"""
+    if index.is_trained:
+        return index
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    logger.info(f"Training {get_index_type(index)} index on {len(vectors)} vectors")
+    index.train(vectors)
+    return index
+
+
+def reconstruct_vectors(index):
+    """Read every stored vector back out of an index, in insertion order"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def rebuild_index(vectors, index_type, dimensions):
+    """Build, train and fill a new index of index_type from vectors"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = build_index(index_type, dimensions, num_vectors=len(vectors))
+    required = min_training_vectors(index_type, getattr(index, "nlist", None))
+    if len(vectors) < required:
+        raise ValueError(f"{index_type} needs at least {required} vectors to train, the store has {len(vectors)}")
+    train_index(index, vectors)
+    index.add(vectors)
+    return index
+
+
+def recall_with_rerank(index, vectors, queries, exact_ids, rerank_factor):
+    """recall@k of searching index for k * rerank_factor candidates and re-ranking them exactly"""
+    k = exact_ids.shape[1]
+    _, candidates = index.search(queries, k * rerank_factor)
+    hits = 0
+    for query, rows, expected in zip(queries, candidates, exact_ids):
+        rows = rows[rows != -1]
+        best = rows[np.argsort(-(vectors[rows] @ query))[:k]]
+        hits += len(set(best.tolist()) & set(expected.tolist()))
+    return hits / exact_ids.size
+
+
+def calibrate_rerank_factor(index, vectors, k=NUMBER_OF_NEAREST_NEIGHBORS, tolerance=RERANK_RECALL_TOLERANCE, num_queries=200, seed=0):
+    """
+    Smallest re-rank candidate multiplier whose recall@k against exact search
+    is within tolerance of 1.0, measured on perturbed corpus vectors.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, k)
+
+    factor = 1
+    while True:
+        recall = recall_with_rerank(index, vectors, queries, exact_ids, factor)
+        logger.info(f"Re-rank factor {factor}: recall@{k} = {recall:.4f}")
+        if recall >= 1.0 - tolerance or factor * k >= len(vectors):
+            return factor
+        factor *= 2
+
+
+def migrate_store(store_path, index_type, output_path=None):
+    """
+    Rebuild the index of an existing FAISS store with another index type.
+
+    The docstore and ids are kept as they are; vectors are read back from the
+    float16 side file (or the current index), so nothing is re-embedded. For
+    quantized types the re-rank factor is calibrated to RERANK_RECALL_TOLERANCE.
+    The result is written as a new checkpoint, including any chunks that were
+    still only in the write-ahead log.
+
+    Like the ingestion process, a migration holds the writer lock of the store
+    (and of output_path), and exits if another process such as
+    `vector.ingest --watch` holds it.
+    """
+    # Imported here because vector.store and vector.persistence build on this module
+    from vector.persistence import WAL_FILE_NAME, WriteAheadLog, acquire_writer_lock, load_checkpoint, store_data_path, vector_file_path, write_checkpoint
+    from vector.vector_file import Float16VectorFile
+
+    output_path = output_path or store_path
+    with contextlib.ExitStack() as writer_locks:
+        for path in dict.fromkeys((store_path, output_path)):
+            writer_locks.enter_context(acquire_writer_lock(path))
+
+        vector_store = load_checkpoint(store_path, get_embedding_model())
+        if vector_store is None:
+            raise ValueError(f"No vector store found in {store_path}")
+        wal = WriteAheadLog(os.path.join(store_path, WAL_FILE_NAME))
+        wal.replay(vector_store)
+
+        source_type = get_index_type(vector_store.index)
+        vectors = vector_store.vectors()
+        logger.info(f"Migrating {len(vectors)} vectors in {store_path} from {source_type} to {index_type}")
+
+        os.makedirs(output_path, exist_ok=True)
+        vector_store.vector_file = Float16VectorFile.create(vector_file_path(store_data_path(output_path)), vectors)
+        vector_store.index = rebuild_index(vectors, index_type, vector_store.index.d)
+        if index_type in QUANTIZED_INDEX_TYPES:
+            vector_store.rerank_factor = calibrate_rerank_factor(vector_store.index, vectors)
+
+        write_checkpoint(vector_store, output_path, wal if output_path == store_path else None)
+    logger.info(f"Saved {index_type} index to {output_path} (re-rank factor {vector_store.rerank_factor})")
+    return vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the FAISS index of the vector store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Rebuild an existing store with another index type")
+    migrate.add_argument("--index-type", choices=INDEX_TYPES, required=True)
+    migrate.add_argument("--store", default="faiss_store", help="Path of the existing store")
+    migrate.add_argument("--output", default=None, help="Where to write the migrated store (defaults to --store)")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate_store(args.store, args.index_type, args.output)
+
+
+if __name__ == "__main__":
+    main()
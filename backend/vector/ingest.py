@@ -0,0 +1,205 @@
+"""
+Ingestion process: the only writer of the vector store.
+
+Loads new documents from the waiting room, upserts their chunks and publishes
+the result as a checkpoint (a new index generation in CURRENT). Web workers
+only ever open published checkpoints read-only (see vector/load.py), so
+exactly one process may run this at a time; it holds an exclusive lock on
+faiss_store/ingest.lock for as long as it runs.
+
+Progress is written to faiss_store/ingest_status.json for /loading-status.
+
+Usage (from backend/):
+    python -m vector.ingest            # one ingestion run
+    python -m vector.ingest --watch    # keep checking the waiting room
+"""
+
+import argparse
+import logging
+import os
+import pickle
+import time
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from document.constant import CHUNK_OVERLAP, CHUNK_SIZE
+from document.loader import has_waiting_documents, load_all_documents
+from document.taxonomy import document_tags, load_taxonomy, tag_documents
+from load_env import load_env
+from vector.constant import EMBEDDING_DIMENSIONS, FAISS_INDEX_TYPE, FAISS_STORE_PATH, INGEST_POLL_SECONDS
+from vector.docstore import MmapDocstore
+from vector.embeddings import get_embedding_model
+from vector.index import build_index, configure_search, get_index_type, min_training_vectors
+from vector.persistence import WAL_FILE_NAME, WriteAheadLog, acquire_writer_lock, load_checkpoint, read_manifest, vector_file_path, write_ingest_status
+from vector.store import NefacFAISS, ThreadSafeVectorStore
+from vector.vector_file import Float16VectorFile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_env()
+
+
+def initialize_vector_store(store_path=FAISS_STORE_PATH):
+    """Open the store for writing: the latest checkpoint plus the write-ahead log, or a new empty store"""
+    logger.info("Initializing vector store...")
+    embedding_model = get_embedding_model()
+
+    vector_store = load_checkpoint(store_path, embedding_model)
+    if vector_store is not None:
+        configure_search(vector_store.index)
+        index_type = get_index_type(vector_store.index)
+        if index_type != FAISS_INDEX_TYPE:
+            logger.warning(f"Vector store uses a {index_type} index but FAISS_INDEX_TYPE is {FAISS_INDEX_TYPE}; run `python -m vector.index migrate --index-type {FAISS_INDEX_TYPE}` to convert it")
+    else:
+        logger.info("Creating new empty vector store...")
+        index_type = FAISS_INDEX_TYPE
+        if min_training_vectors(index_type) > 0:
+            # IVF indexes cannot be trained without data; start exact and migrate once the corpus exists
+            logger.warning(f"{index_type} indexes need training data, starting with a flat index; run `python -m vector.index migrate --index-type {index_type}` after ingestion")
+            index_type = "flat"
+        os.makedirs(store_path, exist_ok=True)
+        vector_store = NefacFAISS(
+            embedding_function=embedding_model,
+            index=build_index(index_type, EMBEDDING_DIMENSIONS),
+            docstore=MmapDocstore.create(store_path, {}),
+            index_to_docstore_id={},
+            vector_file=Float16VectorFile.create(vector_file_path(store_path), np.zeros((0, EMBEDDING_DIMENSIONS))),
+        )
+
+    # Chunks added after the last checkpoint
+    wal = WriteAheadLog(os.path.join(store_path, WAL_FILE_NAME))
+    wal.replay(vector_store)
+
+    logger.info("Vector store initialized successfully")
+    return ThreadSafeVectorStore(vector_store, store_path, wal)
+
+
+def chunk_documents(docs):
+    """Split documents into chunks (documents already chunked at load time, such as PDF pages, pass through)"""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunked_docs = []
+    for doc in docs:
+        if not doc.page_content.strip():
+            continue
+        if len(doc.page_content) <= CHUNK_SIZE:
+            chunked_docs.append(doc)
+        else:
+            chunked_docs.extend(text_splitter.split_documents([doc]))
+    return chunked_docs
+
+
+def process_single_document(doc_name, title_to_chunks, doc_type="unknown"):
+    """Process a single document and return its chunks"""
+    try:
+        if doc_name not in title_to_chunks:
+            logger.warning(f"Document {doc_name} not found in title_to_chunks")
+            return []
+
+        doc_chunks = title_to_chunks[doc_name]
+        chunked_docs = chunk_documents(doc_chunks)
+
+        logger.info(f"Processed {doc_name}: {len(doc_chunks)} original chunks -> {len(chunked_docs)} processed chunks")
+        return chunked_docs
+
+    except Exception as e:
+        logger.error(f"Error processing document {doc_name}: {e}")
+        return []
+
+
+def publish_status(store_path, status, current=0, total=0, is_loading=True):
+    write_ingest_status(store_path, {"current": current, "total": total, "status": status, "is_loading": is_loading, "pid": os.getpid()})
+
+
+def add_documents_sequentially(store, store_path=FAISS_STORE_PATH):
+    """Load the waiting room and upsert every new document into store, then publish a checkpoint"""
+    try:
+        logger.info("Starting sequential document addition...")
+        publish_status(store_path, "initializing")
+
+        # Load all documents and metadata, reporting per-URL progress
+        def report_url(done, total, url, succeeded):
+            publish_status(store_path, "loading_youtube", done, total)
+
+        all_documents, url_to_title, title_to_chunks, new_docs = load_all_documents(progress=report_url)
+
+        # Save metadata
+        with open("doc_names.pkl", "wb") as doc_names:
+            pickle.dump(all_documents, doc_names)
+        with open("url_to_title.pkl", "wb") as u2t:
+            pickle.dump(url_to_title, u2t)
+        with open("title_to_chunks.pkl", "wb") as t2c:
+            pickle.dump(title_to_chunks, t2c)
+
+        # Chunks already in the store follow the taxonomy folders as they are now
+        taxonomy = load_taxonomy()
+        retagged = store.retag(lambda metadata: document_tags(metadata.get("source", ""), taxonomy))
+        if retagged:
+            logger.info(f"Updated the taxonomy tags of {retagged} chunks")
+
+        if not new_docs:
+            logger.info("No new documents to add to vector store")
+            if retagged:
+                store.checkpoint()
+            publish_status(store_path, "complete", is_loading=False)
+            return
+
+        new_docs_list = list(new_docs)
+        logger.info(f"Found {len(new_docs_list)} new documents to add sequentially")
+
+        # Process each document individually
+        for i, doc_name in enumerate(new_docs_list, 1):
+            try:
+                publish_status(store_path, "adding_documents", i, len(new_docs_list))
+                logger.info(f"Processing document {i}/{len(new_docs_list)}: {doc_name}")
+
+                # Determine document type
+                doc_type = "pdf" if doc_name.endswith(".pdf") else "youtube"
+
+                # Process single document
+                chunked_docs = tag_documents(process_single_document(doc_name, title_to_chunks, doc_type), taxonomy)
+
+                if chunked_docs:
+                    # Replace the document's chunks; unchanged chunks are not re-embedded
+                    added, removed = store.upsert_documents(doc_name, chunked_docs)
+                    logger.info(f"Successfully added document {i}/{len(new_docs_list)}: {doc_name} ({len(chunked_docs)} chunks, {added} new, {removed} removed)")
+                else:
+                    logger.warning(f"No chunks generated for document: {doc_name}")
+
+            except Exception as e:
+                logger.error(f"Error processing document {doc_name}: {e}")
+                continue
+
+        # Publish the whole run as one generation instead of leaving it in the log
+        store.checkpoint()
+
+        publish_status(store_path, "complete", len(new_docs_list), len(new_docs_list), is_loading=False)
+        logger.info(f"Sequential document addition complete. Processed {len(new_docs_list)} documents.")
+
+    except Exception as e:
+        logger.error(f"Error in sequential document addition: {e}")
+        publish_status(store_path, "error", is_loading=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--watch", action="store_true", help="Keep running, ingesting whenever the waiting room has documents")
+    parser.add_argument("--interval", type=float, default=INGEST_POLL_SECONDS, help="Seconds between waiting-room checks with --watch")
+    args = parser.parse_args()
+
+    _writer_lock = acquire_writer_lock(FAISS_STORE_PATH)
+    store = initialize_vector_store()
+    if read_manifest(FAISS_STORE_PATH) is None or store.wal.size():
+        # Publish the store as it stands, so web workers can start serving it
+        store.checkpoint()
+    add_documents_sequentially(store)
+
+    while args.watch:
+        time.sleep(args.interval)
+        if has_waiting_documents():
+            add_documents_sequentially(store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from vector.constant import BM25_B, BM25_K1
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEXICAL_TERMS_FILE_NAME = "lexical.terms.json"
+# offsets, rows, freqs and lengths arrays, one .npy file each
+LEXICAL_ARRAY_FILE_NAMES = {name: f"lexical.{name}.npy" for name in ("offsets", "rows", "freqs", "lengths")}
+
+# Words, numbers and joined identifiers such as "91-a", "g.l" or "4-1.5"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./:][a-z0-9]+)*")
+_TOKEN_SEPARATORS = re.compile(r"[-./:]")
+STOPWORDS = frozenset("a an and are as at be by can do does for from has have how i if in is it its may my of on or that the their there this to was what when where which who why will with you your".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of text without stopwords.
+
+    A joined identifier is kept whole and also indexed by its leading
+    prefixes and its parts, so "RSA 91-A:4" matches "91-A" and "91-A:4".
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            tokens.append(token)
+        if not token.isalnum():
+            # The first prefix is also the first part
+            tokens.extend(token[: separator.start()] for separator in list(_TOKEN_SEPARATORS.finditer(token))[1:])
+            tokens.extend(part for part in _TOKEN_SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def top_rows(scores: np.ndarray, k: int, exclude: Iterable[int] = ()) -> np.ndarray:
+    """Rows of the k highest positive scores, best first, skipping exclude"""
+    keep = scores > 0
+    exclude = np.fromiter(exclude, dtype=np.int64)
+    if len(exclude):
+        keep[exclude[exclude < len(scores)]] = False
+    rows = np.flatnonzero(keep)
+    if len(rows) > k:
+        rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index with one document per FAISS row of a store.
+
+    Postings are held in CSR form: the rows and term frequencies of term t are
+    rows[offsets[t]:offsets[t + 1]] and freqs[offsets[t]:offsets[t + 1]], in
+    row order, next to the token count of every row. Rows added since the last
+    save or search wait in a pending list and are merged in on the next one,
+    so ingestion only pays for tokenizing its own chunks. Saved indexes can be
+    memory-mapped, like the docstore, so every worker shares one copy.
+    """
+
+    def __init__(
+        self,
+        terms: Optional[Dict[str, int]] = None,
+        offsets: Optional[np.ndarray] = None,
+        rows: Optional[np.ndarray] = None,
+        freqs: Optional[np.ndarray] = None,
+        lengths: Optional[np.ndarray] = None,
+    ):
+        self.terms: Dict[str, int] = dict(terms or {})
+        self.offsets = offsets if offsets is not None else np.zeros(len(self.terms) + 1, dtype=np.int64)
+        self.rows = rows if rows is not None else np.zeros(0, dtype=np.int32)
+        self.freqs = freqs if freqs is not None else np.zeros(0, dtype=np.uint16)
+        self.lengths = lengths if lengths is not None else np.zeros(0, dtype=np.int32)
+        self._pending_terms: List[int] = []
+        self._pending_rows: List[int] = []
+        self._pending_freqs: List[int] = []
+        self._pending_lengths: List[int] = []
+        self._lock = threading.Lock()
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.lengths) + len(self._pending_lengths)
+
+    def add(self, texts: Iterable[str]) -> None:
+        """Index texts as the next rows"""
+        row = self.num_rows
+        for text in texts:
+            counts: Dict[int, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                term = self.terms.setdefault(token, len(self.terms))
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                self._pending_terms.append(term)
+                self._pending_rows.append(row)
+                self._pending_freqs.append(min(count, np.iinfo(np.uint16).max))
+            self._pending_lengths.append(len(tokens))
+            row += 1
+
+    def _merge(self) -> None:
+        with self._lock:
+            if not self._pending_lengths:
+                return
+            base_terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+            terms = np.concatenate([base_terms, np.array(self._pending_terms, dtype=np.int64)])
+            # Stable, and pending rows come after every base row, so each term's rows stay sorted
+            order = np.argsort(terms, kind="stable")
+            self.rows = np.concatenate([self.rows, np.array(self._pending_rows, dtype=np.int32)])[order]
+            self.freqs = np.concatenate([self.freqs, np.array(self._pending_freqs, dtype=np.uint16)])[order]
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.terms)))]).astype(np.int64)
+            self.lengths = np.concatenate([self.lengths, np.array(self._pending_lengths, dtype=np.int32)])
+            self._pending_terms, self._pending_rows, self._pending_freqs, self._pending_lengths = [], [], [], []
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for query (0 for rows sharing no term with it)"""
+        self._merge()
+        num_rows = len(self.lengths)
+        term_ids = sorted({self.terms[token] for token in tokenize(query) if token in self.terms})
+        if not term_ids or num_rows == 0:
+            return np.zeros(num_rows, dtype=np.float32)
+
+        average_length = max(float(self.lengths.mean()), 1.0)
+        rows, contributions = [], []
+        for term in term_ids:
+            start, end = int(self.offsets[term]), int(self.offsets[term + 1])
+            term_rows = np.asarray(self.rows[start:end])
+            tf = np.asarray(self.freqs[start:end], dtype=np.float32)
+            idf = math.log(1 + (num_rows - (end - start) + 0.5) / (end - start + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.lengths[term_rows], dtype=np.float32) / average_length)
+            rows.append(term_rows)
+            contributions.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        return np.bincount(np.concatenate(rows), weights=np.concatenate(contributions), minlength=num_rows).astype(np.float32)
+
+    def search(self, query: str, k: int, exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Top k rows by BM25 score, best first, skipping exclude and rows with no matching term"""
+        scores = self.scores(query)
+        rows = top_rows(scores, k, exclude)
+        return rows, scores[rows]
+
+    def save(self, directory: str) -> None:
+        self._merge()
+        with open(os.path.join(directory, LEXICAL_TERMS_FILE_NAME), "w") as f:
+            json.dump(sorted(self.terms, key=self.terms.get), f)
+        for name, file_name in LEXICAL_ARRAY_FILE_NAMES.items():
+            np.save(os.path.join(directory, file_name), np.ascontiguousarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> Optional["LexicalIndex"]:
+        """Index saved in directory, or None when it has none"""
+        terms_path = os.path.join(directory, LEXICAL_TERMS_FILE_NAME)
+        if not os.path.exists(terms_path):
+            return None
+        with open(terms_path) as f:
+            terms = {term: i for i, term in enumerate(json.load(f))}
+        arrays = {name: np.load(os.path.join(directory, file_name), mmap_mode="r" if mmap else None) for name, file_name in LEXICAL_ARRAY_FILE_NAMES.items()}
+        return cls(terms, **arrays)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        index = cls()
+        index.add(texts)
+        index._merge()
+        return index
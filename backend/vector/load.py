@@ -1,214 +1,136 @@
+"""
+Read-only access to the vector store for the web workers.
+
+Workers load the checkpoint the ingestion process last published (see
+vector/ingest.py) and never write to faiss_store or start ingestion
+themselves, so any number of gunicorn workers can share one store.
+
+Each worker polls the CURRENT manifest, which the writer replaces atomically.
+A newer checkpoint is loaded in a background thread while the old one keeps
+serving, then swapped in under the store's write lock, which waits for
+in-flight searches to finish on the old index.
+"""
+
 import logging
 import os
-import pickle
 import threading
 import time
 
 import faiss
 from langchain_community.docstore.in_memory import InMemoryDocstore
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from document.loader import load_all_documents
 from load_env import load_env
+from vector.constant import EMBEDDING_DIMENSIONS, FAISS_STORE_PATH, INDEX_POLL_SECONDS
+from vector.embeddings import get_embedding_model
+from vector.index import configure_search
+from vector.persistence import checkpoint_number, load_checkpoint, read_ingest_status, read_manifest
+from vector.store import NefacFAISS, ThreadSafeVectorStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_env()
 
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-large")
-
-FAISS_STORE_PATH = "faiss_store"
+embedding_model = get_embedding_model()
 
 # Global variables for thread-safe vector store management
 _vector_store = None
 _vector_store_lock = threading.RLock()
-_is_loading = False
-_loading_progress = {"current": 0, "total": 0, "status": "initializing"}
-
-
-class ThreadSafeVectorStore:
-    """Wrapper for FAISS vector store to make it thread-safe"""
-
-    def __init__(self, vector_store):
-        self.vector_store = vector_store
-        self.lock = threading.RLock()
-
-    def similarity_search(self, query, k=4, **kwargs):
-        with self.lock:
-            return self.vector_store.similarity_search(query, k=k, **kwargs)
-
-    def as_retriever(self, **kwargs):
-        # Create a thread-safe retriever wrapper
-        class ThreadSafeRetriever:
-            def __init__(self, wrapped_store):
-                self.wrapped_store = wrapped_store
-
-            def invoke(self, query):
-                with self.wrapped_store.lock:
-                    return self.wrapped_store.vector_store.as_retriever(**kwargs).invoke(query)
-
-        return ThreadSafeRetriever(self)
 
-    def add_documents(self, documents):
-        with self.lock:
-            if documents:
-                logger.info(f"Adding {len(documents)} documents to vector store")
-                self.vector_store.add_documents(documents)
-                # Save after each addition to persist progress
-                self.vector_store.save_local(FAISS_STORE_PATH)
-                logger.info(f"Documents added and saved to {FAISS_STORE_PATH}")
 
-    def save_local(self, path):
-        with self.lock:
-            self.vector_store.save_local(path)
-
-
-def initialize_empty_vector_store():
-    """Initialize an empty FAISS vector store"""
-    logger.info("Initializing empty vector store...")
-
-    if os.path.exists(FAISS_STORE_PATH):
-        logger.info("Existing vector store found, loading...")
-        vector_store = FAISS.load_local(
-            FAISS_STORE_PATH,
-            embeddings=embedding_model,
-            allow_dangerous_deserialization=True,
-        )
+def open_vector_store():
+    """Open the latest published checkpoint read-only, or an empty store if nothing has been published yet"""
+    vector_store = load_checkpoint(FAISS_STORE_PATH, embedding_model, read_only=True)
+    if vector_store is not None:
+        configure_search(vector_store.index)
     else:
-        logger.info("Creating new empty vector store...")
-        vector_store = FAISS(
+        logger.warning(f"No checkpoint in {FAISS_STORE_PATH} yet; serving an empty store until `python -m vector.ingest` publishes one")
+        vector_store = NefacFAISS(
             embedding_function=embedding_model,
-            index=faiss.IndexFlatIP(3072),  # text-embedding-3-large -> 3072 dimensions
+            index=faiss.IndexFlatIP(EMBEDDING_DIMENSIONS),
             docstore=InMemoryDocstore({}),
             index_to_docstore_id={},
         )
+    return ThreadSafeVectorStore(vector_store, FAISS_STORE_PATH)
 
-    logger.info("Vector store initialized successfully")
-    return ThreadSafeVectorStore(vector_store)
 
+def get_vector_store():
+    """Get the vector store, opening it if needed"""
+    global _vector_store
 
-def chunk_documents(docs):
-    """Split documents into chunks"""
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=32)
-    chunked_docs = text_splitter.split_documents(docs)
-    return chunked_docs
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = open_vector_store()
 
+            logger.info(f"Watching {FAISS_STORE_PATH} for new checkpoints...")
+            thread = threading.Thread(target=_watch_checkpoints, daemon=True)
+            thread.start()
+        return _vector_store
 
-def process_single_document(doc_name, title_to_chunks, doc_type="unknown"):
-    """Process a single document and return its chunks"""
-    try:
-        if doc_name not in title_to_chunks:
-            logger.warning(f"Document {doc_name} not found in title_to_chunks")
-            return []
 
-        doc_chunks = title_to_chunks[doc_name]
-        chunked_docs = chunk_documents(doc_chunks)
+def refresh_vector_store():
+    """Swap in the latest published checkpoint if it is not the one being served; returns whether it did"""
+    store = get_vector_store()
+    manifest = read_manifest(FAISS_STORE_PATH)
+    if manifest is None or manifest["checkpoint"] == store.vector_store.checkpoint_name:
+        return False
 
-        logger.info(f"Processed {doc_name}: {len(doc_chunks)} original chunks -> {len(chunked_docs)} processed chunks")
-        return chunked_docs
+    logger.info(f"Loading {manifest['checkpoint']} to replace {store.vector_store.checkpoint_name}")
+    vector_store = load_checkpoint(FAISS_STORE_PATH, embedding_model, read_only=True)
+    configure_search(vector_store.index)
+    store.swap(vector_store)
+    logger.info(f"Now serving {vector_store.checkpoint_name} ({vector_store.index.ntotal} vectors)")
+    return True
 
-    except Exception as e:
-        logger.error(f"Error processing document {doc_name}: {e}")
-        return []
 
+def _watch_checkpoints():
+    while True:
+        time.sleep(INDEX_POLL_SECONDS)
+        try:
+            refresh_vector_store()
+        except Exception as e:
+            logger.error(f"Error loading new checkpoint: {e}")
 
-def add_documents_sequentially():
-    """Add documents to vector store one by one in background"""
-    global _is_loading, _loading_progress
 
+def _ingestion_process_alive(pid):
     try:
-        _is_loading = True
-        logger.info("Starting sequential document addition...")
-
-        # Load all documents and metadata
-        all_documents, url_to_title, title_to_chunks, new_docs = load_all_documents()
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
-        # Save metadata
-        with open("doc_names.pkl", "wb") as doc_names:
-            pickle.dump(all_documents, doc_names)
-        with open("url_to_title.pkl", "wb") as u2t:
-            pickle.dump(url_to_title, u2t)
-        with open("title_to_chunks.pkl", "wb") as t2c:
-            pickle.dump(title_to_chunks, t2c)
 
-        if not new_docs:
-            logger.info("No new documents to add to vector store")
-            _loading_progress["status"] = "complete"
-            return
-
-        new_docs_list = list(new_docs)
-        _loading_progress["total"] = len(new_docs_list)
-        _loading_progress["status"] = "adding_documents"
-
-        logger.info(f"Found {len(new_docs_list)} new documents to add sequentially")
-
-        # Process each document individually
-        for i, doc_name in enumerate(new_docs_list, 1):
-            try:
-                _loading_progress["current"] = i
-                logger.info(f"Processing document {i}/{len(new_docs_list)}: {doc_name}")
-
-                # Determine document type
-                doc_type = "pdf" if doc_name.endswith(".pdf") else "youtube"
-
-                # Process single document
-                chunked_docs = process_single_document(doc_name, title_to_chunks, doc_type)
-
-                if chunked_docs:
-                    # Add to vector store
-                    with _vector_store_lock:
-                        if _vector_store:
-                            _vector_store.add_documents(chunked_docs)
-
-                    logger.info(f"Successfully added document {i}/{len(new_docs_list)}: {doc_name} ({len(chunked_docs)} chunks)")
-                else:
-                    logger.warning(f"No chunks generated for document: {doc_name}")
-
-                # Small delay to prevent overwhelming the system
-                time.sleep(0.1)
-
-            except Exception as e:
-                logger.error(f"Error processing document {doc_name}: {e}")
-                continue
-
-        _loading_progress["status"] = "complete"
-        logger.info(f"Sequential document addition complete. Processed {len(new_docs_list)} documents.")
-
-    except Exception as e:
-        logger.error(f"Error in sequential document addition: {e}")
-        _loading_progress["status"] = "error"
-    finally:
-        _is_loading = False
-
-
-def get_vector_store():
-    """Get the vector store, initializing if needed"""
-    global _vector_store
-
-    with _vector_store_lock:
-        if _vector_store is None:
-            _vector_store = initialize_empty_vector_store()
+def get_loading_status():
+    """Get the loading status published by the ingestion process"""
+    status = read_ingest_status(FAISS_STORE_PATH)
+    if status is None:
+        return {"current": 0, "total": 0, "status": "not_started", "is_loading": False}
+    if status.get("is_loading") and not _ingestion_process_alive(status.get("pid", 0)):
+        status.update(status="interrupted", is_loading=False)
+    return status
 
-            # Start background document loading
-            logger.info("Starting background document loading...")
-            thread = threading.Thread(target=add_documents_sequentially, daemon=True)
-            thread.start()
 
-        return _vector_store.vector_store
+def get_serving_status():
+    """Generation this worker serves and the latest one published, as checkpoint numbers"""
+    manifest = read_manifest(FAISS_STORE_PATH)
+    return {
+        "generation": checkpoint_number(_vector_store.vector_store.checkpoint_name) if _vector_store else 0,
+        "published_generation": checkpoint_number(manifest["checkpoint"] if manifest else None),
+        "worker_pid": os.getpid(),
+    }
 
 
-def get_loading_status():
-    """Get current loading status"""
-    return _loading_progress.copy()
+def get_index_generation():
+    """Get the generation of the index currently being served"""
+    return _vector_store.generation if _vector_store else 0
 
 
 def is_loading():
     """Check if documents are currently being loaded"""
-    return _is_loading
+    return get_loading_status()["is_loading"]
 
 
-# Initialize the vector store immediately when module is imported
+# Open the vector store when the module is imported
 vector_store = get_vector_store()
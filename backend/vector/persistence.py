@@ -0,0 +1,322 @@
+"""
+Durable on-disk layout of the vector store.
+
+    faiss_store/
+        CURRENT                 manifest naming the latest complete checkpoint
+        checkpoint-000042/      index.faiss, index_ids.json, coarse.faiss, index_meta.json
+        vectors.f16             float16 side file, shared by every checkpoint
+        docs.offsets/.text/.meta  memory-mapped docstore columns, shared likewise
+        data-000057/            the same data files, rewritten by a compaction
+        wal.log                 chunks added and removed since the latest checkpoint
+        ingest.lock             held by the one process allowed to write (vector/ingest.py, or an index migration)
+        ingest_status.json      progress of that process, for /loading-status
+
+Additions are appended to the write-ahead log (vectors, texts, metadata and
+docstore ids), which is O(batch) per document instead of rewriting the whole
+index and docstore. Full checkpoints are written to a new directory and made
+current by atomically replacing CURRENT, then the log is truncated. On
+startup the latest checkpoint is loaded and the log replayed on top of it.
+
+Every WAL record carries the checkpoint it was appended on top of, so records
+already contained in a later checkpoint (e.g. after a crash between the
+CURRENT swap and the log truncation) are skipped rather than applied twice;
+records written before that tag existed fall back to the FAISS row they start
+at. Removals are tombstones of rows, which are idempotent.
+
+The data files are append-only, so checkpoints share them. A compaction
+renumbers the rows, so it writes its data files to a new data-NNNNNN
+directory named after its checkpoint, which CURRENT then points to; older
+data directories are removed with the last checkpoint that uses them. Web
+workers map every file of a checkpoint while loading it, so one still
+serving a removed checkpoint keeps reading its unlinked files until it swaps.
+
+Only the ingestion process writes to a store. Web workers load the current
+checkpoint read-only and never replay the log, so they serve exactly the
+generations the writer has published through CURRENT; they poll it and swap
+newer generations in while running (see vector/load.py).
+
+Stores saved before checkpoints existed (index.faiss directly in faiss_store,
+with a pickled docstore in index.pkl) are loaded as they are and converted by
+their first checkpoint.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import struct
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+from vector.constant import CHECKPOINTS_TO_KEEP
+from vector.docstore import DOCSTORE_FILE_NAMES
+from vector.store import COARSE_INDEX_FILE_NAME, IDS_FILE_SUFFIX, INDEX_META_FILE_NAME, VECTOR_FILE_NAME, NefacFAISS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "CURRENT"
+WAL_FILE_NAME = "wal.log"
+CHECKPOINT_PREFIX = "checkpoint-"
+DATA_PREFIX = "data-"
+INGEST_LOCK_FILE_NAME = "ingest.lock"
+INGEST_STATUS_FILE_NAME = "ingest_status.json"
+
+# start row, metadata bytes, vector bytes, crc32 of both payloads
+_RECORD_HEADER = struct.Struct("<QIII")
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of added chunks.
+
+    Each record is a fixed header followed by a JSON payload (ids, texts,
+    metadatas, tombstoned rows, document chunk ids and the base checkpoint)
+    and the float32 vectors. A torn or corrupt tail, left by a crash
+    mid-append, ends replay and is truncated away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, start, ids, texts, metadatas, vectors, tombstones=(), documents=None, checkpoint=None):
+        record = {"ids": ids, "texts": texts, "metadatas": metadatas, "tombstones": list(tombstones), "documents": documents or {}, "checkpoint": checkpoint}
+        payload = json.dumps(record, default=str).encode("utf-8")
+        vector_bytes = np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+        header = _RECORD_HEADER.pack(start, len(payload), len(vector_bytes), zlib.crc32(vector_bytes, zlib.crc32(payload)))
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(header + payload + vector_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def records(self):
+        """Yield (start, record, vectors) for every intact record, record being the JSON payload"""
+        if not os.path.exists(self.path):
+            return
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    break
+                start, payload_size, vector_size, checksum = _RECORD_HEADER.unpack(header)
+                payload = f.read(payload_size)
+                vector_bytes = f.read(vector_size)
+                if len(payload) < payload_size or len(vector_bytes) < vector_size or zlib.crc32(vector_bytes, zlib.crc32(payload)) != checksum:
+                    break
+                valid_bytes = f.tell()
+                record = json.loads(payload)
+                vectors = np.frombuffer(vector_bytes, dtype=np.float32).reshape(len(record["ids"]), -1) if record["ids"] else np.zeros((0, 0), dtype=np.float32)
+                yield start, record, vectors
+
+        if valid_bytes < self.size():
+            logger.warning(f"Truncating torn tail of {self.path} at byte {valid_bytes}")
+            os.truncate(self.path, valid_bytes)
+
+    def replay(self, vector_store):
+        """Apply every record not yet in the store's checkpoint; returns the number of chunks replayed"""
+        replayed = 0
+        for start, record, vectors in self.records():
+            if "checkpoint" in record and record["checkpoint"] != vector_store.checkpoint_name:
+                # Appended before a checkpoint that already contains it
+                continue
+            ids, texts, metadatas = record["ids"], record["texts"], record["metadatas"]
+            skip = vector_store.index.ntotal - start
+            if skip < 0:
+                logger.error(f"{self.path} skips rows {vector_store.index.ntotal}-{start}; stopping replay")
+                break
+            skip = min(skip, len(ids))
+            vector_store.update(
+                zip(texts[skip:], vectors[skip:].tolist()),
+                metadatas=metadatas[skip:],
+                ids=ids[skip:],
+                tombstones=record.get("tombstones", ()),
+                document_chunk_ids=record.get("documents"),
+            )
+            replayed += len(ids) - skip
+        if replayed:
+            logger.info(f"Replayed {replayed} chunks from {self.path}")
+        return replayed
+
+    def reset(self):
+        with self._lock:
+            with open(self.path, "wb") as f:
+                os.fsync(f.fileno())
+
+
+def vector_file_path(store_path):
+    return os.path.join(store_path, VECTOR_FILE_NAME)
+
+
+def store_data_path(store_path, manifest=None):
+    """Directory of the data files of the current checkpoint: the store root unless it was compacted"""
+    manifest = manifest or read_manifest(store_path) or {}
+    return os.path.normpath(os.path.join(store_path, manifest.get("data", ".")))
+
+
+def next_data_path(store_path):
+    """Data directory for a compaction written as the next checkpoint"""
+    return os.path.join(store_path, f"{DATA_PREFIX}{_next_checkpoint_number(store_path):06d}")
+
+
+def checkpoint_number(name):
+    """Generation number of a checkpoint name (0 for None, i.e. no checkpoint)"""
+    return int(name[len(CHECKPOINT_PREFIX) :]) if name else 0
+
+
+def _next_checkpoint_number(store_path):
+    manifest = read_manifest(store_path)
+    return checkpoint_number(manifest["checkpoint"] if manifest else None) + 1
+
+
+def read_manifest(store_path):
+    """The CURRENT manifest of a store, or None when it has no checkpoint yet"""
+    path = os.path.join(store_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def checkpoint_path(store_path):
+    """Directory of the checkpoint to load, or None for a new store"""
+    manifest = read_manifest(store_path)
+    if manifest is not None:
+        return os.path.join(store_path, manifest["checkpoint"])
+    if os.path.exists(os.path.join(store_path, "index.faiss")):
+        # Saved before checkpoints existed
+        return store_path
+    return None
+
+
+def load_checkpoint(store_path, embeddings, read_only=False):
+    """Load the latest checkpoint of a store (without replaying the log), or None"""
+    path = checkpoint_path(store_path)
+    if path is None:
+        return None
+    logger.info(f"Loading checkpoint {path}")
+    manifest = read_manifest(store_path)
+    # Only stores saved before checkpoints existed have a pickled docstore to allow
+    vector_store = NefacFAISS.load_local(path, embeddings=embeddings, data_path=store_data_path(store_path, manifest), read_only=read_only, allow_dangerous_deserialization=path == store_path)
+    vector_store.checkpoint_name = manifest["checkpoint"] if manifest else None
+    return vector_store
+
+
+def write_checkpoint(vector_store, store_path, wal=None, data_path=None):
+    """
+    Write a full checkpoint of vector_store and make it current.
+
+    The new checkpoint directory is complete and fsynced before CURRENT is
+    atomically replaced, so a crash at any point leaves either the old or the
+    new checkpoint current. The log is only truncated afterwards.
+
+    data_path is where the data files go: the current data directory by
+    default, or next_data_path(store_path) for a compacted store.
+    """
+    number = _next_checkpoint_number(store_path)
+    name = f"{CHECKPOINT_PREFIX}{number:06d}"
+    path = os.path.join(store_path, name)
+    data_path = data_path or store_data_path(store_path)
+
+    shutil.rmtree(path, ignore_errors=True)
+    orphan_data_path = os.path.join(store_path, f"{DATA_PREFIX}{number:06d}")
+    if os.path.abspath(orphan_data_path) != os.path.abspath(data_path):
+        # Left by a compaction that crashed before it became current
+        shutil.rmtree(orphan_data_path, ignore_errors=True)
+    vector_store.save_local(path, data_path=data_path)
+    data_files = [os.path.join(data_path, file_name) for file_name in (VECTOR_FILE_NAME, *DOCSTORE_FILE_NAMES)]
+    for file_path in [os.path.join(path, file_name) for file_name in os.listdir(path)] + data_files:
+        if os.path.exists(file_path):
+            with open(file_path, "rb") as f:
+                os.fsync(f.fileno())
+    _fsync_dir(path)
+    _fsync_dir(data_path)
+
+    manifest_path = os.path.join(store_path, MANIFEST_FILE_NAME)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump({"checkpoint": name, "data": os.path.relpath(data_path, store_path), "ntotal": vector_store.index.ntotal, "tombstones": len(vector_store.tombstones)}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    _fsync_dir(store_path)
+
+    vector_store.checkpoint_name = name
+    if wal is not None:
+        wal.reset()
+    _remove_old_checkpoints(store_path, number)
+    logger.info(f"Checkpoint {name} written with {vector_store.index.ntotal} vectors ({len(vector_store.tombstones)} tombstoned)")
+
+
+def _remove_old_checkpoints(store_path, current_number):
+    kept = []
+    for name in os.listdir(store_path):
+        if name.startswith(CHECKPOINT_PREFIX):
+            number = int(name[len(CHECKPOINT_PREFIX) :])
+            if number <= current_number - CHECKPOINTS_TO_KEEP:
+                shutil.rmtree(os.path.join(store_path, name), ignore_errors=True)
+            else:
+                kept.append(number)
+
+    # Each checkpoint uses the data directory of the latest compaction at or before it (0 is the store root)
+    data_numbers = sorted(int(name[len(DATA_PREFIX) :]) for name in os.listdir(store_path) if name.startswith(DATA_PREFIX))
+    used = {max((n for n in data_numbers if n <= number), default=0) for number in kept}
+    for number in data_numbers:
+        if number not in used:
+            shutil.rmtree(os.path.join(store_path, f"{DATA_PREFIX}{number:06d}"), ignore_errors=True)
+    if data_numbers and 0 not in used:
+        for file_name in (VECTOR_FILE_NAME, *DOCSTORE_FILE_NAMES):
+            if os.path.exists(os.path.join(store_path, file_name)):
+                os.remove(os.path.join(store_path, file_name))
+
+    # Files of a store saved before checkpoints existed
+    for file_name in ("index.faiss", "index.pkl", f"index{IDS_FILE_SUFFIX}", COARSE_INDEX_FILE_NAME, INDEX_META_FILE_NAME):
+        if os.path.exists(os.path.join(store_path, file_name)):
+            os.remove(os.path.join(store_path, file_name))
+
+
+def acquire_writer_lock(store_path):
+    """Take the store's exclusive writer lock, or exit if another process (ingestion or a migration) holds it"""
+    os.makedirs(store_path, exist_ok=True)
+    lock_file = open(os.path.join(store_path, INGEST_LOCK_FILE_NAME), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        logger.error(f"Another process is writing to {store_path}; exiting")
+        sys.exit(1)
+    # Released when closed or when the process exits
+    return lock_file
+
+
+def write_ingest_status(store_path, status):
+    """Atomically replace the ingestion status file"""
+    path = os.path.join(store_path, INGEST_STATUS_FILE_NAME)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_ingest_status(store_path):
+    """The status last written by the ingestion process, or None"""
+    try:
+        with open(os.path.join(store_path, INGEST_STATUS_FILE_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
@@ -0,0 +1,1017 @@
+import hashlib
+import json
+import logging
+import operator
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, ClassVar, Collection, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy, maximal_marginal_relevance
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config, get_config_list, run_in_executor
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from vector.constant import (
+    CHECKPOINT_INTERVAL_SECONDS,
+    CHECKPOINT_WAL_BYTES,
+    COARSE_DIMENSIONS,
+    COMPACTION_TOMBSTONE_FRACTION,
+    HYBRID_CANDIDATE_FACTOR,
+    HYBRID_DENSE_WEIGHT,
+    QUANTIZED_INDEX_TYPES,
+    RERANK_FACTOR,
+    TWO_STAGE_CANDIDATE_FACTOR,
+)
+from vector.docstore import MmapDocstore
+from vector.index import get_index_type, read_index, reconstruct_vectors, search_parameters
+from vector.lexical import LexicalIndex, top_rows
+from vector.rw_lock import ReadWriteLock
+from vector.tags import TagIndex, row_tags
+from vector.vector_file import Float16VectorFile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VECTOR_FILE_NAME = "vectors.f16"
+COARSE_INDEX_FILE_NAME = "coarse.faiss"
+IDS_FILE_SUFFIX = "_ids.json"
+INDEX_META_FILE_NAME = "index_meta.json"
+# Metadata key a NefacRetriever with include_scores=True records each chunk's search score under
+SCORE_METADATA_KEY = "score"
+# Key of a run's config["configurable"] holding the tag filter its retriever searches apply, e.g.
+# {"audience": ["journalist"], "resource_type": ["guides"]} (see TagIndex.bitmap)
+TAG_FILTER_CONFIG_KEY = "tag_filter"
+
+
+def chunk_id(document_key: str, text: str) -> str:
+    """Content-addressed id of a chunk: the same text in the same document always gets the same id"""
+    return hashlib.sha256(f"{document_key}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def build_coarse_index(vectors: np.ndarray) -> Any:
+    """Flat index over the COARSE_DIMENSIONS-long prefixes of vectors, for the first stage of "two_stage" search"""
+    coarse = faiss.IndexFlatIP(min(COARSE_DIMENSIONS, vectors.shape[1]))
+    coarse.add(truncate_vectors(vectors, coarse.d))
+    return coarse
+
+
+def truncate_vectors(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Shorten text-embedding-3 vectors to their first dimensions components.
+
+    The text-embedding-3 models are trained so that a re-normalized prefix is
+    the same embedding the API returns for a reduced `dimensions`, so the
+    coarse vectors need no extra embedding calls.
+    """
+    short = np.array(np.asarray(vectors, dtype=np.float32)[:, :dimensions], order="C")
+    faiss.normalize_L2(short)
+    return short
+
+
+class NefacRetriever(VectorStoreRetriever):
+    """VectorStoreRetriever that also accepts the search types NefacFAISS adds"""
+
+    allowed_search_types: ClassVar[Collection[str]] = (
+        *VectorStoreRetriever.allowed_search_types,
+        "two_stage",
+        "hybrid",
+    )
+
+    # Return copies of the chunks with their search score in metadata[SCORE_METADATA_KEY]
+    # (higher is better), so results can be fused by chunk id and score (see llm/fusion.py)
+    include_scores: bool = False
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun, documents: Optional[List[Document]] = None, **kwargs: Any) -> List[Document]:
+        if documents is not None:
+            # Already found by batch(), which reports every query as its own retriever run
+            return documents
+        if self.include_scores or self.search_type == "hybrid" or kwargs.get("tag_filter"):
+            return self._search([query], **kwargs)[0]
+        if self.search_type == "two_stage":
+            return self.vectorstore.two_stage_search(query, **(self.search_kwargs | kwargs))
+        return super()._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, documents: Optional[List[Document]] = None, **kwargs: Any) -> List[Document]:
+        if documents is not None:
+            return documents
+        if self.include_scores or self.search_type == "hybrid" or kwargs.get("tag_filter"):
+            return (await self._asearch([query], **kwargs))[0]
+        if self.search_type == "two_stage":
+            return await self.vectorstore.atwo_stage_search(query, **(self.search_kwargs | kwargs))
+        return await super()._aget_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+    def _config_kwargs(self, config: Optional[RunnableConfig], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """kwargs plus the tag filter of the run's config, so one compiled chain serves every filter"""
+        tag_filter = ensure_config(config).get("configurable", {}).get(TAG_FILTER_CONFIG_KEY)
+        return {"tag_filter": tag_filter, **kwargs} if tag_filter else kwargs
+
+    def invoke(self, input: str, config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Document]:
+        return super().invoke(input, config, **self._config_kwargs(config, kwargs))
+
+    async def ainvoke(self, input: str, config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Document]:
+        return await super().ainvoke(input, config, **self._config_kwargs(config, kwargs))
+
+    def _documents(self, scored: List[List[Tuple[Document, float]]]) -> List[List[Document]]:
+        if self.include_scores:
+            return [[doc.model_copy(update={"metadata": {**doc.metadata, SCORE_METADATA_KEY: float(score)}}) for doc, score in docs] for docs in scored]
+        return [[doc for doc, _ in docs] for docs in scored]
+
+    def _search(self, queries: List[str], query_embeddings: Optional[List[List[float]]] = None, **kwargs: Any) -> List[List[Document]]:
+        if query_embeddings is not None:
+            return self._documents(self.vectorstore.batch_search_with_score_by_vectors(query_embeddings, self.search_type, queries=queries, **(self.search_kwargs | kwargs)))
+        return self._documents(self.vectorstore.batch_search(queries, self.search_type, **(self.search_kwargs | kwargs)))
+
+    async def _asearch(self, queries: List[str], **kwargs: Any) -> List[List[Document]]:
+        return self._documents(await self.vectorstore.abatch_search(queries, self.search_type, **(self.search_kwargs | kwargs)))
+
+    def batch(
+        self,
+        inputs: List[str],
+        config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        query_embeddings: Optional[List[List[float]]] = None,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """
+        Every query in one embedding call and one FAISS search (see NefacFAISS.batch_search).
+        With query_embeddings, the vectors of the inputs, nothing is embedded.
+        """
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+        try:
+            results = self._search(list(inputs), query_embeddings=query_embeddings, **self._config_kwargs(configs[0], kwargs))
+        except Exception as e:
+            if return_exceptions:
+                return [e] * len(inputs)
+            raise
+        return [self.invoke(query, query_config, documents=docs) for query, query_config, docs in zip(inputs, configs, results)]
+
+    async def abatch(self, inputs: List[str], config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None, *, return_exceptions: bool = False, **kwargs: Any) -> List[Any]:
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+        try:
+            results = await self._asearch(list(inputs), **self._config_kwargs(configs[0], kwargs))
+        except Exception as e:
+            if return_exceptions:
+                return [e] * len(inputs)
+            raise
+        return [await self.ainvoke(query, query_config, documents=docs) for query, query_config, docs in zip(inputs, configs, results)]
+
+
+class ThreadSafeRetriever(Runnable[str, List[Document]]):
+    """
+    Retriever over whichever store a ThreadSafeVectorStore serves at call time.
+    The queries are embedded before taking its read lock, which is only held
+    for the FAISS search and docstore lookups, so a waiting writer never waits
+    on an embedding request. batch() searches every query at once.
+    """
+
+    def __init__(self, wrapped_store: "ThreadSafeVectorStore", **kwargs: Any):
+        self.wrapped_store = wrapped_store
+        self.kwargs = kwargs
+
+    def invoke(self, input: str, config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Document]:
+        return self.batch([input], config, **kwargs)[0]
+
+    async def ainvoke(self, input: str, config: Optional[RunnableConfig] = None, **kwargs: Any) -> List[Document]:
+        return (await self.abatch([input], config, **kwargs))[0]
+
+    def batch(self, inputs: List[str], config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None, *, return_exceptions: bool = False, **kwargs: Any) -> List[Any]:
+        if not inputs:
+            return []
+        try:
+            query_embeddings = self.wrapped_store.vector_store.embed_queries(inputs)
+        except Exception as e:
+            if return_exceptions:
+                return [e] * len(inputs)
+            raise
+        return self._search(inputs, query_embeddings, config, return_exceptions=return_exceptions, **kwargs)
+
+    async def abatch(self, inputs: List[str], config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None, *, return_exceptions: bool = False, **kwargs: Any) -> List[Any]:
+        if not inputs:
+            return []
+        try:
+            query_embeddings = await self.wrapped_store.vector_store.aembed_queries(inputs)
+        except Exception as e:
+            if return_exceptions:
+                return [e] * len(inputs)
+            raise
+        # In a worker thread, as the read lock is a threading lock
+        return await run_in_executor(None, self._search, inputs, query_embeddings, config, return_exceptions=return_exceptions, **kwargs)
+
+    def _search(self, inputs: List[str], query_embeddings: List[List[float]], config: Optional[Union[RunnableConfig, List[RunnableConfig]]], **kwargs: Any) -> List[Any]:
+        with self.wrapped_store.lock.read():
+            return self.wrapped_store.vector_store.as_retriever(**self.kwargs).batch(inputs, config, query_embeddings=query_embeddings, **kwargs)
+
+
+class NefacFAISS(FAISS):
+    """
+    LangChain FAISS store with a float16 side file of the full vectors.
+
+    When the primary index is quantized (SQ8/PQ), a search fetches
+    k * rerank_factor candidates from it and re-ranks them exactly against the
+    memory-mapped float16 vectors, so the index itself can stay small.
+
+    The "two_stage" search type instead searches a small flat index of
+    COARSE_DIMENSIONS-long prefixes of the vectors for a larger candidate pool
+    and re-scores that shortlist with the full vectors. The "hybrid" search type
+    fuses it with BM25 search over a lexical index of the chunk text, kept in
+    step with the rows like the coarse index, so exact terms such as statute
+    numbers are found even when their embeddings are not close.
+
+    Every search type accepts a tag_filter on the taxonomy tags of the chunks
+    (see vector/tags.py): the matching rows come from a bitmap per tag, also
+    kept in step with the rows, and restrict the FAISS search itself through
+    an ID selector, so filtered searches still return k results.
+
+    Deleting chunks tombstones their rows instead of removing them from the
+    index, so rows stay aligned with the side file, the coarse index and the
+    write-ahead log; a bitmap of the live rows excludes the tombstoned ones
+    inside FAISS, like a tag filter, and compacted() rewrites the store
+    without them. document_chunk_ids maps each document key to the
+    ids of its current chunks, for upserts.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        vector_file: Optional[Float16VectorFile] = None,
+        rerank_factor: int = RERANK_FACTOR,
+        coarse_index: Any = None,
+        lexical_index: Optional[LexicalIndex] = None,
+        tag_index: Optional[TagIndex] = None,
+        tombstones: Iterable[int] = (),
+        document_chunk_ids: Optional[Dict[str, List[str]]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.vector_file = vector_file
+        self.rerank_factor = rerank_factor
+        self._coarse_index = coarse_index
+        self._lexical_index = lexical_index
+        self._tag_index = tag_index
+        self.tombstones: Set[int] = set(tombstones)
+        self._live_bitmap: Optional[np.ndarray] = None
+        self._update_live_bitmap()
+        self.document_chunk_ids: Dict[str, List[str]] = dict(document_chunk_ids or {})
+        # Checkpoint the store was loaded from or last saved as (see vector/persistence.py)
+        self.checkpoint_name: Optional[str] = None
+
+    def as_retriever(self, **kwargs: Any) -> NefacRetriever:
+        tags = kwargs.pop("tags", None) or [*self._get_retriever_tags()]
+        return NefacRetriever(vectorstore=self, tags=tags, **kwargs)
+
+    # ============================================================================
+    # ADDING
+    # ============================================================================
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embed_documents(texts)
+        return self.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids, **kwargs)
+
+    async def aadd_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = await self._aembed_documents(texts)
+        return self.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids, **kwargs)
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        coarse_in_sync = self._coarse_index is not None and self._coarse_index.ntotal == self.index.ntotal
+        lexical_in_sync = self._lexical_index is not None and self._lexical_index.num_rows == self.index.ntotal
+        tags_in_sync = self._tag_index is not None and self._tag_index.num_rows == self.index.ntotal
+        ids = super().add_embeddings(text_embeddings, metadatas=metadatas, ids=ids, **kwargs)
+
+        vectors = np.array([embedding for _, embedding in text_embeddings], dtype=np.float32)
+        if self.vector_file is not None:
+            self.vector_file.append(vectors)
+        if self.tombstones:
+            self._update_live_bitmap()
+        if coarse_in_sync:
+            self._coarse_index.add(truncate_vectors(vectors, self._coarse_index.d))
+        if lexical_in_sync:
+            self._lexical_index.add(text for text, _ in text_embeddings)
+        if tags_in_sync:
+            self._tag_index.add(row_tags(metadata) for metadata in metadatas or [{}] * len(text_embeddings))
+        return ids
+
+    # ============================================================================
+    # UPDATING
+    # ============================================================================
+    def row_ids(self) -> Dict[str, int]:
+        """Row of every live chunk id"""
+        return {_id: row for row, _id in self.index_to_docstore_id.items() if row not in self.tombstones}
+
+    def tombstone(self, rows: Iterable[int]) -> None:
+        """Hide rows from searches and drop their chunks from the docstore; already tombstoned rows are ignored"""
+        rows = [int(row) for row in rows if int(row) < self.index.ntotal and int(row) not in self.tombstones]
+        self.tombstones.update(rows)
+        self._update_live_bitmap()
+        ids = [self.index_to_docstore_id[row] for row in rows if self.index_to_docstore_id[row] in self.docstore]
+        if ids:
+            self.docstore.delete(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        row_ids = self.row_ids()
+        missing_ids = set(ids).difference(row_ids)
+        if missing_ids:
+            raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing_ids}")
+        self.tombstone(row_ids[_id] for _id in ids)
+        return True
+
+    def update(
+        self,
+        text_embeddings: Iterable[Tuple[str, List[float]]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        tombstones: Iterable[int] = (),
+        document_chunk_ids: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        """Apply one upsert: tombstone stale rows, add new chunks and record each document's chunk ids"""
+        self.tombstone(tombstones)
+        text_embeddings = list(text_embeddings)
+        if text_embeddings:
+            self.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        for document_key, chunk_ids in (document_chunk_ids or {}).items():
+            if chunk_ids:
+                self.document_chunk_ids[document_key] = list(chunk_ids)
+            else:
+                self.document_chunk_ids.pop(document_key, None)
+
+    def retag(self, tags_for: Callable[[Dict[str, Any]], Mapping[str, Any]]) -> int:
+        """
+        Re-derive the tags of every live chunk from tags_for(metadata of its
+        document's first chunk), e.g. after the taxonomy changed. Only the tag
+        index changes; the docstore keeps the tags attached when the chunks
+        were added. Returns the number of rows whose tags changed.
+        """
+        tag_index = self.tag_index()
+        row_ids = self.row_ids()
+        changed = {}
+        for chunk_ids in self.document_chunk_ids.values():
+            rows = [row_ids[_id] for _id in chunk_ids if _id in row_ids]
+            if not rows:
+                continue
+            tags = sorted(set(row_tags(tags_for(self._document(rows[0]).metadata))))
+            changed.update({row: tags for row in rows if tag_index.get_tags(row) != tags})
+        tag_index.set_tags(changed)
+        return len(changed)
+
+    def _update_live_bitmap(self) -> None:
+        """Recompute the packed bitmap of the rows not tombstoned (None when none are), so searches only read it"""
+        if not self.tombstones:
+            self._live_bitmap = None
+            return
+        live = np.ones(self.index.ntotal, dtype=bool)
+        live[np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))] = False
+        self._live_bitmap = np.packbits(live, bitorder="little")
+
+    def tombstone_fraction(self) -> float:
+        return len(self.tombstones) / self.index.ntotal if self.index.ntotal else 0.0
+
+    def compacted(self, data_path: str) -> "NefacFAISS":
+        """
+        Copy of the store without its tombstoned rows, with new data files in data_path.
+
+        The index keeps its type and training (it is cloned, emptied and refilled),
+        so nothing is re-embedded or re-trained. Rows are renumbered.
+        """
+        live_rows = np.array([row for row in range(self.index.ntotal) if row not in self.tombstones], dtype=np.int64)
+        vectors = self.vectors()[live_rows] if len(live_rows) else np.zeros((0, self.index.d), dtype=np.float32)
+        ids = [self.index_to_docstore_id[int(row)] for row in live_rows]
+        logger.info(f"Compacting {self.index.ntotal} rows to {len(live_rows)} in {data_path}")
+
+        index = faiss.clone_index(self.index)
+        index.reset()
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+        os.makedirs(data_path, exist_ok=True)
+        store = NefacFAISS(
+            self.embedding_function,
+            index,
+            MmapDocstore.create(data_path, {_id: self.docstore.search(_id) for _id in ids}),
+            dict(enumerate(ids)),
+            distance_strategy=self.distance_strategy,
+            normalize_L2=self._normalize_L2,
+            vector_file=Float16VectorFile.create(os.path.join(data_path, VECTOR_FILE_NAME), vectors) if self.vector_file is not None else None,
+            rerank_factor=self.rerank_factor,
+            coarse_index=build_coarse_index(vectors),
+            tag_index=self.tag_index().take(live_rows),
+            document_chunk_ids=self.document_chunk_ids,
+        )
+        store.checkpoint_name = self.checkpoint_name
+        return store
+
+    # ============================================================================
+    # SEARCH
+    # ============================================================================
+    def reranks(self) -> bool:
+        """Whether searches re-rank quantized candidates against the side file"""
+        return self.vector_file is not None and get_index_type(self.index) in QUANTIZED_INDEX_TYPES and len(self.vector_file) >= self.index.ntotal
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self._similarity_search_by_vectors(np.array([embedding], dtype=np.float32), k=k, filter=filter, fetch_k=fetch_k, **kwargs)[0]
+
+    def max_marginal_relevance_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        *,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+    ) -> List[Tuple[Document, float]]:
+        return self._mmr_search_by_vectors(np.array([embedding], dtype=np.float32), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter)[0]
+
+    def _similarity_search_by_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        tag_filter: Optional[Mapping[str, Iterable[str]]] = None,
+        **kwargs: Any,
+    ) -> List[List[Tuple[Document, float]]]:
+        if self._normalize_L2:
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+        num_candidates = k if filter is None else fetch_k
+        if self.reranks():
+            num_candidates = max(num_candidates, k * self.rerank_factor)
+        all_scores, all_indices = self._search_index(self.index, vectors, num_candidates, self._rows_matching(tag_filter))
+
+        results = []
+        for vector, indices, scores in zip(vectors, all_indices, all_scores):
+            rows, scores = self._live_rows(indices, scores)
+            if self.reranks():
+                scores = self.vector_file.rows(rows) @ vector
+                order = np.argsort(-scores, kind="stable")
+                rows, scores = rows[order], scores[order]
+            results.append(self._documents_for_rows(rows, scores, k, filter, **kwargs))
+        return results
+
+    def _mmr_search_by_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        tag_filter: Optional[Mapping[str, Iterable[str]]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        all_scores, all_indices = self._search_index(self.index, vectors, fetch_k if filter is None else fetch_k * 2, self._rows_matching(tag_filter))
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+
+        results = []
+        for vector, indices, scores in zip(vectors, all_indices, all_scores):
+            rows, scores = self._live_rows(indices, scores)
+            candidates = []
+            for row, score in zip(rows, scores):
+                doc = self._document(row)
+                if filter_func is None or filter_func(doc.metadata):
+                    candidates.append((row, doc, score))
+            candidates = candidates[:fetch_k]
+            if not candidates:
+                results.append([])
+                continue
+
+            selected = maximal_marginal_relevance(vector[None, :], self.full_vectors(np.array([row for row, _, _ in candidates])), k=k, lambda_mult=lambda_mult)
+            results.append([(candidates[i][1], candidates[i][2]) for i in selected])
+        return results
+
+    def _live_rows(self, rows: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Drop the -1 padding from a FAISS result, and any tombstoned rows the search did not already exclude"""
+        keep = rows != -1
+        if self.tombstones:
+            keep &= ~np.isin(rows, np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones)))
+        return rows[keep], scores[keep]
+
+    def _rows_matching(self, tag_filter: Optional[Mapping[str, Iterable[str]]]) -> Optional[np.ndarray]:
+        """Packed bitmap of the rows matching tag_filter (see TagIndex.bitmap), or None when there is nothing to filter"""
+        if not tag_filter:
+            return None
+        return self.tag_index().bitmap(tag_filter)
+
+    def _search_index(self, index: Any, vectors: np.ndarray, k: int, bitmap: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """index.search over the live rows, restricted inside FAISS to the rows set in bitmap when one is given"""
+        selected = bitmap if self._live_bitmap is None else self._live_bitmap if bitmap is None else bitmap & self._live_bitmap
+        if selected is None:
+            return index.search(vectors, k)
+        selector = faiss.IDSelectorBitmap(selected)
+        params = search_parameters(index, selector)
+        if params is not None:
+            return index.search(vectors, k, params=params)
+        if bitmap is None:
+            # Scoring every live row exactly would read all the full vectors; skip the tombstones afterwards instead
+            return index.search(vectors, k + len(self.tombstones))
+        # The index cannot filter while searching; score the matching rows exactly instead
+        rows = np.flatnonzero(np.unpackbits(selected, count=index.ntotal, bitorder="little"))
+        scores = vectors @ self.full_vectors(rows).T
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, top, axis=1), rows[top]
+
+    def _document(self, row: int) -> Document:
+        _id = self.index_to_docstore_id[int(row)]
+        doc = self.docstore.search(_id)
+        if not isinstance(doc, Document):
+            raise ValueError(f"Could not find document for id {_id}, got {doc}")
+        return doc
+
+    def coarse_index(self) -> Any:
+        """Flat index over the shortened vectors, (re)built when out of sync with the main index"""
+        coarse = self._coarse_index
+        if coarse is None or coarse.ntotal != self.index.ntotal:
+            logger.info(f"Building coarse index over {self.index.ntotal} vectors")
+            coarse = build_coarse_index(self.vectors())
+            self._coarse_index = coarse
+        return coarse
+
+    def lexical_index(self) -> LexicalIndex:
+        """BM25 index of the chunk text, (re)built when out of sync with the main index"""
+        lexical = self._lexical_index
+        if lexical is None or lexical.num_rows != self.index.ntotal:
+            logger.info(f"Building lexical index over {self.index.ntotal} chunks")
+            # Tombstoned rows have no text left; they are skipped by searches anyway
+            lexical = LexicalIndex.build(self._document(row).page_content if row not in self.tombstones else "" for row in range(self.index.ntotal))
+            self._lexical_index = lexical
+        return lexical
+
+    def tag_index(self) -> TagIndex:
+        """Bitmaps of the chunks' taxonomy tags, (re)built from their metadata when out of sync with the main index"""
+        tags = self._tag_index
+        if tags is None or tags.num_rows != self.index.ntotal:
+            logger.info(f"Building tag index over {self.index.ntotal} chunks")
+            tags = TagIndex.build(row_tags(self._document(row).metadata) if row not in self.tombstones else [] for row in range(self.index.ntotal))
+            self._tag_index = tags
+        return tags
+
+    def full_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Full vectors of the given rows, as float32"""
+        if self.vector_file is not None and len(self.vector_file) >= self.index.ntotal:
+            return self.vector_file.rows(rows)
+        return self.index.reconstruct_batch(np.asarray(rows, dtype=np.int64))
+
+    def two_stage_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        candidates: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Coarse search over shortened vectors, then exact re-scoring of the shortlist with the full vectors"""
+        return self._two_stage_search_by_vectors(np.array([embedding], dtype=np.float32), k=k, filter=filter, fetch_k=fetch_k, candidates=candidates, **kwargs)[0]
+
+    def _two_stage_search_by_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        candidates: Optional[int] = None,
+        tag_filter: Optional[Mapping[str, Iterable[str]]] = None,
+        **kwargs: Any,
+    ) -> List[List[Tuple[Document, float]]]:
+        coarse = self.coarse_index()
+        num_candidates = max(candidates or k * TWO_STAGE_CANDIDATE_FACTOR, fetch_k if filter is not None else k)
+        all_coarse_scores, all_indices = self._search_index(coarse, truncate_vectors(vectors, coarse.d), num_candidates, self._rows_matching(tag_filter))
+
+        results = []
+        for vector, indices, coarse_scores in zip(vectors, all_indices, all_coarse_scores):
+            rows, _ = self._live_rows(indices, coarse_scores)
+            scores = self.full_vectors(rows) @ vector
+            order = np.argsort(-scores, kind="stable")
+            results.append(self._documents_for_rows(rows[order], scores[order], k, filter, **kwargs))
+        return results
+
+    def two_stage_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.two_stage_search_with_score_by_vector(self._embed_query(query), k=k, **kwargs)]
+
+    async def atwo_stage_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.two_stage_search_with_score_by_vector(await self._aembed_query(query), k=k, **kwargs)]
+
+    def hybrid_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._hybrid_search_by_vectors([query], np.array([self._embed_query(query)], dtype=np.float32), k=k, **kwargs)[0]
+
+    def _hybrid_search_by_vectors(
+        self,
+        queries: List[str],
+        vectors: np.ndarray,
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        dense_weight: float = HYBRID_DENSE_WEIGHT,
+        tag_filter: Optional[Mapping[str, Iterable[str]]] = None,
+        **kwargs: Any,
+    ) -> List[List[Tuple[Document, float]]]:
+        """Union of the dense and BM25 candidates, ranked by a weighted sum of their min-max normalized scores"""
+        # Fused scores are on their own 0-1 scale, so a similarity score_threshold does not apply to them
+        kwargs.pop("score_threshold", None)
+        num_candidates = max(k * HYBRID_CANDIDATE_FACTOR, fetch_k if filter is not None else k)
+        if self._normalize_L2:
+            vectors = vectors.copy()
+            faiss.normalize_L2(vectors)
+        bitmap = self._rows_matching(tag_filter)
+        all_scores, all_indices = self._search_index(self.index, vectors, num_candidates, bitmap)
+        lexical = self.lexical_index()
+        allowed = np.unpackbits(bitmap, count=lexical.num_rows, bitorder="little") if bitmap is not None else None
+
+        results = []
+        for query, vector, indices, scores in zip(queries, vectors, all_indices, all_scores):
+            dense_rows, _ = self._live_rows(indices, scores)
+            lexical_scores = lexical.scores(query)
+            if allowed is not None:
+                lexical_scores = lexical_scores * allowed
+            lexical_rows = top_rows(lexical_scores, num_candidates, exclude=self.tombstones)
+            rows = np.array(list(dict.fromkeys(np.concatenate([dense_rows, lexical_rows]).tolist())), dtype=np.int64)
+            if len(rows) == 0:
+                results.append([])
+                continue
+            # Exact dense scores for every candidate, including lexical-only ones
+            scores = dense_weight * _min_max(self.full_vectors(rows) @ vector) + (1 - dense_weight) * _min_max(lexical_scores[rows])
+            order = np.argsort(-scores, kind="stable")
+            results.append(self._documents_for_rows(rows[order], scores[order], k, filter, **kwargs))
+        return results
+
+    # ============================================================================
+    # BATCHED SEARCH
+    # ============================================================================
+    def batch_search_with_score_by_vectors(self, embeddings: List[List[float]], search_type: str = "similarity", queries: Optional[List[str]] = None, **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """
+        Search for several query vectors with one FAISS search over the query matrix.
+
+        Each query's results are the same as the single-query search of
+        search_type ("similarity", "similarity_score_threshold", "mmr",
+        "two_stage" or "hybrid", which also needs the query texts) with the
+        same kwargs would return.
+        """
+        vectors = np.array(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if len(vectors) == 0:
+            return []
+        if search_type == "similarity":
+            return self._similarity_search_by_vectors(vectors, **kwargs)
+        if search_type == "similarity_score_threshold":
+            # Like similarity_search_with_relevance_scores: the threshold applies to relevance scores, not raw ones
+            score_threshold = kwargs.pop("score_threshold", None)
+            relevance_score_fn = self._select_relevance_score_fn()
+            results = [[(doc, relevance_score_fn(score)) for doc, score in scored] for scored in self._similarity_search_by_vectors(vectors, **kwargs)]
+            if score_threshold is not None:
+                results = [[(doc, score) for doc, score in scored if score >= score_threshold] for scored in results]
+            return results
+        if search_type == "mmr":
+            return self._mmr_search_by_vectors(vectors, k=kwargs.get("k", 4), fetch_k=kwargs.get("fetch_k", 20), lambda_mult=kwargs.get("lambda_mult", 0.5), filter=kwargs.get("filter"), tag_filter=kwargs.get("tag_filter"))
+        if search_type == "two_stage":
+            return self._two_stage_search_by_vectors(vectors, **kwargs)
+        if search_type == "hybrid":
+            if queries is None or len(queries) != len(vectors):
+                raise ValueError("hybrid search needs the text of every query")
+            return self._hybrid_search_by_vectors(list(queries), vectors, **kwargs)
+        raise ValueError(f"search_type of {search_type} not allowed.")
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed every query in one embed_documents call. The embedding model must
+        embed queries and documents alike, as OpenAI embeddings and
+        CachedEmbeddings do.
+        """
+        return self._embed_documents(list(queries))
+
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        return await self._aembed_documents(list(queries))
+
+    def batch_search(self, queries: List[str], search_type: str = "similarity", **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """Embed every query (see embed_queries), then search them together (see batch_search_with_score_by_vectors)"""
+        if not queries:
+            return []
+        return self.batch_search_with_score_by_vectors(self.embed_queries(queries), search_type, queries=list(queries), **kwargs)
+
+    async def abatch_search(self, queries: List[str], search_type: str = "similarity", **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        if not queries:
+            return []
+        return self.batch_search_with_score_by_vectors(await self.aembed_queries(queries), search_type, queries=list(queries), **kwargs)
+
+    def _documents_for_rows(self, rows: np.ndarray, scores: np.ndarray, k: int, filter: Optional[Union[Callable, Dict[str, Any]]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Turn ranked index rows into (Document, score) pairs, like FAISS.similarity_search_with_score_by_vector"""
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for row, score in zip(rows, scores):
+            doc = self._document(row)
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, float(score)))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = operator.ge if self.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD) else operator.le
+            docs = [(doc, similarity) for doc, similarity in docs if cmp(similarity, score_threshold)]
+        return docs[:k]
+
+    # ============================================================================
+    # PERSISTENCE
+    # ============================================================================
+    def vectors(self) -> np.ndarray:
+        """Full-precision vectors of every row, from the side file when the index is lossy"""
+        if self.vector_file is not None and len(self.vector_file) >= self.index.ntotal:
+            return self.vector_file.rows(np.arange(self.index.ntotal))
+        return reconstruct_vectors(self.index)
+
+    def save_local(self, folder_path: str, index_name: str = "index", data_path: Optional[str] = None) -> None:
+        """
+        Save the index and the docstore ids to folder_path.
+
+        The append-only data files (float16 side file and docstore columns) live
+        in data_path, which defaults to folder_path; checkpoints share one copy
+        at the store root. Nothing is pickled.
+        """
+        data_path = data_path or folder_path
+        os.makedirs(folder_path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(folder_path, f"{index_name}.faiss"))
+
+        if not isinstance(self.docstore, MmapDocstore):
+            self.docstore = MmapDocstore.create(data_path, {_id: self.docstore.search(_id) for _id in self.index_to_docstore_id.values()})
+        elif os.path.abspath(self.docstore.directory) != os.path.abspath(data_path):
+            self.docstore = self.docstore.copy_to(data_path)
+        with open(os.path.join(folder_path, f"{index_name}{IDS_FILE_SUFFIX}"), "w") as f:
+            json.dump(
+                {
+                    "index_to_docstore_id": [self.index_to_docstore_id[row] for row in range(len(self.index_to_docstore_id))],
+                    "docstore": self.docstore.record_ids(),
+                    "tombstones": sorted(self.tombstones),
+                    "documents": self.document_chunk_ids,
+                },
+                f,
+            )
+
+        if self.vector_file is not None:
+            target = os.path.join(data_path, VECTOR_FILE_NAME)
+            if os.path.abspath(self.vector_file.path) != os.path.abspath(target):
+                shutil.copyfile(self.vector_file.path, target)
+                self.vector_file = Float16VectorFile(target, self.vector_file.dimensions)
+            self.vector_file.truncate(self.index.ntotal)
+
+        faiss.write_index(self.coarse_index(), os.path.join(folder_path, COARSE_INDEX_FILE_NAME))
+        self.lexical_index().save(folder_path)
+        self.tag_index().save(folder_path)
+
+        with open(os.path.join(folder_path, INDEX_META_FILE_NAME), "w") as f:
+            json.dump({"index_type": get_index_type(self.index), "rerank_factor": self.rerank_factor}, f)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Any, index_name: str = "index", data_path: Optional[str] = None, read_only: bool = False, **kwargs: Any) -> "NefacFAISS":
+        """
+        Load a store saved by save_local.
+
+        read_only leaves the files exactly as they are, for processes that only
+        search while another one writes: records and rows appended after this
+        checkpoint are ignored rather than truncated, and nothing is converted.
+        The indexes are then memory-mapped rather than read into the process,
+        so, like the docstore and the side file, every worker shares one copy.
+        Everything is mapped while loading, so the store stays searchable after
+        the writer removes its files as older checkpoints are superseded.
+        """
+        data_path = data_path or folder_path
+        meta_path = os.path.join(folder_path, INDEX_META_FILE_NAME)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            kwargs.setdefault("rerank_factor", meta.get("rerank_factor", RERANK_FACTOR))
+
+        ids_path = os.path.join(folder_path, f"{index_name}{IDS_FILE_SUFFIX}")
+        if os.path.exists(ids_path):
+            kwargs.pop("allow_dangerous_deserialization", None)
+            with open(ids_path) as f:
+                ids = json.load(f)
+            index = read_index(os.path.join(folder_path, f"{index_name}.faiss"), mmap=read_only, index_type=meta.get("index_type"))
+            docstore = MmapDocstore(data_path, ids["docstore"]).map_columns() if read_only else MmapDocstore.open(data_path, ids["docstore"])
+            store = cls(embeddings, index, docstore, dict(enumerate(ids["index_to_docstore_id"])), tombstones=ids.get("tombstones", ()), document_chunk_ids=ids.get("documents"), **kwargs)
+        else:
+            # Saved with a pickled InMemoryDocstore; convert it once
+            store = super().load_local(folder_path, embeddings, index_name, **kwargs)
+            if not read_only:
+                logger.info(f"Converting the pickled docstore in {folder_path} to {data_path}")
+                store.docstore = MmapDocstore.create(data_path, {_id: store.docstore.search(_id) for _id in store.index_to_docstore_id.values()})
+            ids = {}
+
+        if "documents" not in ids:
+            # Saved before upserts existed; documents are identified by their title
+            for _id in store.row_ids():
+                store.document_chunk_ids.setdefault(store.docstore.search(_id).metadata.get("title", ""), []).append(_id)
+
+        store.vector_file = open_vector_file(os.path.join(data_path, VECTOR_FILE_NAME), store.index, read_only)
+
+        coarse_path = os.path.join(folder_path, COARSE_INDEX_FILE_NAME)
+        if os.path.exists(coarse_path):
+            store._coarse_index = read_index(coarse_path, mmap=read_only)
+        elif read_only and ids:
+            # Searches hold only a shared lock, so a read-only store must not build it lazily
+            raise ValueError(f"{coarse_path} is missing; every checkpoint written by save_local has one")
+        elif read_only:
+            # Saved before the coarse index existed; build it now, before any search can run
+            store.coarse_index()
+        store._lexical_index = LexicalIndex.load(folder_path, mmap=read_only)
+        store._tag_index = TagIndex.load(folder_path, mmap=read_only)
+        return store
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    low, high = float(scores.min()), float(scores.max())
+    if high == low:
+        return np.ones_like(scores, dtype=np.float32)
+    return (scores - low) / (high - low)
+
+
+def open_vector_file(path: str, index: Any, read_only: bool = False) -> Optional[Float16VectorFile]:
+    """Open the side file of a store, creating it from the index when it is missing or incomplete"""
+    vector_file = Float16VectorFile(path, index.d)
+    if read_only:
+        if len(vector_file) < index.ntotal:
+            logger.warning(f"{vector_file.path} has {len(vector_file)} rows but the index has {index.ntotal}; not using it")
+            return None
+        return vector_file.pin(index.ntotal)
+    if len(vector_file) > index.ntotal:
+        vector_file.truncate(index.ntotal)
+    elif len(vector_file) < index.ntotal:
+        if get_index_type(index) in QUANTIZED_INDEX_TYPES:
+            logger.warning(f"{vector_file.path} has {len(vector_file)} rows but the index has {index.ntotal}; searches will not be re-ranked")
+            return None
+        logger.info(f"Writing {vector_file.path} from the {get_index_type(index)} index")
+        vector_file = Float16VectorFile.create(vector_file.path, reconstruct_vectors(index))
+    return vector_file
+
+
+class ThreadSafeVectorStore:
+    """
+    Wrapper for FAISS vector store to make it thread-safe.
+
+    Searches share a read lock and run concurrently (FAISS releases the GIL
+    while searching). Ingestion embeds and persists outside the write lock and
+    only takes it for the in-memory add, so queries never wait on embedding
+    calls or disk writes.
+
+    Additions are persisted to the write-ahead log when one is given, with a
+    full checkpoint once the log reaches CHECKPOINT_WAL_BYTES or
+    CHECKPOINT_INTERVAL_SECONDS have passed; without a log every addition
+    writes a checkpoint. A checkpoint taken once COMPACTION_TOMBSTONE_FRACTION
+    of the rows are tombstoned compacts the store first.
+    """
+
+    def __init__(self, vector_store, path, wal=None):
+        self.vector_store = vector_store
+        self.path = path
+        self.wal = wal
+        self.lock = ReadWriteLock()
+        # Serializes writers so embedding, adding and persisting one batch is not interleaved with another
+        self.write_lock = threading.Lock()
+        # Bumped whenever the index contents change so caches can invalidate
+        self.generation = 0
+        self.last_checkpoint = time.monotonic()
+
+    def swap(self, vector_store):
+        """Serve vector_store from now on; searches already running finish on the previous one"""
+        with self.lock.write():
+            self.vector_store = vector_store
+            self.generation += 1
+
+    def similarity_search(self, query, k=4, **kwargs):
+        # Embedded before taking the read lock, so writers never wait on the embedding request
+        embedding = self.vector_store.embeddings.embed_query(query)
+        with self.lock.read():
+            return self.vector_store.similarity_search_by_vector(embedding, k=k, **kwargs)
+
+    def as_retriever(self, **kwargs):
+        return ThreadSafeRetriever(self, **kwargs)
+
+    def add_documents(self, documents):
+        if not documents:
+            return
+
+        with self.write_lock:
+            logger.info(f"Adding {len(documents)} documents to vector store")
+            texts = [doc.page_content for doc in documents]
+            metadatas = [doc.metadata for doc in documents]
+            ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+            embeddings = self.vector_store.embeddings.embed_documents(texts)
+
+            if self.wal is not None:
+                self.wal.append(self.vector_store.index.ntotal, ids, texts, metadatas, embeddings, checkpoint=self.vector_store.checkpoint_name)
+
+            with self.lock.write():
+                self.vector_store.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+                self.generation += 1
+
+            if self.wal is None or self.checkpoint_due():
+                self._checkpoint()
+            logger.info(f"Documents added to {self.path}")
+
+    def upsert_documents(self, document_key, documents):
+        """
+        Make documents the chunks of document_key.
+
+        Chunk ids are content hashes (see chunk_id), so chunks whose text is
+        unchanged keep their vectors; only new chunks are embedded, and chunks
+        the document no longer has are tombstoned. Returns (added, removed).
+        """
+        # Repeated chunks within the document are stored once
+        chunks = {}
+        for doc in documents:
+            chunks.setdefault(chunk_id(document_key, doc.page_content), doc)
+
+        with self.write_lock:
+            previous_ids = self.vector_store.document_chunk_ids.get(document_key, [])
+            if list(chunks) == previous_ids:
+                return 0, 0
+
+            new_chunks = {_id: doc for _id, doc in chunks.items() if _id not in self.vector_store.docstore}
+            row_ids = self.vector_store.row_ids()
+            stale_rows = [row_ids[_id] for _id in previous_ids if _id not in chunks and _id in row_ids]
+            logger.info(f"Upserting {document_key}: {len(new_chunks)} new chunks, {len(chunks) - len(new_chunks)} unchanged, {len(stale_rows)} removed")
+
+            ids = list(new_chunks)
+            texts = [doc.page_content for doc in new_chunks.values()]
+            metadatas = [doc.metadata for doc in new_chunks.values()]
+            embeddings = self.vector_store.embeddings.embed_documents(texts) if texts else []
+            document_chunk_ids = {document_key: list(chunks)}
+
+            if self.wal is not None:
+                self.wal.append(
+                    self.vector_store.index.ntotal,
+                    ids,
+                    texts,
+                    metadatas,
+                    embeddings,
+                    tombstones=stale_rows,
+                    documents=document_chunk_ids,
+                    checkpoint=self.vector_store.checkpoint_name,
+                )
+
+            with self.lock.write():
+                self.vector_store.update(zip(texts, embeddings), metadatas=metadatas, ids=ids, tombstones=stale_rows, document_chunk_ids=document_chunk_ids)
+                self.generation += 1
+
+            if self.wal is None or self.checkpoint_due():
+                self._checkpoint()
+            return len(new_chunks), len(stale_rows)
+
+    def retag(self, tags_for):
+        """Re-derive the tags of every chunk (see NefacFAISS.retag); they are persisted by the next checkpoint"""
+        with self.write_lock, self.lock.write():
+            changed = self.vector_store.retag(tags_for)
+            if changed:
+                self.generation += 1
+        return changed
+
+    def delete_document(self, document_key):
+        """Remove every chunk of document_key; returns the number removed"""
+        return self.upsert_documents(document_key, [])[1]
+
+    def checkpoint_due(self):
+        if self.wal.size() >= CHECKPOINT_WAL_BYTES:
+            return True
+        return self.wal.size() > 0 and time.monotonic() - self.last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS
+
+    def checkpoint(self, compact=False):
+        """Write a full checkpoint now, e.g. once ingestion finishes, compacting first if asked or due"""
+        with self.write_lock:
+            self._checkpoint(compact)
+
+    def _checkpoint(self, compact=False):
+        # Imported here because vector.persistence builds on this module
+        from vector.persistence import next_data_path, write_checkpoint
+
+        # Every change to the store is made under write_lock, which the caller holds, so it is read
+        # here without the read lock: a waiting swap() must not wait on (and hold up searches behind) disk writes
+        if self.vector_store.tombstones and (compact or self.vector_store.tombstone_fraction() >= COMPACTION_TOMBSTONE_FRACTION):
+            # Searches keep using the current store until the compacted one is checkpointed
+            data_path = next_data_path(self.path)
+            compacted = self.vector_store.compacted(data_path)
+            write_checkpoint(compacted, self.path, self.wal, data_path=data_path)
+            with self.lock.write():
+                self.vector_store = compacted
+                self.generation += 1
+        else:
+            write_checkpoint(self.vector_store, self.path, self.wal)
+        self.last_checkpoint = time.monotonic()
+
+    def save_local(self, path):
+        with self.write_lock:
+            self.vector_store.save_local(path)
@@ -0,0 +1,123 @@
+import json
+import os
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from vector.constant import TAG_FIELDS
+
+TAGS_FILE_NAME = "tags.json"
+TAG_BITMAPS_FILE_NAME = "tags.bitmaps.npy"
+
+
+def row_tags(metadata: Mapping) -> List[str]:
+    """Tag keys ("field:value") of a chunk, from its TAG_FIELDS metadata (a value or a list of values each)"""
+    keys = []
+    for field in TAG_FIELDS:
+        values = metadata.get(field) or []
+        for value in [values] if isinstance(values, str) else values:
+            keys.append(f"{field}:{value}")
+    return keys
+
+
+def num_bytes(num_rows: int) -> int:
+    return (num_rows + 7) // 8
+
+
+class TagIndex:
+    """
+    One bitmap per tag over the FAISS rows of a store.
+
+    Bit r of a tag's bitmap (bit r % 8 of byte r // 8, the layout of
+    faiss.IDSelectorBitmap) is set when row r has the tag, so the rows
+    matching a filter are a few bitwise operations on packed bytes away and
+    the result can restrict a FAISS search directly. Saved bitmaps can be
+    memory-mapped, like the docstore, so every worker shares one copy.
+    """
+
+    def __init__(self, tags: Optional[List[str]] = None, bitmaps: Optional[np.ndarray] = None, num_rows: int = 0):
+        self.tags: Dict[str, int] = {tag: i for i, tag in enumerate(tags or [])}
+        self.bitmaps = bitmaps if bitmaps is not None else np.zeros((len(self.tags), num_bytes(num_rows)), dtype=np.uint8)
+        self.num_rows = num_rows
+
+    def _reserve(self, num_rows: int, num_tags: int) -> None:
+        capacity, tag_capacity = self.bitmaps.shape[1], self.bitmaps.shape[0]
+        if num_bytes(num_rows) <= capacity and num_tags <= tag_capacity and self.bitmaps.flags.writeable:
+            return
+        if num_bytes(num_rows) > capacity:
+            # Grown geometrically, so appending row by row stays linear
+            capacity = max(num_bytes(num_rows), 2 * capacity)
+        bitmaps = np.zeros((max(num_tags, tag_capacity), capacity), dtype=np.uint8)
+        bitmaps[:tag_capacity, : self.bitmaps.shape[1]] = self.bitmaps
+        self.bitmaps = bitmaps
+
+    def _tag(self, key: str) -> int:
+        return self.tags.setdefault(key, len(self.tags))
+
+    def add(self, tag_lists: Iterable[List[str]]) -> None:
+        """Append rows with the given tag keys (see row_tags)"""
+        tag_lists = list(tag_lists)
+        rows = [(row, [self._tag(key) for key in keys]) for row, keys in enumerate(tag_lists, self.num_rows)]
+        self._reserve(self.num_rows + len(tag_lists), len(self.tags))
+        for row, tags in rows:
+            self.bitmaps[tags, row >> 3] |= np.uint8(1 << (row & 7))
+        self.num_rows += len(tag_lists)
+
+    def set_tags(self, rows: Mapping[int, List[str]]) -> None:
+        """Replace the tags of existing rows"""
+        tags = {row: [self._tag(key) for key in keys] for row, keys in rows.items()}
+        self._reserve(self.num_rows, len(self.tags))
+        for row, row_tag_ids in tags.items():
+            self.bitmaps[:, row >> 3] &= np.uint8(~(1 << (row & 7)) & 0xFF)
+            self.bitmaps[row_tag_ids, row >> 3] |= np.uint8(1 << (row & 7))
+
+    def get_tags(self, row: int) -> List[str]:
+        keys = list(self.tags)
+        return sorted(keys[tag] for tag in np.flatnonzero(self.bitmaps[: len(keys), row >> 3] & (1 << (row & 7))))
+
+    def bitmap(self, tag_filter: Mapping[str, Iterable[str]]) -> Optional[np.ndarray]:
+        """
+        Packed bitmap of the rows matching tag_filter, or None when it filters nothing.
+
+        tag_filter maps TAG_FIELDS to the accepted values: a row matches when,
+        for every field given, it has at least one of its values. Unknown
+        values match no row.
+        """
+        result = None
+        for field, values in tag_filter.items():
+            if field not in TAG_FIELDS:
+                raise ValueError(f"Unknown tag field {field}; expected one of {TAG_FIELDS}")
+            values = [values] if isinstance(values, str) else list(values or [])
+            if not values:
+                continue
+            tag_ids = [self.tags[key] for key in (f"{field}:{value}" for value in values) if key in self.tags]
+            matching = np.bitwise_or.reduce(self.bitmaps[tag_ids, : num_bytes(self.num_rows)], axis=0) if tag_ids else np.zeros(num_bytes(self.num_rows), dtype=np.uint8)
+            result = matching if result is None else result & matching
+        return result
+
+    def take(self, rows: np.ndarray) -> "TagIndex":
+        """Index of the given rows only, renumbered in order, as after compaction"""
+        bits = np.unpackbits(self.bitmaps[: len(self.tags), : num_bytes(self.num_rows)], axis=1, count=self.num_rows, bitorder="little")
+        return TagIndex(list(self.tags), np.packbits(bits[:, rows], axis=1, bitorder="little"), len(rows))
+
+    def save(self, directory: str) -> None:
+        with open(os.path.join(directory, TAGS_FILE_NAME), "w") as f:
+            json.dump({"tags": list(self.tags), "num_rows": self.num_rows}, f)
+        np.save(os.path.join(directory, TAG_BITMAPS_FILE_NAME), np.ascontiguousarray(self.bitmaps[: len(self.tags), : num_bytes(self.num_rows)]))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> Optional["TagIndex"]:
+        """Index saved in directory, or None when it has none"""
+        tags_path = os.path.join(directory, TAGS_FILE_NAME)
+        if not os.path.exists(tags_path):
+            return None
+        with open(tags_path) as f:
+            meta = json.load(f)
+        bitmaps = np.load(os.path.join(directory, TAG_BITMAPS_FILE_NAME), mmap_mode="r" if mmap else None)
+        return cls(meta["tags"], bitmaps, meta["num_rows"])
+
+    @classmethod
+    def build(cls, tag_lists: Iterable[List[str]]) -> "TagIndex":
+        index = cls()
+        index.add(tag_lists)
+        return index
@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Float16VectorFile:
+    """
+    Append-only file of float16 vectors, one row per FAISS row, read through a
+    read-only memory map.
+
+    The map lives in the OS page cache, so it is shared by every process that
+    opens the same file and only the rows that are actually read get paged in.
+    """
+
+    def __init__(self, path, dimensions):
+        self.path = path
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * np.dtype(np.float16).itemsize
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._pinned = False
+
+    def __len__(self):
+        if self._pinned:
+            return self._matrix.shape[0]
+        if not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // self.row_bytes
+
+    def pin(self, num_rows):
+        """
+        Map the first num_rows rows now and serve only those from then on
+        without looking at the file again, for read-only use: rows appended
+        later are ignored, and the rows stay readable after the file is removed
+        """
+        matrix = self.matrix()[:num_rows]
+        with self._lock:
+            self._matrix = matrix
+            self._pinned = True
+        return self
+
+    def append(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float16).reshape(-1, self.dimensions)
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(vectors.tobytes())
+
+    def truncate(self, num_rows):
+        """Drop rows past num_rows (e.g. appended after the last index save)"""
+        with self._lock:
+            if len(self) > num_rows:
+                logger.warning(f"Truncating {self.path} from {len(self)} to {num_rows} rows to match the index")
+                os.truncate(self.path, num_rows * self.row_bytes)
+                self._matrix = None
+
+    def matrix(self):
+        """Memory map of every row written so far"""
+        num_rows = len(self)
+        matrix = self._matrix
+        if not self._pinned and (matrix is None or matrix.shape[0] != num_rows):
+            if num_rows == 0:
+                return np.zeros((0, self.dimensions), dtype=np.float16)
+            matrix = np.memmap(self.path, dtype=np.float16, mode="r", shape=(num_rows, self.dimensions))
+            self._matrix = matrix
+        return matrix
+
+    def rows(self, indices):
+        """Gather rows as float32"""
+        return np.asarray(self.matrix()[np.asarray(indices, dtype=np.int64)], dtype=np.float32)
+
+    @classmethod
+    def create(cls, path, vectors):
+        """Write a new file containing exactly vectors"""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(tmp_path, path)
+        return cls(path, vectors.shape[1])